@@ -14,13 +14,21 @@
 """
 
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, simpledialog
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 import numpy as np
 import json
+import os
+import time
 import tkinter.font as tkFont
+import dbc_engine as dbc
+import dbc_cache
+import dbc_browser
+import dbc_tuning
+import dbc_codec
+import dbc_preprocess
 import matplotlib as mpl
 mpl.rcParams["font.family"] = "serif"
 mpl.rcParams["font.serif"] = ["Times New Roman"]
@@ -35,15 +43,35 @@ hyp_set = False
 conv_canvas = None
 loaded_data = None
 dataset_id = None
+loaded_dataset = None    # parsed file, including its SHA-256, used as the cache key
+dataset_browser = None   # folder opened with "Open Folder"; browser_index is the file shown from it
+browser_index = None
+preprocessing = []       # steps applied to every channel before encoding (see dbc_preprocess.py)
+
+# Multichannel globals:
+loaded_channels = None    # (samples, channels) array of the loaded file; loaded_data is the active column
+channel_names = []
+active_channel = 0
+channel_parameters = []   # per channel: (mu, sigma, references, boundaries), or None when not set
 
 # Hyperparameter globals:
 mu = sigma = 0
-R1 = R2 = R3 = 0
-a = b = c = d = 0
-A_R1 = A_R2 = A_R3 = 0
-B_R1 = B_R2 = B_R3 = 0
-C_R1 = C_R2 = C_R3 = 0
-D_R1 = D_R2 = D_R3 = 0
+references = np.zeros(3)        # (N,) reference values R1..RN
+boundaries = np.zeros((3, 4))   # (N, 4) conversion boundaries a, b, c, d per reference
+
+# Parsed files, strands and parameter presets are kept on disk across sessions.
+try:
+    result_cache = dbc_cache.ResultCache()
+except OSError:
+    result_cache = None
+if result_cache is not None and dbc_cache.LAST_USED_PRESET in result_cache.load_presets():
+    try:
+        mu, sigma, references, boundaries = result_cache.preset(dbc_cache.LAST_USED_PRESET)
+        hyp_set = True
+    except (KeyError, TypeError, ValueError):
+        pass
+
+REFERENCE_COLORS = ["blue", "green", "red", "purple", "darkorange", "brown", "magenta", "teal"]
 
 # Functions
 def init_empty_canvas():
@@ -66,22 +94,79 @@ def init_empty_conv_canvas():
     conv_canvas.get_tk_widget().configure(borderwidth=0.5, relief="solid")
     conv_canvas.get_tk_widget().pack()
 
-def update_reference_lines():    
-    if loaded_data is None:
-        return
-    fig = canvas.figure
-    ax = fig.axes[0]
-    ax.clear()
-    ax.plot(loaded_data, linewidth=0.7, color="black") 
+def data_figure(data):
+    fig = Figure(figsize=(6, 2.5), dpi=100)
+    ax = fig.add_subplot(111)
+    ax.plot(data, linewidth=0.7, color="black")
     ax.set_xlabel(r"$\it{i}$", fontdict={"fontname": "Times New Roman", "fontsize": 11, "color": "gray"})
     ax.set_ylabel(r"$\it{x}$($\it{i}$)", fontdict={"fontname": "Times New Roman", "fontsize": 11, "color": "gray"})
     ax.tick_params(axis='both', labelsize=8, colors="gray")
     ax.grid(False)
     fig.tight_layout()
+    return fig
+
+def update_reference_lines():    
+    if loaded_data is None:
+        return
+    # A new figure, so that figures cached by the dataset browser keep showing their first channel
+    canvas.figure = data_figure(loaded_data)
     canvas.draw()
 
+def update_reference_selector():
+    for widget in reference_radio_frame.winfo_children():
+        widget.destroy()
+    names = dbc.reference_names(len(references))
+    if rule_reference_var.get() not in names:
+        rule_reference_var.set(names[0])
+    for name in names:
+        tk.Radiobutton(reference_radio_frame, text=name, variable=rule_reference_var, value=name,
+                       font=custom_font).pack(side="left", padx=5 if len(names) <= 4 else 1)
+
+def select_channel(index):
+    global active_channel, loaded_data, mu, sigma, references, boundaries, hyp_set
+    active_channel = index
+    loaded_data = loaded_channels[:, index]
+    parameters = channel_parameters[index]
+    hyp_set = parameters is not None
+    if hyp_set:
+        mu, sigma, references, boundaries = parameters
+    channel_var.set(channel_names[index])
+    update_reference_selector()
+
+def update_channel_selector():
+    for widget in channel_frame.winfo_children():
+        widget.destroy()
+    if len(channel_names) < 2:
+        return
+    tk.Label(channel_frame, text="Channel:", font=custom_font).pack(side="left", padx=5)
+    tk.OptionMenu(channel_frame, channel_var, *channel_names,
+                  command=lambda name: (select_channel(channel_names.index(name)), update_reference_lines())
+                  ).pack(side="left")
+
+def show_dataset(dataset, fig=None):
+    global loaded_channels, loaded_dataset, channel_names, channel_parameters, dataset_id, canvas
+    numerical_data = dataset["Numerical Data"]
+    dataset_id = dataset["Dataset ID"]
+    loaded_dataset = dataset
+    if len(channel_parameters) != numerical_data.shape[1]:
+        current = (mu, sigma, references, boundaries) if hyp_set else None
+        channel_parameters = [current] * numerical_data.shape[1]
+    loaded_channels = dbc_preprocess.preprocess(numerical_data, preprocessing)
+    channel_names = dataset["Channels"]
+    update_channel_selector()
+    select_channel(0)
+    if fig is None:
+        fig = data_figure(loaded_data)
+    if canvas is None:
+        canvas = FigureCanvasTkAgg(fig, master=plot_frame)
+        canvas.get_tk_widget().configure(borderwidth=0.5, relief="solid")
+        canvas.get_tk_widget().pack()
+    else:
+        canvas.figure = fig
+        canvas.draw()
+
 def load_data():
-    global loaded_data, dataset_id, canvas
+    global browser_index
     filename = filedialog.askopenfilename(
         title="Select a Data File",
         filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
@@ -89,61 +174,121 @@ def load_data():
     if not filename:
         return    
     try:
-        with open(filename, 'r') as file:
-            lines = file.readlines()
-        if len(lines) < 4:
-            messagebox.showerror("Error", "The file does not have the required structure.")
-            return        
-        common_metadata = {}
-        try:
-            common_metadata["Data Type"] = lines[0].strip().split(": ")[1]
-        except IndexError:
-            common_metadata["Data Type"] = "N/A"
-        try:
-            common_metadata["Condition"] = lines[1].strip().split(": ")[1]
-        except IndexError:
-            common_metadata["Condition"] = "N/A"
-        try:
-            dataset_id = lines[2].strip().split(": ")[1]
-        except IndexError:
-            dataset_id = "Unknown"
-        numerical_data = []
-        for line in lines[3:]:
-            try:
-                numerical_data.append(float(line.strip()))
-            except ValueError:
-                continue
-        if not numerical_data:
+        if result_cache is not None:
+            dataset = result_cache.load_dataset(filename)
+        else:
+            dataset = dbc.load_dataset(filename)
+        if not dataset["Numerical Data"].size:
             messagebox.showerror("Error", "No numerical data found in the file.")
             return
-        loaded_data = numerical_data
-        fig = Figure(figsize=(6, 2.5), dpi=100)
-        ax = fig.add_subplot(111)
-        ax.plot(numerical_data, linewidth=0.7, color="black")
-        ax.set_xlabel(r"$\it{i}$", fontdict={"fontname": "Times New Roman","fontsize": 11,"color": "gray"})
-        ax.set_ylabel(r"$\it{x}$($\it{i}$)",fontdict={"fontname": "Times New Roman","fontsize": 11,"color": "gray"})        
-        ax.tick_params(axis='both', labelsize=8, colors="gray")
-        ax.grid(False)
-        fig.tight_layout()
-        if canvas is None:
-            canvas = FigureCanvasTkAgg(fig, master=plot_frame)
-            canvas.get_tk_widget().configure(borderwidth=0.5, relief="solid")
-            canvas.get_tk_widget().pack()
-        else:
-            canvas.figure = fig
-            canvas.draw()
+        browser_index = None
+        show_dataset(dataset)
+    except Exception as e:
+        messagebox.showerror("Error", str(e))
+
+def open_dataset_folder():
+    global dataset_browser, browser_index
+    folder = filedialog.askdirectory(title="Select a Dataset Folder")
+    if not folder:
+        return
+    try:
+        browser = dbc_browser.DatasetBrowser(folder, result_cache)
     except Exception as e:
         messagebox.showerror("Error", str(e))
+        return
+    if not len(browser):
+        messagebox.showinfo("Datasets", "No data files (*.txt) found in this folder.")
+        return
+    if dataset_browser is not None:
+        dataset_browser.close()
+    dataset_browser, browser_index = browser, None
+    show_dataset_browser(browser)
+
+def show_dataset_browser(browser):
+    popup = tk.Toplevel(root)
+    popup.iconbitmap("icon-png.ico")
+    popup.title(f"Datasets - {os.path.basename(os.path.normpath(browser.folder))}")
+    popup.geometry("420x520")
+    tk.Label(popup, text=f"{len(browser)} files. Use the arrow keys to step through them.",
+             font=custom_font, fg="gray").pack(pady=5)
+    list_frame = tk.Frame(popup)
+    list_frame.pack(fill="both", expand=True, padx=10, pady=5)
+    listbox = tk.Listbox(list_frame, font=("Courier New", 9), activestyle="none", exportselection=False)
+    listbox.pack(side="left", fill="both", expand=True)
+    scrollbar = tk.Scrollbar(list_frame, command=listbox.yview)
+    scrollbar.pack(side="right", fill="y")
+    listbox.config(yscrollcommand=scrollbar.set)
+    for index in range(len(browser)):
+        listbox.insert("end", browser.label(index))
+    
+    def on_select(event):
+        selection = listbox.curselection()
+        if selection:
+            browse_dataset(browser, selection[0])
+    
+    listbox.bind("<<ListboxSelect>>", on_select)
+    listbox.selection_set(0)
+    listbox.activate(0)
+    listbox.focus_set()
+    browse_dataset(browser, 0)
+
+def browse_dataset(browser, index):
+    global browser_index
+    if browser is not dataset_browser:
+        return
+    try:
+        entry = browser.entry(index)
+    except Exception as e:
+        messagebox.showerror("Error", f"{os.path.basename(browser.paths[index])}: {e}")
+        return
+    numerical_data = entry["Dataset"]["Numerical Data"]
+    if not numerical_data.size:
+        messagebox.showerror("Error", "No numerical data found in the file.")
+        return
+    if entry["Figure"] is None:
+        entry["Figure"] = data_figure(numerical_data[:, 0])
+    browser_index = index
+    # Cached figures show the raw trace; with preprocessing the plot is drawn from the processed one
+    show_dataset(entry["Dataset"], None if preprocessing else entry["Figure"])
+    refresh_results()
+    # Parse and encode the neighbouring files in the background, then lay out their plots while idle
+    browser.prefetch(index, current_parameter_sets(), missing_var.get(), preprocessing)
+    root.after(20, prerender_neighbours, browser, index)
+
+def prerender_neighbours(browser, index, attempts=50):
+    if browser is not dataset_browser or browser_index != index:
+        return
+    for neighbour in browser.neighbours(index):
+        entry = browser.cached(neighbour)
+        if entry is None:
+            break
+        if entry["Figure"] is None and entry["Dataset"]["Numerical Data"].size:
+            # One figure per call keeps the window responsive to the next key press
+            entry["Figure"] = data_figure(entry["Dataset"]["Numerical Data"][:, 0])
+            root.after(1, prerender_neighbours, browser, index, attempts)
+            return
+    else:
+        return
+    if attempts:
+        root.after(20, prerender_neighbours, browser, index, attempts - 1)
+
+def refresh_results():
+    # Keep strands already on screen in step with the dataset being shown
+    for text_area, show in ((dna_text_area, form_dna), (mrna_text_area, form_mrna),
+                            (protein_text_area, generate_protein)):
+        if text_area.get("1.0", "end-1c").strip():
+            show()
 
 def display_param():
-    global mu, sigma, R1, R2, R3, a, b, c, d
-    global A_R1, A_R2, A_R3, B_R1, B_R2, B_R3, C_R1, C_R2, C_R3, D_R1, D_R2, D_R3
-    return (f"R1 = {R1:.3f}, R2 = {R2:.3f}, R3 = {R3:.3f}\n\n"
-            f"∀R ∈{{R1, R2, R3}}\n\n"
-            f"a = {{{A_R1:.3f}, {A_R2:.3f}, {A_R3:.3f}}}\n"
-            f"b = {{{B_R1:.3f}, {B_R2:.3f}, {B_R3:.3f}}}\n"
-            f"c = {{{C_R1:.3f}, {C_R2:.3f}, {C_R3:.3f}}}\n"
-            f"d = {{{D_R1:.3f}, {D_R2:.3f}, {D_R3:.3f}}}")
+    names = dbc.reference_names(len(references))
+    def row(values):
+        return ", ".join(f"{v:.3f}" for v in values)
+    return (", ".join(f"{name} = {R:.3f}" for name, R in zip(names, references)) + "\n\n"
+            f"∀R ∈{{{', '.join(names)}}}\n\n"
+            f"a = {{{row(boundaries[:, 0])}}}\n"
+            f"b = {{{row(boundaries[:, 1])}}}\n"
+            f"c = {{{row(boundaries[:, 2])}}}\n"
+            f"d = {{{row(boundaries[:, 3])}}}")
 
 def show_parameters_popup(event=None):
     param_text = display_param()
@@ -161,11 +306,24 @@ def show_parameters_popup(event=None):
     text_area.insert("1.0", param_text)
     text_area.config(state="disabled")
 
+def set_active_parameters(new_mu, new_sigma, new_references, new_boundaries, all_channels=False):
+    global mu, sigma, references, boundaries, hyp_set
+    mu, sigma, references, boundaries = new_mu, new_sigma, new_references, new_boundaries
+    hyp_set = True
+    if loaded_channels is not None:
+        channels = range(len(channel_parameters)) if all_channels else [active_channel]
+        for channel in channels:
+            channel_parameters[channel] = (mu, sigma, references, boundaries)
+    if result_cache is not None:
+        result_cache.save_preset(dbc_cache.LAST_USED_PRESET, mu, sigma, references, boundaries)
+    update_reference_selector()
+    update_reference_lines()
+
 def set_parameters_popup():
     popup = tk.Toplevel(root)
     popup.iconbitmap("icon-png.ico")
     popup.title("Set Parameters")
-    popup.geometry("450x450")
+    popup.geometry("520x680")
         
     def update_mode(mode_var, container, def_frame, mod_frame, dir_frame):
         for widget in container.winfo_children():
@@ -224,58 +382,49 @@ def set_parameters_popup():
     tk.Label(default_frame, text="d = −2.5σ").grid(row=9, column=0, sticky="e", padx=5, pady=5)
     
     modify_frame = tk.Frame(input_container)
-    tk.Label(modify_frame, text="μ ( = R1):").grid(row=0, column=0, sticky="e", padx=5, pady=5)
+    tk.Label(modify_frame, text="μ:").grid(row=0, column=0, sticky="e", padx=5, pady=5)
     mod_mu_entry = tk.Entry(modify_frame, width=10)
-    mod_mu_entry.grid(row=0, column=1, padx=5, pady=5)
+    mod_mu_entry.grid(row=0, column=1, sticky="w", padx=5, pady=5)
     if mu != 0:
         mod_mu_entry.insert(0, str(mu))
     tk.Label(modify_frame, text="σ:").grid(row=1, column=0, sticky="e", padx=5, pady=5)
     mod_sigma_entry = tk.Entry(modify_frame, width=10)
-    mod_sigma_entry.grid(row=1, column=1, padx=5, pady=5)
+    mod_sigma_entry.grid(row=1, column=1, sticky="w", padx=5, pady=5)
     if sigma != 0:
         mod_sigma_entry.insert(0, str(sigma))
-    tk.Label(modify_frame, text="R2 ( = μ + m·σ). Insert 'm':").grid(row=2, column=0, sticky="e", padx=5, pady=5)
-    r2_mult_entry = tk.Entry(modify_frame, width=10)
-    r2_mult_entry.grid(row=2, column=1, padx=5, pady=5)
-    if sigma != 0:
-        m = (R2 - mu) / sigma if R2 != 0 else 4
-        r2_mult_entry.insert(0, str(m))
+    tk.Label(modify_frame, text=f"R ( = μ + k·σ). Insert up to {dbc.MAX_REFERENCES} 'k':").grid(row=2, column=0, sticky="e", padx=5, pady=5)
+    k_entry = tk.Entry(modify_frame, width=20)
+    k_entry.grid(row=2, column=1, sticky="w", padx=5, pady=5)
+    if sigma != 0 and references.any():
+        k_entry.insert(0, ", ".join(f"{k:g}" for k in (references - mu) / sigma))
     else:
-        r2_mult_entry.insert(0, "4")
-    tk.Label(modify_frame, text="R3 ( = μ − n·σ). Insert 'n':").grid(row=3, column=0, sticky="e", padx=5, pady=5)
-    r3_mult_entry = tk.Entry(modify_frame, width=10)
-    r3_mult_entry.grid(row=3, column=1, padx=5, pady=5)
-    if sigma != 0:
-        n = (mu - R3) / sigma if R3 != 0 else 4
-        r3_mult_entry.insert(0, str(n))
-    else:
-        r3_mult_entry.insert(0, "4")
-    tk.Label(modify_frame, text="a ( = α·σ). Insert 'α':").grid(row=4, column=0, sticky="e", padx=5, pady=5)
+        k_entry.insert(0, "0, 4, -4")
+    tk.Label(modify_frame, text="a ( = α·σ). Insert 'α':").grid(row=3, column=0, sticky="e", padx=5, pady=5)
     a_mult_entry = tk.Entry(modify_frame, width=10)
-    a_mult_entry.grid(row=4, column=1, padx=5, pady=5)
-    if sigma != 0 and A_R1 != 0:
-        a_mult_entry.insert(0, str(A_R1 / sigma))
+    a_mult_entry.grid(row=3, column=1, sticky="w", padx=5, pady=5)
+    if sigma != 0 and boundaries[0, 0] != 0:
+        a_mult_entry.insert(0, str(boundaries[0, 0] / sigma))
     else:
         a_mult_entry.insert(0, "2.5")
-    tk.Label(modify_frame, text="b ( = β·σ). Insert 'β':").grid(row=5, column=0, sticky="e", padx=5, pady=5)
+    tk.Label(modify_frame, text="b ( = β·σ). Insert 'β':").grid(row=4, column=0, sticky="e", padx=5, pady=5)
     b_mult_entry = tk.Entry(modify_frame, width=10)
-    b_mult_entry.grid(row=5, column=1, padx=5, pady=5)
-    if sigma != 0 and B_R1 != 0:
-        b_mult_entry.insert(0, str(B_R1 / sigma))
+    b_mult_entry.grid(row=4, column=1, sticky="w", padx=5, pady=5)
+    if sigma != 0 and boundaries[0, 1] != 0:
+        b_mult_entry.insert(0, str(boundaries[0, 1] / sigma))
     else:
         b_mult_entry.insert(0, "1.5")
-    tk.Label(modify_frame, text="c ( = γ·σ). Insert 'γ':").grid(row=6, column=0, sticky="e", padx=5, pady=5)
+    tk.Label(modify_frame, text="c ( = γ·σ). Insert 'γ':").grid(row=5, column=0, sticky="e", padx=5, pady=5)
     c_mult_entry = tk.Entry(modify_frame, width=10)
-    c_mult_entry.grid(row=6, column=1, padx=5, pady=5)
-    if sigma != 0 and C_R1 != 0:
-        c_mult_entry.insert(0, str(C_R1 / sigma))
+    c_mult_entry.grid(row=5, column=1, sticky="w", padx=5, pady=5)
+    if sigma != 0 and boundaries[0, 2] != 0:
+        c_mult_entry.insert(0, str(boundaries[0, 2] / sigma))
     else:
         c_mult_entry.insert(0, "-1.5")
-    tk.Label(modify_frame, text="d ( = δ·σ). Insert 'δ':").grid(row=7, column=0, sticky="e", padx=5, pady=5)
+    tk.Label(modify_frame, text="d ( = δ·σ). Insert 'δ':").grid(row=6, column=0, sticky="e", padx=5, pady=5)
     d_mult_entry = tk.Entry(modify_frame, width=10)
-    d_mult_entry.grid(row=7, column=1, padx=5, pady=5)
-    if sigma != 0 and D_R1 != 0:
-        d_mult_entry.insert(0, str(D_R1 / sigma))
+    d_mult_entry.grid(row=6, column=1, sticky="w", padx=5, pady=5)
+    if sigma != 0 and boundaries[0, 3] != 0:
+        d_mult_entry.insert(0, str(boundaries[0, 3] / sigma))
     else:
         d_mult_entry.insert(0, "-2.5")
         
@@ -288,121 +437,55 @@ def set_parameters_popup():
                    command=update_direct_mode).pack(side="left", padx=5)
     tk.Radiobutton(option_frame, text="Different Values", variable=direct_option_var, value="different", font=custom_font,
                    command=update_direct_mode).pack(side="left", padx=5)    
+    count_frame = tk.Frame(direct_frame)
+    count_frame.pack(fill="x", pady=5)
+    tk.Label(count_frame, text="Number of References:", font=custom_font).pack(side="left", padx=5)
+    count_var = tk.IntVar(value=len(references))
+    tk.Spinbox(count_frame, from_=1, to=dbc.MAX_REFERENCES, width=5, textvariable=count_var, state="readonly",
+               command=lambda: build_reference_frames()).pack(side="left", padx=5)
     same_frame = tk.Frame(direct_frame)
     different_frame = tk.Frame(direct_frame)
     
     tk.Label(same_frame, text="R:", font=custom_font).grid(row=0, column=0, sticky="e", padx=5, pady=5)
     r_entry = tk.Entry(same_frame, width=10)
     r_entry.grid(row=0, column=1, padx=5, pady=5)
-    if R1 != 0:
-        r_entry.insert(0, str(R1))
-    tk.Label(same_frame, text="a:", font=custom_font).grid(row=1, column=0, sticky="e", padx=5, pady=5)
-    a_same_entry = tk.Entry(same_frame, width=10)
-    a_same_entry.grid(row=1, column=1, padx=5, pady=5)
-    if A_R1 != 0:
-        a_same_entry.insert(0, str(A_R1))
-    tk.Label(same_frame, text="b:", font=custom_font).grid(row=2, column=0, sticky="e", padx=5, pady=5)
-    b_same_entry = tk.Entry(same_frame, width=10)
-    b_same_entry.grid(row=2, column=1, padx=5, pady=5)
-    if B_R1 != 0:
-        b_same_entry.insert(0, str(B_R1))
-    tk.Label(same_frame, text="c:", font=custom_font).grid(row=3, column=0, sticky="e", padx=5, pady=5)
-    c_same_entry = tk.Entry(same_frame, width=10)
-    c_same_entry.grid(row=3, column=1, padx=5, pady=5)
-    if C_R1 != 0:
-        c_same_entry.insert(0, str(C_R1))
-    tk.Label(same_frame, text="d:", font=custom_font).grid(row=4, column=0, sticky="e", padx=5, pady=5)
-    d_same_entry = tk.Entry(same_frame, width=10)
-    d_same_entry.grid(row=4, column=1, padx=5, pady=5)
-    if D_R1 != 0:
-        d_same_entry.insert(0, str(D_R1))
+    if references[0] != 0:
+        r_entry.insert(0, str(references[0]))
+    same_entries = []
+    for row, label in enumerate(["a:", "b:", "c:", "d:"], start=1):
+        tk.Label(same_frame, text=label, font=custom_font).grid(row=row, column=0, sticky="e", padx=5, pady=5)
+        entry = tk.Entry(same_frame, width=10)
+        entry.grid(row=row, column=1, padx=5, pady=5)
+        if boundaries[0, row - 1] != 0:
+            entry.insert(0, str(boundaries[0, row - 1]))
+        same_entries.append(entry)
     
-    r1_frame = tk.Frame(different_frame, borderwidth=1, relief="solid", padx=5, pady=5)
-    r2_frame = tk.Frame(different_frame, borderwidth=1, relief="solid", padx=5, pady=5)
-    r3_frame = tk.Frame(different_frame, borderwidth=1, relief="solid", padx=5, pady=5)
-
-    r1_frame.grid(row=0, column=0, padx=5, sticky="n")
-    r2_frame.grid(row=0, column=1, padx=5, sticky="n")
-    r3_frame.grid(row=0, column=2, padx=5, sticky="n")
+    different_entries = []
     
-    tk.Label(r1_frame, text="R1:", font=custom_font).grid(row=0, column=0, sticky="e", padx=5, pady=5)
-    r1_entryD = tk.Entry(r1_frame, width=10)
-    r1_entryD.grid(row=0, column=1, padx=5, pady=5)
-    if R1 != 0:
-        r1_entryD.insert(0, str(R1))
-    tk.Label(r1_frame, text="a:", font=custom_font).grid(row=1, column=0, sticky="e", padx=5, pady=5)
-    a_entryD = tk.Entry(r1_frame, width=10)
-    a_entryD.grid(row=1, column=1, padx=5, pady=5)
-    if A_R1 != 0:
-        a_entryD.insert(0, str(A_R1))
-    tk.Label(r1_frame, text="b:", font=custom_font).grid(row=2, column=0, sticky="e", padx=5, pady=5)
-    b_entryD = tk.Entry(r1_frame, width=10)
-    b_entryD.grid(row=2, column=1, padx=5, pady=5)
-    if B_R1 != 0:
-        b_entryD.insert(0, str(B_R1))
-    tk.Label(r1_frame, text="c:", font=custom_font).grid(row=3, column=0, sticky="e", padx=5, pady=5)
-    c_entryD = tk.Entry(r1_frame, width=10)
-    c_entryD.grid(row=3, column=1, padx=5, pady=5)
-    if C_R1 != 0:
-        c_entryD.insert(0, str(C_R1))
-    tk.Label(r1_frame, text="d:", font=custom_font).grid(row=4, column=0, sticky="e", padx=5, pady=5)
-    d_entryD = tk.Entry(r1_frame, width=10)
-    d_entryD.grid(row=4, column=1, padx=5, pady=5)
-    if D_R1 != 0:
-        d_entryD.insert(0, str(D_R1))
-    
-    tk.Label(r2_frame, text="R2:", font=custom_font).grid(row=0, column=0, sticky="e", padx=5, pady=5)
-    r2_entryD = tk.Entry(r2_frame, width=10)
-    r2_entryD.grid(row=0, column=1, padx=5, pady=5)
-    if R2 != 0:
-        r2_entryD.insert(0, str(R2))
-    tk.Label(r2_frame, text="a:", font=custom_font).grid(row=1, column=0, sticky="e", padx=5, pady=5)
-    a_entryD2 = tk.Entry(r2_frame, width=10)
-    a_entryD2.grid(row=1, column=1, padx=5, pady=5)
-    if A_R2 != 0:
-        a_entryD2.insert(0, str(A_R2))
-    tk.Label(r2_frame, text="b:", font=custom_font).grid(row=2, column=0, sticky="e", padx=5, pady=5)
-    b_entryD2 = tk.Entry(r2_frame, width=10)
-    b_entryD2.grid(row=2, column=1, padx=5, pady=5)
-    if B_R2 != 0:
-        b_entryD2.insert(0, str(B_R2))
-    tk.Label(r2_frame, text="c:", font=custom_font).grid(row=3, column=0, sticky="e", padx=5, pady=5)
-    c_entryD2 = tk.Entry(r2_frame, width=10)
-    c_entryD2.grid(row=3, column=1, padx=5, pady=5)
-    if C_R2 != 0:
-        c_entryD2.insert(0, str(C_R2))
-    tk.Label(r2_frame, text="d:", font=custom_font).grid(row=4, column=0, sticky="e", padx=5, pady=5)
-    d_entryD2 = tk.Entry(r2_frame, width=10)
-    d_entryD2.grid(row=4, column=1, padx=5, pady=5)
-    if D_R2 != 0:
-        d_entryD2.insert(0, str(D_R2))
-    
-    tk.Label(r3_frame, text="R3:", font=custom_font).grid(row=0, column=0, sticky="e", padx=5, pady=5)
-    r3_entryD = tk.Entry(r3_frame, width=10)
-    r3_entryD.grid(row=0, column=1, padx=5, pady=5)
-    if R3 != 0:
-        r3_entryD.insert(0, str(R3))
-    tk.Label(r3_frame, text="a:", font=custom_font).grid(row=1, column=0, sticky="e", padx=5, pady=5)
-    a_entryD3 = tk.Entry(r3_frame, width=10)
-    a_entryD3.grid(row=1, column=1, padx=5, pady=5)
-    if A_R3 != 0:
-        a_entryD3.insert(0, str(A_R3))
-    tk.Label(r3_frame, text="b:", font=custom_font).grid(row=2, column=0, sticky="e", padx=5, pady=5)
-    b_entryD3 = tk.Entry(r3_frame, width=10)
-    b_entryD3.grid(row=2, column=1, padx=5, pady=5)
-    if B_R3 != 0:
-        b_entryD3.insert(0, str(B_R3))
-    tk.Label(r3_frame, text="c:", font=custom_font).grid(row=3, column=0, sticky="e", padx=5, pady=5)
-    c_entryD3 = tk.Entry(r3_frame, width=10)  
-    c_entryD3.grid(row=3, column=1, padx=5, pady=5)
-    if C_R3 != 0:
-        c_entryD3.insert(0, str(C_R3))
-    tk.Label(r3_frame, text="d:", font=custom_font).grid(row=4, column=0, sticky="e", padx=5, pady=5)
-    d_entryD3 = tk.Entry(r3_frame, width=10)
-    d_entryD3.grid(row=4, column=1, padx=5, pady=5)
-    if D_R3 != 0:
-        d_entryD3.insert(0, str(D_R3))
+    def build_reference_frames():
+        # Keep what has been typed so far when the number of references changes.
+        typed = [[entry.get() for entry in entries] for entries in different_entries]
+        for widget in different_frame.winfo_children():
+            widget.destroy()
+        different_entries.clear()
+        for i in range(count_var.get()):
+            ref_frame = tk.Frame(different_frame, borderwidth=1, relief="solid", padx=5, pady=5)
+            ref_frame.grid(row=i // 3, column=i % 3, padx=5, pady=5, sticky="n")
+            entries = []
+            for row, label in enumerate([f"R{i + 1}:", "a:", "b:", "c:", "d:"]):
+                tk.Label(ref_frame, text=label, font=custom_font).grid(row=row, column=0, sticky="e", padx=5, pady=5)
+                entry = tk.Entry(ref_frame, width=10)
+                entry.grid(row=row, column=1, padx=5, pady=5)
+                if i < len(typed):
+                    entry.insert(0, typed[i][row])
+                elif i < len(references):
+                    value = references[i] if row == 0 else boundaries[i, row - 1]
+                    if value != 0:
+                        entry.insert(0, str(value))
+                entries.append(entry)
+            different_entries.append(entries)
     
+    build_reference_frames()
     update_direct_mode()
     
     direct_frame.pack(fill="both", expand=True, padx=10, pady=5)
@@ -410,11 +493,21 @@ def set_parameters_popup():
     bottom_frame = tk.Frame(popup)
     bottom_frame.pack(side="bottom", fill="x", pady=10)
     
+    apply_all_var = tk.BooleanVar(value=False)
+    if len(channel_names) > 1:
+        tk.Checkbutton(bottom_frame, text=f"Apply to all channels (editing: {channel_names[active_channel]})",
+                       variable=apply_all_var, font=custom_font).pack()
+    
     update_mode(mode_var, input_container, default_frame, modify_frame, direct_frame)
     
+    def show_boundary_error(name=None):
+        prefix = f"For {name}, conversion" if name else "Conversion"
+        messagebox.showerror("Error", f"{prefix} boundaries must satisfy:\n"
+                            "  a and b > 0 with a > b,\n"
+                            "  c and d < 0 with c > d.")
+    
     def calculate_and_set_params():
-        global mu, sigma, R1, R2, R3, a, b, c, d
-        global A_R1, A_R2, A_R3, B_R1, B_R2, B_R3, C_R1, C_R2, C_R3, D_R1, D_R2, D_R3, hyp_set
+        global mu, sigma
         mode = mode_var.get()
         if mode == "default":
             if default_mu_entry.get() == "" or default_sigma_entry.get() == "":
@@ -429,18 +522,10 @@ def set_parameters_popup():
             if mu == 0 or sigma == 0:
                 messagebox.showinfo("Missing", "Please enter nonzero values for μ and σ.")
                 return
-            R1 = mu
-            R2 = mu + 4 * sigma
-            R3 = mu - 4 * sigma
-            a = 2.5 * sigma
-            b = 1.5 * sigma
-            c = -1.5 * sigma
-            d = -2.5 * sigma
+            new_references, new_boundaries = dbc.default_parameters(mu, sigma)
             
-            if not (a > 0 and b > 0 and c < 0 and d < 0 and a > b and c > d):
-                messagebox.showerror("Error", "Conversion boundaries must satisfy:\n"
-                                    "a and b > 0 with a > b,\n"
-                                    "c and d < 0 with c > d.")
+            if dbc.invalid_boundaries(new_boundaries).any():
+                show_boundary_error()
                 return
         elif mode == "modify":
             if mod_mu_entry.get() == "" or mod_sigma_entry.get() == "":
@@ -449,8 +534,7 @@ def set_parameters_popup():
             try:
                 mu = float(mod_mu_entry.get())
                 sigma = float(mod_sigma_entry.get())
-                r2_mult = float(r2_mult_entry.get())
-                r3_mult = float(r3_mult_entry.get())
+                ks = [float(k) for k in k_entry.get().replace(",", " ").split()]
                 a_mult = float(a_mult_entry.get())
                 b_mult = float(b_mult_entry.get())
                 c_mult = float(c_mult_entry.get())
@@ -458,94 +542,294 @@ def set_parameters_popup():
             except ValueError:
                 messagebox.showerror("Error", "Invalid values in Modify Equation mode.")
                 return
-            R1 = mu
-            R2 = mu + r2_mult * sigma
-            R3 = mu - r3_mult * sigma
-            a = a_mult * sigma
-            b = b_mult * sigma
-            c = c_mult * sigma
-            d = d_mult * sigma
+            if not 1 <= len(ks) <= dbc.MAX_REFERENCES:
+                messagebox.showerror("Error", f"Please enter between 1 and {dbc.MAX_REFERENCES} values for 'k'.")
+                return
+            new_references, new_boundaries = dbc.modify_parameters(mu, sigma, ks, a_mult, b_mult, c_mult, d_mult)
             
-            if not (a > 0 and b > 0 and c < 0 and d < 0 and a > b and c > d):
-                messagebox.showerror("Error", "Conversion boundaries must satisfy:\n"
-                                    "a and b > 0 with a > b,\n"
-                                    "c and d < 0 with c > d.")
+            if dbc.invalid_boundaries(new_boundaries).any():
+                show_boundary_error()
                 return
         elif mode == "direct":
             if direct_option_var.get() == "same":
                 try:
                     common_R = float(r_entry.get())
-                    common_a = float(a_same_entry.get())
-                    common_b = float(b_same_entry.get())
-                    common_c = float(c_same_entry.get())
-                    common_d = float(d_same_entry.get())
+                    common_a, common_b, common_c, common_d = [float(entry.get()) for entry in same_entries]
                 except ValueError:
                     messagebox.showerror("Error", "Invalid input in 'Same Values' Direct mode.")
                     return
-                
-                if not (common_a > 0 and common_b > 0 and common_a > common_b and
-                        common_c < 0 and common_d < 0 and common_c > common_d):
-                    messagebox.showerror("Error", "Conversion boundaries must satisfy:\n"
-                                        "  a and b > 0 with a > b,\n"
-                                        "  c and d < 0 with c > d.")
+                new_references, new_boundaries = dbc.same_parameters(count_var.get(), common_R, common_a,
+                                                                     common_b, common_c, common_d)
+                if dbc.invalid_boundaries(new_boundaries).any():
+                    show_boundary_error()
                     return
-                R1 = R2 = R3 = common_R
-                A_R1 = A_R2 = A_R3 = common_a
-                B_R1 = B_R2 = B_R3 = common_b
-                C_R1 = C_R2 = C_R3 = common_c
-                D_R1 = D_R2 = D_R3 = common_d
             else:
                 try:
-                    R1 = float(r1_entryD.get())
-                    R2 = float(r2_entryD.get())
-                    R3 = float(r3_entryD.get())
-                    a1 = float(a_entryD.get())
-                    b1 = float(b_entryD.get())
-                    c1 = float(c_entryD.get())
-                    d1 = float(d_entryD.get())
-                    a2 = float(a_entryD2.get())
-                    b2 = float(b_entryD2.get())
-                    c2 = float(c_entryD2.get())
-                    d2 = float(d_entryD2.get())
-                    a3 = float(a_entryD3.get())
-                    b3 = float(b_entryD3.get())
-                    c3 = float(c_entryD3.get())
-                    d3 = float(d_entryD3.get())
+                    values = np.array([[float(entry.get()) for entry in entries] for entries in different_entries])
                 except ValueError:
                     messagebox.showerror("Error", "Invalid values in Direct Input mode.")
                     return
-                                
-                if not (a1 > 0 and b1 > 0 and a1 > b1 and c1 < 0 and d1 < 0 and c1 > d1):
-                    messagebox.showerror("Error", "For R1, conversion boundaries must satisfy:\n"
-                                        "  a and b > 0 with a > b,\n"
-                                        "  c and d < 0 with c > d.")
-                    return
-                if not (a2 > 0 and b2 > 0 and a2 > b2 and c2 < 0 and d2 < 0 and c2 > d2):
-                    messagebox.showerror("Error", "For R2, conversion boundaries must satisfy:\n"
-                                        "  a and b > 0 with a > b,\n"
-                                        "  c and d < 0 with c > d.")
+                new_references, new_boundaries = dbc.as_parameters(values[:, 0], values[:, 1:])
+                
+                invalid = np.flatnonzero(dbc.invalid_boundaries(new_boundaries))
+                if len(invalid):
+                    show_boundary_error(f"R{invalid[0] + 1}")
                     return
-                if not (a3 > 0 and b3 > 0 and a3 > b3 and c3 < 0 and d3 < 0 and c3 > d3):
-                    messagebox.showerror("Error", "For R3, conversion boundaries must satisfy:\n"
-                                        "  a and b > 0 with a > b,\n"
-                                        "  c and d < 0 with c > d.")
-                    return             
-
-                A_R1, A_R2, A_R3 = a1, a2, a3
-                B_R1, B_R2, B_R3 = b1, b2, b3
-                C_R1, C_R2, C_R3 = c1, c2, c3
-                D_R1, D_R2, D_R3 = d1, d2, d3
-        if mode in ["default", "modify"]:
-            A_R1 = A_R2 = A_R3 = a
-            B_R1 = B_R2 = B_R3 = b
-            C_R1 = C_R2 = C_R3 = c
-            D_R1 = D_R2 = D_R3 = d
-        hyp_set = True
+        apply_parameters(mu, sigma, new_references, new_boundaries)
         messagebox.showinfo("Success", "Parameters have been set.")
+    
+    def apply_parameters(new_mu, new_sigma, new_references, new_boundaries):
+        all_channels = apply_all_var.get()
+        popup.destroy()
+        set_active_parameters(new_mu, new_sigma, new_references, new_boundaries, all_channels)
+    
+    def load_preset():
+        name = preset_var.get()
+        if not name:
+            messagebox.showinfo("Missing", "Please select a preset.")
+            return
+        try:
+            apply_parameters(*result_cache.preset(name))
+        except (KeyError, TypeError, ValueError) as e:
+            messagebox.showerror("Error", f"Preset '{name}' could not be loaded: {e}")
+    
+    def save_preset():
+        if not hyp_set:
+            messagebox.showinfo("Missing", "Please set parameters before saving them as a preset.")
+            return
+        name = simpledialog.askstring("Save Preset", "Preset name:", parent=popup)
+        if not name:
+            return
+        result_cache.save_preset(name.strip(), mu, sigma, references, boundaries)
+        messagebox.showinfo("Success", f"Current parameters saved as '{name.strip()}'.")
         popup.destroy()
-        update_reference_lines()
     
     tk.Button(bottom_frame, text="Calculate & Set", font=custom_font, command=calculate_and_set_params).pack(pady=10)
+    
+    preset_var = tk.StringVar(value="")
+    if result_cache is not None:
+        preset_frame = tk.Frame(bottom_frame)
+        preset_frame.pack()
+        preset_names = sorted(result_cache.load_presets())
+        tk.Label(preset_frame, text="Preset:", font=custom_font).pack(side="left", padx=5)
+        if preset_names:
+            preset_var.set(preset_names[0])
+            tk.OptionMenu(preset_frame, preset_var, *preset_names).pack(side="left")
+            tk.Button(preset_frame, text="Load Preset", font=custom_font, command=load_preset).pack(side="left", padx=5)
+        tk.Button(preset_frame, text="Save Current as Preset", font=custom_font,
+                  command=save_preset).pack(side="left", padx=5)
+
+def preprocess_popup():
+    popup = tk.Toplevel(root)
+    popup.iconbitmap("icon-png.ico")
+    popup.title("Preprocessing")
+    popup.geometry("420x260")
+    tk.Label(popup, text="Steps run in this order on every channel before encoding.",
+             font=custom_font, fg="gray").pack(pady=5)
+    
+    current = {step["step"]: step for step in preprocessing}
+    step_frame = tk.Frame(popup)
+    step_frame.pack(padx=10, pady=5)
+    rows = {}
+    for row, (name, label, size_key, default) in enumerate([
+            ("detrend", "Detrend, block", "block", 1024), ("median", "Median, width", "width", 5),
+            ("moving_average", "Moving average, width", "width", 5), ("decimate", "Decimate, factor", "factor", 4)]):
+        enabled = tk.BooleanVar(value=name in current)
+        tk.Checkbutton(step_frame, text=label, variable=enabled, font=custom_font).grid(row=row, column=0, sticky="w")
+        entry = tk.Entry(step_frame, width=8)
+        entry.insert(0, str(current.get(name, {}).get(size_key, default)))
+        entry.grid(row=row, column=1, padx=5, pady=3)
+        rows[name] = (enabled, entry, size_key)
+    keep_level_var = tk.BooleanVar(value=current.get("detrend", {}).get("keep_level", True))
+    tk.Checkbutton(step_frame, text="keep level", variable=keep_level_var, font=custom_font).grid(row=0, column=2, sticky="w")
+    decimate_mode_var = tk.StringVar(value=current.get("decimate", {}).get("mode", "pick"))
+    tk.OptionMenu(step_frame, decimate_mode_var, "pick", "mean").grid(row=3, column=2, sticky="w")
+    
+    def apply_preprocessing():
+        global preprocessing
+        steps = []
+        for name, (enabled, entry, size_key) in rows.items():
+            if not enabled.get():
+                continue
+            try:
+                size = int(entry.get())
+            except ValueError:
+                messagebox.showerror("Error", f"{name.replace('_', ' ').capitalize()} needs a whole number.")
+                return
+            step = {"step": name, size_key: size}
+            if name == "detrend":
+                step["keep_level"] = keep_level_var.get()
+            if name == "decimate":
+                step["mode"] = decimate_mode_var.get()
+            steps.append(step)
+        try:
+            steps = dbc_preprocess.validate_steps(steps)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        preprocessing = steps
+        preprocess_label.config(text=f"Preprocessing: {dbc_preprocess.describe(preprocessing)}")
+        if loaded_dataset is not None:
+            show_dataset(loaded_dataset)
+            refresh_results()
+        popup.destroy()
+    
+    tk.Button(popup, text="Apply", font=custom_font, command=apply_preprocessing).pack(pady=10)
+
+def envelope(data, points=1000):
+    # Min/max per bin, so a long trace plots with a few thousand points
+    if len(data) <= 2 * points:
+        return np.arange(len(data)), data
+    size = -(-len(data) // points)
+    padded = np.full(size * points, np.nan)
+    padded[:len(data)] = data
+    bins = padded.reshape(points, size)
+    x = np.repeat(np.arange(points) * size, 2)
+    return x, np.column_stack([np.fmin.reduce(bins, axis=1), np.fmax.reduce(bins, axis=1)]).ravel()
+
+def tune_parameters_popup():
+    if loaded_data is None:
+        messagebox.showerror("Error", "No data loaded. Please load data first.")
+        return
+    if hyp_set:
+        tune_mu, tune_sigma, start_references, start_boundaries = mu, sigma, references, boundaries
+    else:
+        tune_mu, tune_sigma = float(np.nanmean(loaded_data)), float(np.nanstd(loaded_data))
+        start_references, start_boundaries = dbc.default_parameters(tune_mu, tune_sigma)
+    try:
+        encoder = dbc_tuning.IncrementalEncoder(loaded_data, start_references, start_boundaries, missing_var.get())
+    except ValueError as e:
+        messagebox.showerror("Error", str(e))
+        return
+    names = dbc.reference_names(len(encoder.references))
+    finite = encoder.sorted_data
+    if not len(finite):
+        messagebox.showerror("Error", "The data has no finite samples.")
+        return
+    low = min(float(finite[0]), float(encoder.references.min()))
+    high = max(float(finite[-1]), float(encoder.references.max()))
+    span = max(high - low, float(np.abs(encoder.boundaries).max()), 1e-9)
+    trace_x, trace_y = envelope(encoder.data)
+    
+    popup = tk.Toplevel(root)
+    popup.iconbitmap("icon-png.ico")
+    popup.title("Tune Parameters")
+    popup.geometry("640x760")
+    
+    top_frame = tk.Frame(popup)
+    top_frame.pack(fill="x", pady=5)
+    tk.Label(top_frame, text="Reference:", font=custom_font).pack(side="left", padx=5)
+    tune_var = tk.StringVar(value=rule_reference_var.get() if rule_reference_var.get() in names else names[0])
+    tk.OptionMenu(top_frame, tune_var, *names, command=lambda name: load_sliders()).pack(side="left")
+    status_label = tk.Label(top_frame, text="", font=custom_font, fg="gray")
+    status_label.pack(side="left", padx=10)
+    
+    fig = Figure(figsize=(6, 2.5), dpi=100)
+    ax = fig.add_subplot(111)
+    trace_line, = ax.plot(trace_x, trace_y, linewidth=0.7)
+    ax.set_xlabel(r"$\it{i}$", fontdict={"fontname": "Times New Roman","fontsize": 11,"color": "gray"})
+    ax.set_ylabel("Difference", fontdict={"fontname": "Times New Roman","fontsize": 11,"color": "gray"})
+    ax.tick_params(axis='both', labelsize=8, colors="gray")
+    ax.grid(False)
+    boundary_lines = [ax.axhline(y=0, color='black', linestyle='--', lw=0.5) for _ in range(4)]
+    boundary_labels = [ax.annotate(label, xy=(0.01, 0), xycoords=('axes fraction','data'), xytext=(0, 5),
+                                   textcoords='offset points', ha='left', va='center', fontsize=11)
+                       for label in "abcd"]
+    fig.tight_layout()
+    tune_canvas = FigureCanvasTkAgg(fig, master=popup)
+    tune_canvas.get_tk_widget().configure(borderwidth=0.5, relief="solid")
+    tune_canvas.get_tk_widget().pack(padx=10, pady=5)
+    
+    slider_frame = tk.Frame(popup)
+    slider_frame.pack(fill="x", padx=10)
+    sliders = []
+    for row, (label, from_, to) in enumerate([("R", low, high), ("a", 0, span), ("b", 0, span),
+                                              ("c", -span, 0), ("d", -span, 0)]):
+        tk.Label(slider_frame, text=f"{label}:", font=custom_font).grid(row=row, column=0, sticky="e", padx=5)
+        slider = tk.Scale(slider_frame, from_=from_, to=to, resolution=span / 1000, orient="horizontal",
+                          length=520, showvalue=True, digits=6, command=lambda value: schedule_update())
+        slider.grid(row=row, column=1, sticky="w")
+        sliders.append(slider)
+    
+    counts_label = tk.Label(popup, text="", font=("Courier New", 9), justify="left")
+    counts_label.pack(padx=10, pady=5, anchor="w")
+    strand_text = tk.Text(popup, wrap="word", width=80, height=8, font=("Courier New", 9),
+                          borderwidth=0.5, relief="solid")
+    strand_text.pack(padx=10, pady=5)
+    for name, color in zip(dbc.reference_names(dbc.MAX_REFERENCES), REFERENCE_COLORS):
+        strand_text.tag_config(name, foreground=color)
+    
+    # Slider events are coalesced and applied at most once per frame
+    state = {"pending": None, "loaded": None}
+    
+    def load_sliders():
+        index = names.index(tune_var.get())
+        for slider, value in zip(sliders, [encoder.references[index], *encoder.boundaries[index]]):
+            slider.set(value)
+        # Sliders round to their resolution; values not moved by the user are left as they are
+        state["loaded"] = [float(slider.get()) for slider in sliders]
+        show_state()
+    
+    def schedule_update():
+        if state["pending"] is None:
+            state["pending"] = popup.after(33, apply_update)
+    
+    def apply_update():
+        state["pending"] = None
+        index = names.index(tune_var.get())
+        values = [float(slider.get()) for slider in sliders]
+        if values == state["loaded"]:
+            return
+        exact = [encoder.references[index], *encoder.boundaries[index]]
+        R, a, b, c, d = [value if value != loaded else current
+                         for value, loaded, current in zip(values, state["loaded"], exact)]
+        state["loaded"] = values
+        started = time.perf_counter()
+        try:
+            recoded = encoder.update(index, R, (a, b, c, d))
+        except ValueError as e:
+            status_label.config(text=str(e), fg="red")
+            return
+        status_label.config(text=f"{recoded} samples re-coded in {(time.perf_counter() - started) * 1000:.1f} ms",
+                            fg="gray")
+        show_state()
+    
+    def show_state():
+        index = names.index(tune_var.get())
+        R = encoder.references[index]
+        trace_line.set_ydata(trace_y - R)
+        for line, label, value in zip(boundary_lines, boundary_labels, encoder.boundaries[index]):
+            line.set_ydata([value, value])
+            label.xy = (0.01, value)
+        values = np.concatenate([trace_y[np.isfinite(trace_y)] - R, encoder.boundaries[index]])
+        margin = 0.05 * (values.max() - values.min() or 1)
+        ax.set_ylim(values.min() - margin, values.max() + margin)
+        tune_canvas.draw_idle()
+        counts = encoder.counts()
+        totals = np.maximum(counts.sum(axis=1, keepdims=True), 1)
+        counts_label.config(text="\n".join(
+            f"{name}: " + "  ".join(f"{base} {100 * n / total:5.1f}%" for base, n in zip(dbc.BASES, row))
+            for name, row, total in zip(names, counts, totals[:, 0])))
+        strand_text.config(state="normal")
+        strand_text.delete("1.0", tk.END)
+        for i, name in enumerate(names):
+            strand = dbc.strand_text(encoder.codes[i, :200]) + ("..." if encoder.codes.shape[1] > 200 else "")
+            strand_text.insert(tk.END, f"DNA{i + 1}: {strand}\n\n", name)
+        strand_text.config(state="disabled")
+    
+    def apply_tuned():
+        if state["pending"] is not None:
+            popup.after_cancel(state["pending"])
+            apply_update()
+        popup.destroy()
+        set_active_parameters(tune_mu, tune_sigma, encoder.references.copy(), encoder.boundaries.copy())
+        refresh_results()
+    
+    button_row = tk.Frame(popup)
+    button_row.pack(pady=10)
+    tk.Button(button_row, text="Apply", font=custom_font, command=apply_tuned).pack(side="left", padx=5)
+    tk.Button(button_row, text="Close", font=custom_font, command=popup.destroy).pack(side="left", padx=5)
+    load_sliders()
 
 def show_dna_forming_rules_popup():
     popup = tk.Toplevel(root)
@@ -572,16 +856,15 @@ def show_dna_forming_rules_popup():
         "      - These computed values serve as the final parameters for data conversion.\n\n"
         "   b. Modify Equation Mode:\n"
         "      - Base values for μ and σ are provided, along with multipliers:\n"
-        "           R₁ = μ\n"
-        "           For R₂: a multiplier m, so that R₂ = μ + m·σ\n"
-        "           For R₃: a multiplier n, so that R₃ = μ − n·σ\n"
+        "           For each reference Rᵢ (1 to 8 references): a multiplier kᵢ, so that Rᵢ = μ + kᵢ·σ\n"
+        "           (k = 0, 4, −4 reproduces R₁ = μ, R₂ = μ + 4σ, R₃ = μ − 4σ)\n"
         "           For the conversion boundaries: multipliers α, β, γ, δ such that\n"
         "                 a = α·σ,  b = β·σ,  c = γ·σ,  d = δ·σ\n"
         "      - These calculations yield the final parameters in this mode.\n\n"
         "   c. Direct Input Mode:\n"
-        "      - The values for R₁, R₂, R₃ and for the boundaries a, b, c, d are entered directly,without further calculation.\n\n"
+        "      - The number of references N (1 to 8), the values for R₁ … R_N and for the boundaries a, b, c, d are entered directly, without further calculation.\n\n"
         "In all modes, the final set of parameters used are:\n"
-        "   - The reference values: R₁, R₂, R₃\n"
+        "   - The reference values: R₁ … R_N (R₁, R₂, R₃ unless changed)\n"
         "   - Their respective conversion boundaries: a, b, c, and d\n"
         "   - Note that conversion boundaries must satisfy: (1) a and b > 0 with a > b. (2) c and d < 0 with c > d.\n\n"
         "2. DNA-Forming Rules:\n\n"
@@ -590,8 +873,12 @@ def show_dna_forming_rules_popup():
         "         • If c < Difference < b, then assign 'A'.\n"
         "         • If b ≤ Difference ≤ a, then assign 'C'.\n"
         "         • If d ≤ Difference ≤ c, then assign 'G'.\n"
-        "         • If Difference > a or Difference < d, then assign 'T'.\n\n"
-        "   - This conversion transforms the entire array of differences into a strand (a string of nucleotides) for each reference (R₁, R₂, and R₃).\n\n"
+        "         • If Difference > a or Difference < d, then assign 'T'.\n"
+        "         • If the data point is missing (NaN) or infinite, the 'Missing samples' setting decides:\n"
+        "             mark N - assign 'N' in every strand,\n"
+        "             drop   - leave the data point out of every strand,\n"
+        "             ffill  - use the last finite data point instead.\n\n"
+        "   - This conversion transforms the entire array of differences into a strand (a string of nucleotides) for each reference (R₁ … R_N).\n\n"
     )
     explanation_text.insert("1.0", explanation)
     explanation_text.config(state="disabled")
@@ -602,15 +889,13 @@ def visualize_conversion_rules_embedded(selected):
         messagebox.showerror("Error", "No data loaded. Please load data first.")
         return
     
-    if selected == "R1":
-        R = R1; A_val = A_R1; B_val = B_R1; C_val = C_R1; D_val = D_R1
-    elif selected == "R2":
-        R = R2; A_val = A_R2; B_val = B_R2; C_val = C_R2; D_val = D_R2
-    elif selected == "R3":
-        R = R3; A_val = A_R3; B_val = B_R3; C_val = C_R3; D_val = D_R3
-    else:
+    names = dbc.reference_names(len(references))
+    if selected not in names:
         messagebox.showerror("Error", "Invalid reference selection.")
         return
+    index = names.index(selected)
+    R = references[index]
+    A_val, B_val, C_val, D_val = boundaries[index]
 
     diff_data = np.array(loaded_data) - R
 
@@ -659,42 +944,11 @@ def visualize_conversion_rules_embedded(selected):
     conv_canvas.get_tk_widget().configure(borderwidth=0.5, relief="solid")
     conv_canvas.get_tk_widget().pack()
 
-def create_difference_data(final_individual_file_data, R_values):    
-    difference_data = {}
-    dataset = final_individual_file_data[0]  # our only dataset
-    for key in R_values:
-        R_value = R_values[key]
-        differences = [x - R_value for x in dataset['Numerical Data']]
-        difference_data[key] = differences
-    return difference_data
-
-def create_strand_data(difference_data, A_values, B_values, C_values, D_values):    
-    strand_data = {}
-    for key in difference_data:
-        diffs = difference_data[key]
-        strand = ""
-        for diff in diffs:
-            if C_values[key] < diff < B_values[key]:
-                strand += 'A'
-            elif B_values[key] <= diff <= A_values[key]:
-                strand += 'C'
-            elif D_values[key] <= diff <= C_values[key]:
-                strand += 'G'
-            elif diff > A_values[key] or diff < D_values[key]:
-                strand += 'T'
-        strand_data[key] = strand
-    return strand_data
-
-def create_dna_strand(strand_R1, strand_R2, strand_R3):    
-    dna_strand = ""
-    length = len(strand_R1)
-    for i in range(length):
-        dna_strand += strand_R1[i] + strand_R2[i] + strand_R3[i]
-    return dna_strand
+def current_parameter_sets():
+    return [None if parameters is None else parameters[2:] for parameters in channel_parameters]
 
-def compute_DNA_strand():    
-    global hyp_set, loaded_data, R1, R2, R3
-    global A_R1, A_R2, A_R3, B_R1, B_R2, B_R3, C_R1, C_R2, C_R3, D_R1, D_R2, D_R3
+def compute_channel_codes():
+    global hyp_set, loaded_data, loaded_channels, channel_parameters
 
     if loaded_data is None:
         print("Error: No data loaded. Please load data first.")
@@ -703,26 +957,23 @@ def compute_DNA_strand():
         print("Error: Hyperparameters not set. Please set parameters before computing DNA strands.")
         return None
 
-    final_individual_file_data = [{'Dataset ID': dataset_id, 'Numerical Data': loaded_data}]
-
-    R_values = {'R1': R1, 'R2': R2, 'R3': R3}
-    A_values = {'R1': A_R1, 'R2': A_R2, 'R3': A_R3}
-    B_values = {'R1': B_R1, 'R2': B_R2, 'R3': B_R3}
-    C_values = {'R1': C_R1, 'R2': C_R2, 'R3': C_R3}
-    D_values = {'R1': D_R1, 'R2': D_R2, 'R3': D_R3}
-
-    diff_data = create_difference_data(final_individual_file_data, R_values)
-   
-    strand_data = create_strand_data(diff_data, A_values, B_values, C_values, D_values)
-   
-    strand_R1 = strand_data['R1']
-    strand_R2 = strand_data['R2']
-    strand_R3 = strand_data['R3']
-    
-    dna_strand = create_dna_strand(strand_R1, strand_R2, strand_R3)    
+    # All channels with parameters are encoded together in one (channels x N x samples) pass.
+    parameter_sets = current_parameter_sets()
+    if dataset_browser is not None and browser_index is not None:
+        return dataset_browser.codes(browser_index, parameter_sets, missing_var.get(), preprocessing)
+    if result_cache is not None and loaded_dataset is not None:
+        return result_cache.encode(loaded_dataset, parameter_sets, missing_var.get(), preprocessing)[0]
+    return dbc.encode_channel_sets(loaded_channels, parameter_sets, missing_var.get())
+
+def compute_DNA_strand():    
+    channel_codes = compute_channel_codes()
+    if channel_codes is None:
+        return None
+
+    result = dbc.strand_results(channel_codes[active_channel])
     
-    print("Final DNA Strand:", dna_strand)
-    return {"DNA(R1)": strand_R1, "DNA(R2)": strand_R2, "DNA(R3)": strand_R3, "DNA": dna_strand}
+    print("Final DNA Strand:", result["DNA"])
+    return result
 
 def form_dna():
     result = compute_DNA_strand()
@@ -730,17 +981,15 @@ def form_dna():
     if result is None:
         return
     dna_text_area.delete("1.0", tk.END)
+    if len(channel_names) > 1:
+        dna_text_area.insert(tk.END, f"Channel: {channel_names[active_channel]}\n\n")
 
     def truncate_strand(s):
         return s if len(s) <= 200 else s[:200] + "..."
     
-    dna1_display = truncate_strand(result['DNA(R1)'])
-    dna2_display = truncate_strand(result['DNA(R2)'])
-    dna3_display = truncate_strand(result['DNA(R3)'])
-    
-    dna_text_area.insert(tk.END, f"DNA1: {dna1_display}\n\n", "R1")
-    dna_text_area.insert(tk.END, f"DNA2: {dna2_display}\n\n", "R2")
-    dna_text_area.insert(tk.END, f"DNA3: {dna3_display}\n\n", "R3")
+    for i, name in enumerate(dbc.reference_names(len(result["codes"]))):
+        dna_display = truncate_strand(result[f"DNA({name})"])
+        dna_text_area.insert(tk.END, f"DNA{i + 1}: {dna_display}\n\n", name)
 
     dna_text_area.config(state="disabled")
 
@@ -752,6 +1001,7 @@ def form_mrna():
     mrna_text_area.delete("1.0", tk.END)
     mrna_text_area.insert(tk.END, "mRNA: ")
     final_strand = result["DNA"]
+    names = dbc.reference_names(len(result["codes"]))
 
     if len(final_strand) > 600:
         display_strand = final_strand[:600] + "..."
@@ -759,13 +1009,7 @@ def form_mrna():
         display_strand = final_strand
 
     for i, ch in enumerate(display_strand):
-        if i % 3 == 0:
-            tag = "R1"
-        elif i % 3 == 1:
-            tag = "R2"
-        else:
-            tag = "R3"
-        mrna_text_area.insert(tk.END, ch, tag)
+        mrna_text_area.insert(tk.END, ch, names[i % len(names)])
     
     mrna_text_area.insert(tk.END, "\n")
     mrna_text_area.config(state="disabled")
@@ -795,58 +1039,60 @@ def show_mrna_rule():
         "    mRNA = A₁B₁C₁ A₂B₂C₂ A₃B₃C₃ …\n\n"
         "In mathematical notation, if we denote D₁ = DNA1, D₂ = DNA2, and D₃ = DNA3, then:\n"
         "    mRNA = ∏₍ᵢ₌₁₎ⁿ (D₁[i] + D₂[i] + D₃[i])\n\n"
-        "This means that each triplet of nucleotides (one from each strand) is concatenated to form the final mRNA."
+        "This means that each triplet of nucleotides (one from each strand) is concatenated to form the final mRNA.\n\n"
+        "With N references (R1 … RN) the same rule applies: mRNA[i] = DNA1[i] + DNA2[i] + … + DNAN[i]. "
+        "When N ≠ 3 a codon no longer corresponds to one sample, so the protein is read in all three reading frames."
     )
     rule_text.insert("1.0", explanation)
     rule_text.config(state="disabled")
 
+def read_window_settings():
+    try:
+        window = int(window_entry.get())
+        hop = int(hop_entry.get())
+    except ValueError:
+        messagebox.showerror("Error", "Window and hop must be whole numbers of samples.")
+        return None
+    if window < 1 or hop < 1:
+        messagebox.showerror("Error", "Window and hop must be positive.")
+        return None
+    return window, hop
+
+def windowed_protein_seqs(codes, window, hop):
+    return [dbc.protein_text(protein) for protein in dbc.windowed_proteins(codes, window, hop)]
+
 def generate_protein():    
+    window_settings = None
+    if windowed_var.get():
+        window_settings = read_window_settings()
+        if window_settings is None:
+            return
     result = compute_DNA_strand()  
     if result is None:
         return
-    final_strand = result["DNA"]    
     
-    codon_to_amino_acid = {
-        "ATT": "I", "ATC": "I", "ATA": "I",
-        "CTT": "L", "CTC": "L", "CTA": "L", "CTG": "L", "TTA": "L", "TTG": "L",
-        "GTT": "V", "GTC": "V", "GTA": "V", "GTG": "V",
-        "TTT": "F", "TTC": "F",
-        "ATG": "M",
-        "TGT": "C", "TGC": "C",
-        "GCT": "A", "GCC": "A", "GCA": "A", "GCG": "A",
-        "GGT": "G", "GGC": "G", "GGA": "G", "GGG": "G",
-        "CCT": "P", "CCC": "P", "CCA": "P", "CCG": "P",
-        "ACT": "T", "ACC": "T", "ACA": "T", "ACG": "T",
-        "TCT": "S", "TCC": "S", "TCA": "S", "TCG": "S", "AGT": "S", "AGC": "S",
-        "TAT": "Y", "TAC": "Y",
-        "TGG": "W",
-        "CAA": "Q", "CAG": "Q",
-        "AAT": "N", "AAC": "N",
-        "CAT": "H", "CAC": "H",
-        "GAA": "E", "GAG": "E",
-        "GAT": "D", "GAC": "D",
-        "AAA": "K", "AAG": "K",
-        "CGT": "R", "CGC": "R", "CGA": "R", "CGG": "R", "AGA": "R", "AGG": "R",
-        "TAA": "X", "TAG": "X", "TGA": "X"
-    }
-    
-    protein_seq = ""
-    
-    for i in range(0, len(final_strand), 3):
-        codon = final_strand[i:i+3]
-        if len(codon) < 3:
-            break  
-        protein_seq += codon_to_amino_acid.get(codon, "-")  
-        
     protein_text_area.config(state="normal")
     protein_text_area.delete("1.0", tk.END)
+
+    def truncate_protein(s):
+        return s if len(s) <= 200 else s[:200] + "..."
     
-    if len(protein_seq) > 200:
-        display_protein = protein_seq[:200] + "..."
+    if window_settings is not None:
+        window, hop = window_settings
+        windows = dbc.windowed_proteins(result["codes"], window, hop)
+        protein_text_area.insert(tk.END, f"Windowed Proteins: {windows.shape[0]} windows × {windows.shape[1]} codons "
+                                         f"(window = {window}, hop = {hop})\n")
+        for i, protein in enumerate(windows[:20]):
+            protein_text_area.insert(tk.END, f"[{i * hop}:{i * hop + window}] {truncate_protein(dbc.protein_text(protein))}\n")
+        if len(windows) > 20:
+            protein_text_area.insert(tk.END, "...\n")
+    elif len(result["codes"]) == 3:
+        display_protein = truncate_protein(generate_protein_seq(result["mRNA codes"]))
+        protein_text_area.insert(tk.END, f"Protein (Amino Acids Sequence): {display_protein}\n")
     else:
-        display_protein = protein_seq
-
-    protein_text_area.insert(tk.END, f"Protein (Amino Acids Sequence): {display_protein}\n")
+        # Codons no longer line up with samples, so show all three reading frames.
+        for frame, protein_seq in enumerate(generate_protein_frames(result["mRNA codes"])):
+            protein_text_area.insert(tk.END, f"Protein (Frame {frame + 1}): {truncate_protein(protein_seq)}\n")
     protein_text_area.config(state="disabled")
 
 def show_genetic_rules():    
@@ -889,59 +1135,51 @@ def show_genetic_rules():
         "  • GAT, GAC  → Aspartic Acid (D)\n"
         "  • AAA, AAG  → Lysine (K)\n"
         "  • CGT, CGC, CGA, CGG, AGA, AGG  → Arginine (R)\n"
-        "  • TAA, TAG, TGA  → Stop Codon (X)\n\n"
+        "  • TAA, TAG, TGA  → Stop Codon (X)\n"
+        "  • Any codon containing N (a missing sample)  → Unknown (-)\n\n"
         "The final protein sequence is generated by reading the mRNA in successive triplets (codons) and mapping each codon to its corresponding amino acid as listed above."
     )
     rule_text.insert("1.0", explanation)
     rule_text.config(state="disabled")
 
-def generate_protein_seq(final_strand):
-    codon_to_amino_acid = {
-        "ATT": "I", "ATC": "I", "ATA": "I",
-        "CTT": "L", "CTC": "L", "CTA": "L", "CTG": "L", "TTA": "L", "TTG": "L",
-        "GTT": "V", "GTC": "V", "GTA": "V", "GTG": "V",
-        "TTT": "F", "TTC": "F",
-        "ATG": "M",
-        "TGT": "C", "TGC": "C",
-        "GCT": "A", "GCC": "A", "GCA": "A", "GCG": "A",
-        "GGT": "G", "GGC": "G", "GGA": "G", "GGG": "G",
-        "CCT": "P", "CCC": "P", "CCA": "P", "CCG": "P",
-        "ACT": "T", "ACC": "T", "ACA": "T", "ACG": "T",
-        "TCT": "S", "TCC": "S", "TCA": "S", "TCG": "S", "AGT": "S", "AGC": "S",
-        "TAT": "Y", "TAC": "Y",
-        "TGG": "W",
-        "CAA": "Q", "CAG": "Q",
-        "AAT": "N", "AAC": "N",
-        "CAT": "H", "CAC": "H",
-        "GAA": "E", "GAG": "E",
-        "GAT": "D", "GAC": "D",
-        "AAA": "K", "AAG": "K",
-        "CGT": "R", "CGC": "R", "CGA": "R", "CGG": "R", "AGA": "R", "AGG": "R",
-        "TAA": "X", "TAG": "X", "TGA": "X"
-    }
-    protein_seq = ""
-    for i in range(0, len(final_strand), 3):
-        codon = final_strand[i:i+3]
-        if len(codon) < 3:
-            break
-        protein_seq += codon_to_amino_acid.get(codon, "-")
-    return protein_seq
+def generate_protein_seq(final_strand, frame=0):
+    if isinstance(final_strand, str):
+        final_strand = dbc.strand_codes(final_strand)
+    return dbc.protein_text(dbc.translate(final_strand, frame))
+
+def generate_protein_frames(final_strand):
+    return [generate_protein_seq(final_strand, frame) for frame in range(3)]
+
+def export_fields(codes, window_settings=None):
+    fields = dbc_codec.run_length_fields(codes) if run_length_var.get() else dbc.export_fields(codes)
+    if window_settings is not None:
+        window, hop = window_settings
+        fields["Windowed Proteins"] = {"Window": window, "Hop": hop,
+                                       "Proteins": windowed_protein_seqs(codes, window, hop)}
+    return fields
 
 def export_results():
     global dataset_id  
-    result = compute_DNA_strand()
-    if result is None:
+    window_settings = None
+    if windowed_var.get():
+        window_settings = read_window_settings()
+        if window_settings is None:
+            return
+    channel_codes = compute_channel_codes()
+    if channel_codes is None:
         messagebox.showerror("Error", "No results available. Make sure data is loaded and parameters are set.")
         return
-    protein_seq = generate_protein_seq(result["DNA"])
-    export_data = [{
-        "Dataset ID": dataset_id,
-        "DNA1": result["DNA(R1)"],
-        "DNA2": result["DNA(R2)"],
-        "DNA3": result["DNA(R3)"],
-        "mRNA": result["DNA"],
-        "Protein (Amino Acids Sequence)": protein_seq
-    }]
+    export_entry = {"Dataset ID": dataset_id}
+    if preprocessing:
+        export_entry["Preprocessing"] = preprocessing
+    if not np.isfinite(loaded_channels).all():
+        export_entry["Missing Samples"] = missing_var.get()
+    if len(channel_names) == 1:
+        export_entry.update(export_fields(channel_codes[0], window_settings))
+    else:
+        export_entry["Channels"] = {name: export_fields(codes, window_settings)
+                                    for name, codes in zip(channel_names, channel_codes) if codes is not None}
+    export_data = [export_entry]
     file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json")])
     if file_path:
         try:
@@ -976,6 +1214,21 @@ top_left = tk.Frame(left_frame)
 top_left.pack(pady=10)
 load_button = tk.Button(top_left, text="Load Data", font=custom_font, command=load_data)
 load_button.pack(side="left")
+folder_button = tk.Button(top_left, text="Open Folder", font=custom_font, command=open_dataset_folder)
+folder_button.pack(side="left", padx=5)
+preprocess_button = tk.Button(top_left, text="Preprocess", font=custom_font, command=preprocess_popup)
+preprocess_button.pack(side="left", padx=5)
+
+channel_var = tk.StringVar(value="")
+channel_frame = tk.Frame(top_left)
+channel_frame.pack(side="left", padx=10)
+
+tk.Label(top_left, text="Missing samples:", font=custom_font).pack(side="left", padx=5)
+missing_var = tk.StringVar(value="mark")
+tk.OptionMenu(top_left, missing_var, *dbc.MISSING_POLICIES).pack(side="left")
+
+preprocess_label = tk.Label(left_frame, text="Preprocessing: none", font=custom_font, fg="gray")
+preprocess_label.pack()
 
 plot_frame = tk.Frame(left_frame)
 plot_frame.pack(fill=tk.BOTH, expand=False, padx=10, pady=10)
@@ -993,6 +1246,9 @@ dna_rules_button.pack(side="left", padx=5)
 param_button = tk.Button(button_frame, text="Set Parameters", font=custom_font, command=set_parameters_popup)
 param_button.pack(side="left", padx=5)
 
+tune_button = tk.Button(button_frame, text="Tune", font=custom_font, command=tune_parameters_popup)
+tune_button.pack(side="left", padx=5)
+
 param_link = tk.Label(button_frame, text="Parameters", fg="grey",
                       cursor="hand2", font=("Arial", 10, "underline"))
 param_link.bind("<Button-1>", show_parameters_popup)
@@ -1004,9 +1260,9 @@ rule_selection_frame.pack(pady=5)
 tk.Label(rule_selection_frame, text="Select Reference (R):", font=custom_font).pack(side="left", padx=5)
 
 rule_reference_var = tk.StringVar(value="R1")
-tk.Radiobutton(rule_selection_frame, text="R1", variable=rule_reference_var, value="R1", font=custom_font).pack(side="left", padx=5)
-tk.Radiobutton(rule_selection_frame, text="R2", variable=rule_reference_var, value="R2", font=custom_font).pack(side="left", padx=5)
-tk.Radiobutton(rule_selection_frame, text="R3", variable=rule_reference_var, value="R3", font=custom_font).pack(side="left", padx=5)
+reference_radio_frame = tk.Frame(rule_selection_frame)
+reference_radio_frame.pack(side="left")
+update_reference_selector()
 
 rule_ok_button = tk.Button(rule_selection_frame, text="Show DNA-Forming Rules", font=custom_font,
                             command=lambda: visualize_conversion_rules_embedded(rule_reference_var.get()))
@@ -1030,9 +1286,8 @@ dna_scrollbar = tk.Scrollbar(dna_text_frame, command=dna_text_area.yview)
 dna_scrollbar.pack(side="right", fill="y")
 dna_text_area.config(yscrollcommand=dna_scrollbar.set)
 
-dna_text_area.tag_config("R1", foreground="blue")
-dna_text_area.tag_config("R2", foreground="green")
-dna_text_area.tag_config("R3", foreground="red")
+for name, color in zip(dbc.reference_names(dbc.MAX_REFERENCES), REFERENCE_COLORS):
+    dna_text_area.tag_config(name, foreground=color)
 
 mrna_button_frame = tk.Frame(right_frame)
 mrna_button_frame.pack(pady=10)
@@ -1055,9 +1310,8 @@ mrna_scrollbar = tk.Scrollbar(mrna_text_frame, command=mrna_text_area.yview)
 mrna_scrollbar.pack(side="right", fill="y")
 mrna_text_area.config(yscrollcommand=mrna_scrollbar.set)
 
-mrna_text_area.tag_config("R1", foreground="blue")
-mrna_text_area.tag_config("R2", foreground="green")
-mrna_text_area.tag_config("R3", foreground="red")
+for name, color in zip(dbc.reference_names(dbc.MAX_REFERENCES), REFERENCE_COLORS):
+    mrna_text_area.tag_config(name, foreground=color)
 
 protein_button_frame = tk.Frame(right_frame)
 protein_button_frame.pack(pady=10)
@@ -1070,6 +1324,17 @@ genetic_rule_label.pack(side="left", padx=5)
 protein_button = tk.Button(protein_button_frame, text="Protein", font=custom_font, command=generate_protein)
 protein_button.pack(side="left", padx=5)
 
+windowed_var = tk.BooleanVar(value=False)
+tk.Checkbutton(protein_button_frame, text="Windowed", variable=windowed_var, font=custom_font).pack(side="left", padx=5)
+tk.Label(protein_button_frame, text="Window:", font=custom_font).pack(side="left")
+window_entry = tk.Entry(protein_button_frame, width=6)
+window_entry.insert(0, "150")
+window_entry.pack(side="left", padx=2)
+tk.Label(protein_button_frame, text="Hop:", font=custom_font).pack(side="left")
+hop_entry = tk.Entry(protein_button_frame, width=6)
+hop_entry.insert(0, "50")
+hop_entry.pack(side="left", padx=2)
+
 protein_text_frame = tk.Frame(right_frame)
 protein_text_frame.pack(pady=10)
 
@@ -1080,8 +1345,13 @@ protein_scrollbar = tk.Scrollbar(protein_text_frame, command=protein_text_area.y
 protein_scrollbar.pack(side="right", fill="y")
 protein_text_area.config(yscrollcommand=protein_scrollbar.set)
 
-export_button = tk.Button(right_frame, text="Export Results", font=custom_font, command=export_results)
-export_button.pack(pady=10)
+export_frame = tk.Frame(right_frame)
+export_frame.pack(pady=10)
+export_button = tk.Button(export_frame, text="Export Results", font=custom_font, command=export_results)
+export_button.pack(side="left", padx=5)
+run_length_var = tk.BooleanVar(value=False)
+tk.Checkbutton(export_frame, text="Run-length strands", variable=run_length_var,
+               font=custom_font).pack(side="left", padx=5)
 
 
 root.mainloop()
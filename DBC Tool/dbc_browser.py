@@ -0,0 +1,160 @@
+"""
+=========================================================
+ DBC dataset browser
+=========================================================
+ Keeps a folder of data files (e.g. Normal-Abnormal-
+ Datasets/) ready for stepping through in the DBC Tool:
+
+   - the file list with each file's header metadata
+     (Pattern Type, Dataset ID, ...), read once
+   - an in-memory LRU cache of parsed arrays, strand
+     codes and the GUI's plot figures per file
+   - a background thread that parses and encodes the
+     neighbours of the selected file, nearest first
+
+ Parsed files and codes also go through the on-disk
+ result cache (dbc_cache.py) when one is given.
+=========================================================
+"""
+
+import collections
+import glob
+import itertools
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import dbc_engine as dbc
+import dbc_cache
+import dbc_preprocess
+
+HEADER_LINES = 32
+
+
+def natural_key(path):
+    # "2.txt" sorts before "10.txt"
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", os.path.basename(path))]
+
+def list_datasets(folder, pattern="*.txt"):
+    return sorted((path for path in glob.glob(os.path.join(folder, pattern)) if os.path.isfile(path)),
+                  key=natural_key)
+
+def read_header(path):
+    with open(path, "r", errors="replace") as file:
+        lines = list(itertools.islice(file, HEADER_LINES))
+    metadata = dict(dbc.parse_dataset([line.rstrip("\r\n") for line in lines])["Metadata"])
+    metadata.pop("Channels", None)
+    return metadata
+
+
+class DatasetBrowser:
+    def __init__(self, folder, result_cache=None, pattern="*.txt", capacity=32, radius=2):
+        self.folder = folder
+        self.result_cache = result_cache
+        self.capacity = capacity
+        self.radius = radius
+        self.paths = list_datasets(folder, pattern)
+        self.headers = [read_header(path) for path in self.paths]
+        self.entries = collections.OrderedDict()   # path -> {"Dataset", "Codes", "Figure"}, most recent last
+        self.pending = {}                          # path -> future of a prefetch
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def label(self, index):
+        header = self.headers[index]
+        return "  ".join([os.path.basename(self.paths[index])] + [f"{key}: {value}" for key, value in header.items()])
+
+    def neighbours(self, index):
+        # index + 1, index - 1, index + 2, ... within the list
+        order = []
+        for step in range(1, self.radius + 1):
+            order += [i for i in (index + step, index - step) if 0 <= i < len(self.paths)]
+        return order
+
+    # Entries
+    def store(self, path, entry):
+        with self.lock:
+            self.entries[path] = entry
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def cached(self, index):
+        path = self.paths[index]
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None:
+                self.entries.move_to_end(path)
+            return entry
+
+    def load(self, path):
+        if self.result_cache is not None:
+            dataset = self.result_cache.load_dataset(path)
+        else:
+            dataset = dbc.load_dataset(path)
+        entry = {"Dataset": dataset, "Codes": None, "Figure": None}
+        self.store(path, entry)
+        return entry
+
+    def entry(self, index):
+        path = self.paths[index]
+        entry = self.cached(index)
+        if entry is not None:
+            return entry
+        with self.lock:
+            future = self.pending.get(path)
+        if future is not None and not future.cancelled():
+            try:
+                future.result()
+            except Exception:
+                pass
+            entry = self.cached(index)
+            if entry is not None:
+                return entry
+        return self.load(path)
+
+    def codes(self, index, parameter_sets, missing="mark", preprocessing=None):
+        entry = self.entry(index)
+        key = dbc_cache.parameter_key(parameter_sets, missing, preprocessing)
+        if entry["Codes"] is not None and entry["Codes"][0] == key:
+            return entry["Codes"][1]
+        dataset = entry["Dataset"]
+        if self.result_cache is not None:
+            codes = self.result_cache.encode(dataset, parameter_sets, missing, preprocessing)[0]
+        else:
+            data = dbc_preprocess.preprocess(dataset["Numerical Data"], preprocessing)
+            codes = dbc.encode_channel_sets(data, parameter_sets, missing)
+        entry["Codes"] = (key, codes)
+        return codes
+
+    # Background prefetch
+    def prefetch(self, index, parameter_sets=None, missing="mark", preprocessing=None):
+        wanted = [self.paths[i] for i in self.neighbours(index)]
+        with self.lock:
+            for path, future in list(self.pending.items()):
+                if path not in wanted and future.cancel():
+                    del self.pending[path]
+        for i in self.neighbours(index):
+            path = self.paths[i]
+            with self.lock:
+                if path in self.pending:
+                    continue
+                self.pending[path] = self.executor.submit(self.prefetch_one, i, parameter_sets, missing,
+                                                     preprocessing)
+
+    def prefetch_one(self, index, parameter_sets, missing, preprocessing=None):
+        try:
+            entry = self.cached(index) or self.load(self.paths[index])
+            n_channels = entry["Dataset"]["Numerical Data"].shape[1]
+            if parameter_sets is not None and len(parameter_sets) == n_channels and any(parameter_sets):
+                self.codes(index, parameter_sets, missing, preprocessing)
+        finally:
+            with self.lock:
+                self.pending.pop(self.paths[index], None)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,242 @@
+"""
+=========================================================
+ DBC result cache and parameter presets
+=========================================================
+ On-disk cache shared by the DBC Tool and its headless
+ tools. Entries are content addressed:
+
+   data-v<engine>-<sha256>.npz      parsed numerical data
+                                     and header metadata,
+                                     keyed by file hash and
+                                     engine version
+   codes-<sha256 of key>.npz        strand codes and
+                                     proteins, keyed by
+                                     (file hash, parameter
+                                     sets, missing-value
+                                     policy, preprocessing
+                                     steps, engine version)
+
+ Entries are compressed .npz files (no pickling). The
+ cache is bounded in size; the least recently used
+ entries are removed first. Named parameter presets are
+ kept next to the cache in presets.json.
+
+ Default location: ~/.dbc_cache (or $DBC_CACHE_DIR).
+
+ Usage:
+   python dbc_cache.py                  size and presets
+   python dbc_cache.py --clear
+   python dbc_cache.py --delete-preset "Spindle A"
+=========================================================
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+
+import dbc_engine as dbc
+import dbc_preprocess
+
+DEFAULT_DIRECTORY = os.environ.get("DBC_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".dbc_cache"))
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+LAST_USED_PRESET = "(last used)"
+
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+def parameter_key(parameter_sets, missing="mark", preprocessing=None):
+    # Exact, order-preserving text form of the per-channel parameter sets
+    # (and of the preprocessing steps, when there are any)
+    channels = []
+    for parameters in parameter_sets:
+        if parameters is None:
+            channels.append(None)
+        else:
+            references, boundaries = dbc.as_parameters(*parameters)
+            channels.append([[float(v).hex() for v in references],
+                             [[float(v).hex() for v in row] for row in boundaries]])
+    key = {"channels": channels, "missing": missing, "engine": dbc.ENGINE_VERSION}
+    steps = dbc_preprocess.steps_key(preprocessing)
+    if steps:
+        key["preprocessing"] = steps
+    return json.dumps(key, sort_keys=True)
+
+
+class ResultCache:
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.entries = os.path.join(directory, "entries")
+        self.max_bytes = max_bytes
+        os.makedirs(self.entries, exist_ok=True)
+
+    # Entries
+    def entry_path(self, name):
+        return os.path.join(self.entries, name + ".npz")
+
+    def read(self, name):
+        path = self.entry_path(name)
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                arrays = {key: entry[key] for key in entry.files}
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile, EOFError):
+            return None   # missing, evicted meanwhile or truncated: a miss
+        try:
+            os.utime(path)   # mark as recently used
+        except OSError:
+            pass
+        return arrays
+
+    def write(self, name, arrays):
+        handle, temporary = tempfile.mkstemp(dir=self.entries, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as file:
+                np.savez_compressed(file, **arrays)
+            os.replace(temporary, self.entry_path(name))
+        except OSError:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            return
+        self.evict()
+
+    def evict(self):
+        # Other processes share the directory and may remove entries during the scan
+        entries = []
+        for entry in os.scandir(self.entries):
+            if entry.name.endswith(".npz"):
+                try:
+                    info = entry.stat()
+                except OSError:
+                    continue
+                entries.append((info.st_mtime, info.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+
+    def size(self):
+        total = 0
+        for entry in os.scandir(self.entries):
+            if entry.name.endswith(".npz"):
+                try:
+                    total += entry.stat().st_size
+                except OSError:
+                    continue
+        return total
+
+    def clear(self):
+        for entry in os.scandir(self.entries):
+            if entry.name.endswith(".npz"):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+
+    # Parsed data files
+    def load_dataset(self, path):
+        with open(path, "rb") as file:
+            content = file.read()
+        file_hash = content_hash(content)
+        name = f"data-v{dbc.ENGINE_VERSION}-{file_hash}"   # parser changes bump the engine version
+        cached = self.read(name)
+        if cached is not None:
+            dataset = json.loads(str(cached["header"]))
+            dataset["Numerical Data"] = cached["data"]
+        else:
+            dataset = dbc.parse_dataset_bytes(content)
+            header = {key: value for key, value in dataset.items() if key != "Numerical Data"}
+            self.write(name, {"header": np.array(json.dumps(header)), "data": dataset["Numerical Data"]})
+        dataset["SHA-256"] = file_hash
+        return dataset
+
+    # Encodings
+    def encode(self, dataset, parameter_sets, missing="mark", preprocessing=None):
+        # Per-channel codes and frame-0 proteins of a dataset from load_dataset
+        key = content_hash((dataset["SHA-256"] + parameter_key(parameter_sets, missing, preprocessing))
+                           .encode("utf-8"))
+        cached = self.read("codes-" + key)
+        channels = range(len(parameter_sets))
+        if cached is not None:
+            codes = [cached.get(f"codes_{channel}") for channel in channels]
+            proteins = [cached.get(f"protein_{channel}") for channel in channels]
+            return codes, proteins
+        data = dbc_preprocess.preprocess(dataset["Numerical Data"], preprocessing)
+        codes, proteins = dbc.encode_translate_channel_sets(data, parameter_sets, missing)
+        arrays = {}
+        for channel in channels:
+            if codes[channel] is not None:
+                arrays[f"codes_{channel}"] = codes[channel]
+                arrays[f"protein_{channel}"] = proteins[channel]
+        self.write("codes-" + key, arrays)
+        return codes, proteins
+
+    # Named parameter presets
+    def presets_path(self):
+        return os.path.join(self.directory, "presets.json")
+
+    def load_presets(self):
+        try:
+            with open(self.presets_path()) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def write_presets(self, presets):
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(handle, "w") as file:
+            json.dump(presets, file, indent=4)
+        os.replace(temporary, self.presets_path())
+
+    def save_preset(self, name, mu, sigma, references, boundaries):
+        presets = self.load_presets()
+        presets[name] = {"mu": float(mu), "sigma": float(sigma),
+                         **dbc.parameters_to_dict(references, boundaries)}
+        self.write_presets(presets)
+
+    def delete_preset(self, name):
+        # True if the preset existed
+        presets = self.load_presets()
+        if presets.pop(name, None) is None:
+            return False
+        self.write_presets(presets)
+        return True
+
+    def preset(self, name):
+        # (mu, sigma, references, boundaries) of a saved preset
+        spec = self.load_presets()[name]
+        references, boundaries = dbc.parameters_from_dict(spec)
+        return spec.get("mu", 0), spec.get("sigma", 0), references, boundaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the DBC result cache and presets.")
+    parser.add_argument("--directory", default=DEFAULT_DIRECTORY)
+    parser.add_argument("--clear", action="store_true", help="remove every cached entry (presets are kept)")
+    parser.add_argument("--delete-preset", action="append", default=[], metavar="NAME", help="repeatable")
+    args = parser.parse_args()
+
+    cache = ResultCache(args.directory)
+    for name in args.delete_preset:
+        if not cache.delete_preset(name):
+            parser.error(f"no preset named '{name}'")
+        print(f"Deleted preset {name}")
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {cache.entries}")
+    print(f"{cache.entries}: {cache.size() / (1024 * 1024):.1f} MB of {cache.max_bytes / (1024 * 1024):.0f} MB")
+    presets = cache.load_presets()
+    print(f"Presets: {', '.join(sorted(presets)) if presets else 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+=========================================================
+ DBC strand codec
+=========================================================
+ Run-length coding of DNA strands. A strand (uint8 codes)
+ becomes one (base, length) pair per run of equal bases,
+ found with np.diff/np.flatnonzero (dbc_engine.runs):
+
+   - RunLengthStrand keeps the runs in memory with the
+     end offset of every run, so any sample or range is
+     decoded by binary search without expanding the
+     strand
+   - pack/unpack store the runs of one or more strands as
+     bytes: a header, the run count of every strand and
+     the runs as varints ((length - 1) << 3 | base),
+     optionally entropy-coded with zlib or lzma
+   - run_length_text/parse_run_length_text give the
+     compact text form used by exports: "12A3TG" is
+     twelve A, three T and one G
+
+ Usage:
+   python dbc_codec.py ../Normal-Abnormal-Datasets --mu 75 --sigma 5
+   python dbc_codec.py archive/ --params params.json --compression lzma
+=========================================================
+"""
+
+import argparse
+import json
+import lzma
+import re
+import struct
+import time
+import zlib
+
+import numpy as np
+
+import dbc_engine as dbc
+import dbc_browser
+
+MAGIC = b"DBCR"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sBBHQ")   # magic, version, compression, strands, samples per strand
+COMPRESSIONS = ("none", "zlib", "lzma")
+BASE_BITS = 3
+
+_RUN_PATTERN = re.compile(r"(\d*)([" + dbc.BASES + r"])")
+
+
+class RunLengthStrand:
+    def __init__(self, bases, lengths):
+        self.bases = np.asarray(bases, dtype=np.uint8)
+        self.ends = np.cumsum(lengths, dtype=np.int64)   # run-offset index: run i covers [ends[i-1], ends[i])
+
+    @classmethod
+    def from_codes(cls, codes):
+        _, bases, lengths = dbc.runs(np.asarray(codes, dtype=np.uint8))
+        return cls(bases, lengths)
+
+    def __len__(self):
+        return int(self.ends[-1]) if len(self.ends) else 0
+
+    @property
+    def lengths(self):
+        return np.diff(self.ends, prepend=0)
+
+    @property
+    def nbytes(self):
+        return self.bases.nbytes + self.ends.nbytes
+
+    def decode(self):
+        return np.repeat(self.bases, self.lengths)
+
+    def at(self, index):
+        # Base codes at sample index (scalar or array); negative indices count from the end
+        index = np.asarray(index, dtype=np.int64)
+        index = np.where(index < 0, index + len(self), index)
+        if ((index < 0) | (index >= len(self))).any():
+            raise IndexError("Sample index out of range.")
+        return self.bases[np.searchsorted(self.ends, index, side="right")]
+
+    def slice(self, start, stop):
+        # Codes of samples [start, stop), decoded from the runs that overlap the range
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if stop <= start:
+            return np.empty(0, dtype=np.uint8)
+        first = np.searchsorted(self.ends, start, side="right")
+        last = np.searchsorted(self.ends, stop - 1, side="right")
+        lengths = self.lengths[first:last + 1].copy()
+        lengths[0] -= start - (self.ends[first - 1] if first else 0)
+        lengths[-1] -= self.ends[last] - stop
+        return np.repeat(self.bases[first:last + 1], lengths)
+
+    def text(self):
+        return run_length_text(self.bases, self.lengths)
+
+
+# Varints
+def encode_varints(values):
+    # Unsigned LEB128, 7 bits per byte with the high bit set on all but the last byte
+    values = np.asarray(values, dtype=np.uint64)
+    n_bytes = np.ones(len(values), dtype=np.int64)
+    for shift in range(7, 64, 7):
+        n_bytes += values >= (np.uint64(1) << np.uint64(shift))
+    ends = np.cumsum(n_bytes)
+    owner = np.repeat(np.arange(len(values)), n_bytes)
+    position = np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - n_bytes, n_bytes)
+    out = ((values[owner] >> (7 * position).astype(np.uint64)) & np.uint64(0x7F)).astype(np.uint8)
+    out[position < n_bytes[owner] - 1] |= 0x80
+    return out.tobytes()
+
+def decode_varints(data, count=None):
+    data = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(data < 0x80) + 1
+    if count is not None and len(ends) != count or len(ends) and ends[-1] != len(data):
+        raise ValueError("Corrupt run data.")
+    if not len(ends):
+        return np.empty(0, dtype=np.uint64)
+    starts = np.concatenate([[0], ends[:-1]]).astype(np.int64)
+    position = np.arange(len(data)) - np.repeat(starts, ends - starts)
+    parts = (data & 0x7F).astype(np.uint64) << (7 * position).astype(np.uint64)
+    return np.add.reduceat(parts, starts)
+
+
+# Binary form
+def pack(codes, compression="zlib"):
+    # (samples,) or (strands, samples) codes -> bytes
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression '{compression}'.")
+    codes = np.atleast_2d(np.asarray(codes, dtype=np.uint8))
+    strands = [RunLengthStrand.from_codes(strand) for strand in codes]
+    values = [(strand.lengths.astype(np.uint64) - np.uint64(1)) << np.uint64(BASE_BITS) | strand.bases
+              for strand in strands]
+    payload = encode_varints(np.concatenate(values) if values else [])
+    if compression == "zlib":
+        payload = zlib.compress(payload, 9)
+    elif compression == "lzma":
+        payload = lzma.compress(payload, format=lzma.FORMAT_ALONE, preset=6)
+    run_counts = np.array([len(strand.bases) for strand in strands], dtype="<u8")
+    return (HEADER.pack(MAGIC, FORMAT_VERSION, COMPRESSIONS.index(compression), len(codes), codes.shape[1])
+            + run_counts.tobytes() + payload)
+
+def unpack_strands(data):
+    # bytes from pack -> list of RunLengthStrand
+    magic, version, compression, n_strands, n_samples = HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION or compression >= len(COMPRESSIONS):
+        raise ValueError("Not a DBC run-length strand block.")
+    offset = HEADER.size + 8 * n_strands
+    run_counts = np.frombuffer(data[HEADER.size:offset], dtype="<u8").astype(np.int64)
+    payload = bytes(data[offset:])
+    if COMPRESSIONS[compression] == "zlib":
+        payload = zlib.decompress(payload)
+    elif COMPRESSIONS[compression] == "lzma":
+        payload = lzma.decompress(payload)
+    values = decode_varints(payload, int(run_counts.sum()))
+    bases = (values & np.uint64((1 << BASE_BITS) - 1)).astype(np.uint8)
+    lengths = (values >> np.uint64(BASE_BITS)).astype(np.int64) + 1
+    bounds = np.concatenate([[0], np.cumsum(run_counts)])
+    strands = [RunLengthStrand(bases[low:high], lengths[low:high]) for low, high in zip(bounds[:-1], bounds[1:])]
+    if any(len(strand) != n_samples for strand in strands) or (bases >= len(dbc.BASES)).any():
+        raise ValueError("Corrupt run data.")
+    return strands
+
+def unpack(data):
+    strands = unpack_strands(data)
+    if not strands:
+        return np.empty((0, 0), dtype=np.uint8)
+    return np.stack([strand.decode() for strand in strands])
+
+
+# Text form
+def run_length_text(bases, lengths):
+    letters = dbc.strand_text(bases)
+    return "".join(letter if length == 1 else f"{length}{letter}" for letter, length in zip(letters, lengths.tolist()))
+
+def strand_run_length_text(codes):
+    return RunLengthStrand.from_codes(codes).text()
+
+def parse_run_length_text(text):
+    # "12A3TG" -> codes; the inverse of run_length_text
+    pairs = _RUN_PATTERN.findall(text)
+    if sum(len(count) + 1 for count, _ in pairs) != len(text):
+        raise ValueError("Run-length strand contains characters other than digits and " + dbc.BASES + ".")
+    lengths = np.array([int(count) if count else 1 for count, _ in pairs], dtype=np.int64)
+    bases = dbc.strand_codes("".join(base for _, base in pairs))
+    return np.repeat(bases, lengths)
+
+def run_length_fields(codes, protein=None):
+    # Export fields with the strands in run-length text. The mRNA is left out:
+    # it is the strands interleaved and is rebuilt from them.
+    fields = dbc.export_fields(codes, protein)
+    del fields["mRNA"]
+    for i, strand in enumerate(codes):
+        fields[f"DNA{i + 1}"] = strand_run_length_text(strand)
+    fields["Strand Encoding"] = "run-length"
+    return fields
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run-length compression ratios of the strands of a folder.")
+    parser.add_argument("folder")
+    parser.add_argument("--params", help="JSON file with a parameter set "
+                                         "(mu/sigma[/ks/alpha..delta] or references/boundaries)")
+    parser.add_argument("--mu", type=float)
+    parser.add_argument("--sigma", type=float)
+    parser.add_argument("--pattern", default="*.txt")
+    parser.add_argument("--missing", choices=dbc.MISSING_POLICIES, default="mark",
+                        help="how NaN/infinite samples are encoded")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default="zlib")
+    args = parser.parse_args()
+
+    if args.params:
+        with open(args.params) as file:
+            parameter_spec = json.load(file)
+    elif args.mu is not None and args.sigma is not None:
+        parameter_spec = {"mu": args.mu, "sigma": args.sigma}
+    else:
+        parser.error("either --params or both --mu and --sigma are required")
+    references, boundaries = dbc.parameters_from_dict(parameter_spec)
+
+    names = dbc.reference_names(len(references))
+    raw, runs, text, packed = np.zeros(len(names)), np.zeros(len(names)), np.zeros(len(names)), 0
+    longest = np.zeros(len(names), dtype=np.int64)
+    started = time.perf_counter()
+    for path in dbc_browser.list_datasets(args.folder, args.pattern):
+        try:
+            data = dbc.load_dataset(path)["Numerical Data"]
+        except (OSError, ValueError):
+            continue
+        for series in data.T:
+            codes = dbc.encode(series, references, boundaries, args.missing)
+            block = pack(codes, args.compression)
+            if not np.array_equal(unpack(block), codes):
+                raise SystemExit(f"Round trip failed for {path}.")
+            run_counts, run_longest = dbc.run_statistics(codes)
+            raw += codes.shape[1]
+            runs += run_counts.sum(axis=1)
+            longest = np.maximum(longest, run_longest.max(axis=1))
+            for i, strand in enumerate(codes):
+                text[i] += len(strand_run_length_text(strand))
+            packed += len(block)
+    elapsed = time.perf_counter() - started
+
+    print(f"{'Strand':<8}{'bases':>12}{'runs':>10}{'mean run':>10}{'longest':>9}{'text ratio':>12}")
+    for i, name in enumerate(names):
+        print(f"DNA{name[1:]:<5}{int(raw[i]):>12}{int(runs[i]):>10}{raw[i] / max(runs[i], 1):>10.1f}"
+              f"{longest[i]:>9}{raw[i] / max(text[i], 1):>11.1f}x")
+    print(f"\nAll strands: {int(raw.sum())} bytes as text, {packed} bytes packed ({args.compression}), "
+          f"{raw.sum() / max(packed, 1):.1f}x; {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
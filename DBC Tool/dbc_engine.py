@@ -0,0 +1,485 @@
+"""
+=========================================================
+ DBC encoding engine
+=========================================================
+ Vectorized implementation of the DNA-forming rules,
+ the mRNA-forming rule and the genetic rules used by the
+ DBC Tool. A parameter set is an (N,) reference vector
+ and an (N, 4) boundary matrix whose columns are the
+ conversion boundaries a, b, c and d of each reference.
+ Nucleotides are kept as uint8 code arrays
+ (A=0, C=1, G=2, T=3, and N=4 for a missing or
+ non-finite sample) and only turned into text for
+ display and export.
+=========================================================
+"""
+
+import numpy as np
+
+# Bump whenever a change alters encoded output, so cached results are not reused.
+ENGINE_VERSION = "2"
+
+MAX_REFERENCES = 8
+
+BASES = "ACGTN"
+A_CODE, C_CODE, G_CODE, T_CODE, N_CODE = range(5)
+
+# How samples that are NaN or infinite are encoded:
+#   "mark"  - keep the sample and write N in every strand (codons with N translate to "-")
+#   "drop"  - remove the sample from every strand, so the strands stay aligned
+#   "ffill" - reuse the last finite value (leading gaps are still marked N)
+MISSING_POLICIES = ("mark", "drop", "ffill")
+MISSING_TOKENS = {"", "nan", "na", "n/a", "null", "none"}
+
+CODON_TO_AMINO_ACID = {
+    "ATT": "I", "ATC": "I", "ATA": "I",
+    "CTT": "L", "CTC": "L", "CTA": "L", "CTG": "L", "TTA": "L", "TTG": "L",
+    "GTT": "V", "GTC": "V", "GTA": "V", "GTG": "V",
+    "TTT": "F", "TTC": "F",
+    "ATG": "M",
+    "TGT": "C", "TGC": "C",
+    "GCT": "A", "GCC": "A", "GCA": "A", "GCG": "A",
+    "GGT": "G", "GGC": "G", "GGA": "G", "GGG": "G",
+    "CCT": "P", "CCC": "P", "CCA": "P", "CCG": "P",
+    "ACT": "T", "ACC": "T", "ACA": "T", "ACG": "T",
+    "TCT": "S", "TCC": "S", "TCA": "S", "TCG": "S", "AGT": "S", "AGC": "S",
+    "TAT": "Y", "TAC": "Y",
+    "TGG": "W",
+    "CAA": "Q", "CAG": "Q",
+    "AAT": "N", "AAC": "N",
+    "CAT": "H", "CAC": "H",
+    "GAA": "E", "GAG": "E",
+    "GAT": "D", "GAC": "D",
+    "AAA": "K", "AAG": "K",
+    "CGT": "R", "CGC": "R", "CGA": "R", "CGG": "R", "AGA": "R", "AGG": "R",
+    "TAA": "X", "TAG": "X", "TGA": "X"
+}
+UNKNOWN_AMINO_ACID = "-"
+AMINO_ACIDS = "".join(sorted(set(CODON_TO_AMINO_ACID.values()))) + UNKNOWN_AMINO_ACID
+
+_BASE_LETTERS = np.frombuffer(BASES.encode("ascii"), dtype=np.uint8)
+
+
+def _build_amino_acid_index():
+    index = np.full(256, len(AMINO_ACIDS) - 1, dtype=np.intp)
+    index[np.frombuffer(AMINO_ACIDS.encode("ascii"), dtype=np.uint8)] = np.arange(len(AMINO_ACIDS))
+    return index
+
+_AMINO_ACID_INDEX = _build_amino_acid_index()
+
+
+def _build_codon_table():
+    # codon index = 25 * first + 5 * second + third; any codon with N is unknown
+    table = np.full(len(BASES) ** 3, ord(UNKNOWN_AMINO_ACID), dtype=np.uint8)
+    for i, first in enumerate(BASES):
+        for j, second in enumerate(BASES):
+            for k, third in enumerate(BASES):
+                amino_acid = CODON_TO_AMINO_ACID.get(first + second + third, UNKNOWN_AMINO_ACID)
+                table[(i * len(BASES) + j) * len(BASES) + k] = ord(amino_acid)
+    return table
+
+CODON_TABLE = _build_codon_table()
+
+
+# Kernel backend
+def _kernels():
+    # Imported on first use: loading Numba takes a noticeable part of a second
+    import dbc_kernels
+    return dbc_kernels
+
+def backend():
+    # "numba" when the compiled kernels are available, otherwise "numpy"
+    return _kernels().BACKEND
+
+
+# Parameters
+def reference_names(n):
+    return [f"R{i + 1}" for i in range(n)]
+
+def as_parameters(references, boundaries):
+    references = np.atleast_1d(np.asarray(references, dtype=np.float64))
+    boundaries = np.atleast_2d(np.asarray(boundaries, dtype=np.float64))
+    if references.ndim != 1 or not 1 <= len(references) <= MAX_REFERENCES:
+        raise ValueError(f"Between 1 and {MAX_REFERENCES} reference values are required.")
+    if boundaries.shape != (len(references), 4):
+        raise ValueError("Boundaries must have one row of (a, b, c, d) per reference.")
+    return references, boundaries
+
+def invalid_boundaries(boundaries):
+    a, b, c, d = np.asarray(boundaries, dtype=np.float64).T
+    return ~((a > 0) & (b > 0) & (a > b) & (c < 0) & (d < 0) & (c > d))
+
+def modify_parameters(mu, sigma, ks, alpha=2.5, beta=1.5, gamma=-1.5, delta=-2.5):
+    # R = μ + k·σ for every k, one shared boundary row (α·σ, β·σ, γ·σ, δ·σ)
+    ks = np.atleast_1d(np.asarray(ks, dtype=np.float64))
+    references = mu + ks * sigma
+    row = np.array([alpha * sigma, beta * sigma, gamma * sigma, delta * sigma])
+    return as_parameters(references, np.tile(row, (len(ks), 1)))
+
+def default_parameters(mu, sigma):
+    return modify_parameters(mu, sigma, (0, 4, -4))
+
+def same_parameters(n, R, a, b, c, d):
+    return as_parameters(np.full(n, R, dtype=np.float64), np.tile([a, b, c, d], (n, 1)))
+
+def parameters_from_dict(spec):
+    # {"references": [...], "boundaries": [[a, b, c, d], ...]} for direct input, or
+    # {"mu": .., "sigma": .., optional "ks", "alpha", "beta", "gamma", "delta"}
+    if "references" in spec:
+        references, boundaries = as_parameters(spec["references"], spec["boundaries"])
+    else:
+        references, boundaries = modify_parameters(
+            float(spec["mu"]), float(spec["sigma"]), spec.get("ks", (0, 4, -4)),
+            float(spec.get("alpha", 2.5)), float(spec.get("beta", 1.5)),
+            float(spec.get("gamma", -1.5)), float(spec.get("delta", -2.5)))
+    invalid = np.flatnonzero(invalid_boundaries(boundaries))
+    if len(invalid):
+        raise ValueError(f"For R{invalid[0] + 1}, conversion boundaries must satisfy: "
+                         "a and b > 0 with a > b, c and d < 0 with c > d.")
+    return references, boundaries
+
+def parameters_to_dict(references, boundaries):
+    return {"references": np.asarray(references).tolist(), "boundaries": np.asarray(boundaries).tolist()}
+
+
+# DNA-forming rules
+def difference_data(data, references):
+    data = np.asarray(data, dtype=np.float64)
+    return data[..., None, :] - np.asarray(references, dtype=np.float64)[..., :, None]
+
+def classify_differences(differences, boundaries):
+    # Assignment runs from the last rule to the first so that earlier rules win,
+    # mirroring the if/elif order: A, then C, then G, otherwise T.
+    boundaries = np.asarray(boundaries, dtype=np.float64)
+    a = boundaries[..., 0, None]
+    b = boundaries[..., 1, None]
+    c = boundaries[..., 2, None]
+    d = boundaries[..., 3, None]
+    codes = np.full(differences.shape, T_CODE, dtype=np.uint8)
+    codes[(d <= differences) & (differences <= c)] = G_CODE
+    codes[(b <= differences) & (differences <= a)] = C_CODE
+    codes[(c < differences) & (differences < b)] = A_CODE
+    return codes
+
+def forward_fill(data):
+    # Replace every non-finite sample with the last finite one before it along the last axis.
+    data = np.asarray(data, dtype=np.float64)
+    index = np.where(np.isfinite(data), np.arange(data.shape[-1]), 0)
+    np.maximum.accumulate(index, axis=-1, out=index)
+    return np.take_along_axis(data, index, axis=-1)
+
+def prepare_samples(data, missing="mark"):
+    # Apply a missing-value policy along the sample (last) axis. Returns the data
+    # to encode and the mask of samples to mark N, or None when nothing is missing.
+    # "drop" removes a sample from every row when it is missing in any row.
+    if missing not in MISSING_POLICIES:
+        raise ValueError(f"Unknown missing-value policy '{missing}'.")
+    data = np.asarray(data, dtype=np.float64)
+    finite = np.isfinite(data)
+    if finite.all():
+        return data, None
+    if missing == "ffill":
+        data = forward_fill(data)
+        finite = np.isfinite(data)
+    elif missing == "drop":
+        keep = finite.reshape(-1, data.shape[-1]).all(axis=0)
+        return data[..., keep], None
+    return data, ~finite
+
+def mark_missing(codes, mask):
+    # Broadcast a (..., samples) mask over the reference axis of (..., N, samples) codes
+    if mask is not None:
+        codes[np.broadcast_to(mask[..., None, :], codes.shape)] = N_CODE
+    return codes
+
+def encode(data, references, boundaries, missing="mark"):
+    # (samples,) data against (N,) references -> (N, samples) codes
+    references, boundaries = as_parameters(references, boundaries)
+    data, mask = prepare_samples(data, missing)
+    return mark_missing(classify_differences(difference_data(data, references), boundaries), mask)
+
+
+# mRNA-forming rule and genetic rules
+def interleave(codes):
+    # mRNA = D1[0] D2[0] ... DN[0] D1[1] D2[1] ...
+    return np.ascontiguousarray(np.swapaxes(codes, -1, -2)).reshape(*codes.shape[:-2], -1)
+
+def codon_indices(mrna, frame=0):
+    # codon index = 25 * first + 5 * second + third, in [0, 125)
+    mrna = np.asarray(mrna)[..., frame:]
+    n_codons = mrna.shape[-1] // 3
+    triplets = mrna[..., :3 * n_codons].reshape(*mrna.shape[:-1], n_codons, 3).astype(np.intp)
+    return (triplets[..., 0] * len(BASES) + triplets[..., 1]) * len(BASES) + triplets[..., 2]
+
+def translate(mrna, frame=0):
+    return CODON_TABLE[codon_indices(mrna, frame)]
+
+def reading_frames(mrna):
+    return [translate(mrna, frame) for frame in range(3)]
+
+def encode_translate(data, references, boundaries, missing="mark"):
+    # (samples,) data -> (N, samples) codes and the protein of the first reading frame.
+    # With the numba backend difference, classification and codon lookup run in one pass.
+    references, boundaries = as_parameters(references, boundaries)
+    data, mask = prepare_samples(data, missing)
+    if data.ndim == 1 and backend() == "numba":
+        return _kernels().encode_translate(data, references, boundaries, CODON_TABLE)
+    codes = mark_missing(classify_differences(difference_data(data, references), boundaries), mask)
+    return codes, translate(interleave(codes))
+
+
+def amino_acid_counts(amino_acids):
+    # (..., L) amino acids -> (..., len(AMINO_ACIDS)) counts, one bincount for all rows
+    amino_acids = np.asarray(amino_acids, dtype=np.uint8)
+    index = _AMINO_ACID_INDEX[amino_acids].reshape(-1, amino_acids.shape[-1] if amino_acids.ndim else 1)
+    offsets = np.arange(len(index))[:, None] * len(AMINO_ACIDS)
+    counts = np.bincount((index + offsets).ravel(), minlength=len(index) * len(AMINO_ACIDS))
+    return counts.reshape(*amino_acids.shape[:-1], len(AMINO_ACIDS))
+
+
+# Run-length statistics
+def runs(codes):
+    # (samples,) codes -> start, base and length of every run of equal bases
+    codes = np.asarray(codes)
+    starts = np.flatnonzero(np.diff(codes, prepend=-1) != 0) if len(codes) else np.empty(0, dtype=np.intp)
+    return starts, codes[starts], np.diff(starts, append=len(codes))
+
+def run_statistics(codes):
+    # (N, samples) codes -> (N, 5) number of runs and longest run of every base
+    codes = np.atleast_2d(np.asarray(codes, dtype=np.uint8))
+    if backend() == "numba":
+        return _kernels().run_statistics(codes)
+    counts = np.zeros((len(codes), len(BASES)), dtype=np.int64)
+    longest = np.zeros((len(codes), len(BASES)), dtype=np.int64)
+    for row, strand in enumerate(codes):
+        _, bases, lengths = runs(strand)
+        counts[row] = np.bincount(bases, minlength=len(BASES))
+        np.maximum.at(longest[row], bases, lengths)
+    return counts, longest
+
+
+# Windowed analysis
+def window_count(n_samples, window, hop):
+    return max((n_samples - window) // hop + 1, 0)
+
+def window_view(series, window, hop=1):
+    # (..., windows, window) view over the last axis; no data is copied
+    series = np.asarray(series)
+    if window < 1 or hop < 1:
+        raise ValueError("Window and hop must be positive.")
+    if window > series.shape[-1]:
+        return np.empty(series.shape[:-1] + (0, window), dtype=series.dtype)
+    return np.lib.stride_tricks.sliding_window_view(series, window, axis=-1)[..., ::hop, :]
+
+def windowed_proteins(codes, window, hop):
+    # Encode once, translate once, then cut each window's protein out of the
+    # full-length protein. Returns a (windows, codons) array of amino acids.
+    n_refs, n_samples = codes.shape
+    n_windows = window_count(n_samples, window, hop)
+    n_codons = window * n_refs // 3
+    if n_codons == 0 or n_windows == 0:
+        return np.empty((n_windows, n_codons), dtype=np.uint8)
+    mrna = interleave(codes)
+    if (hop * n_refs) % 3 == 0:
+        # every window starts on a codon boundary of the first reading frame
+        return window_view(translate(mrna), n_codons, hop * n_refs // 3)[:n_windows]
+    starts = np.arange(n_windows) * hop * n_refs
+    frames = reading_frames(mrna)
+    table = np.zeros((3, len(frames[0])), dtype=np.uint8)
+    for frame, protein in enumerate(frames):
+        table[frame, :len(protein)] = protein
+    return table[(starts % 3)[:, None], (starts // 3)[:, None] + np.arange(n_codons)]
+
+
+# Text conversion
+def strand_text(codes):
+    return _BASE_LETTERS[codes].tobytes().decode("ascii")
+
+def protein_text(amino_acids):
+    return np.asarray(amino_acids, dtype=np.uint8).tobytes().decode("ascii")
+
+def strand_codes(strand):
+    lookup = np.full(256, 255, dtype=np.uint8)
+    lookup[_BASE_LETTERS] = np.arange(len(BASES), dtype=np.uint8)
+    codes = lookup[np.frombuffer(strand.encode("ascii"), dtype=np.uint8)]
+    if (codes == 255).any():
+        raise ValueError("Strand contains characters other than " + BASES + ".")
+    return codes
+
+def strand_results(codes):
+    mrna = interleave(codes)
+    result = {f"DNA({name})": strand_text(strand)
+              for name, strand in zip(reference_names(len(codes)), codes)}
+    result["DNA"] = strand_text(mrna)
+    result["codes"] = codes
+    result["mRNA codes"] = mrna
+    return result
+
+def encode_strands(data, references, boundaries, missing="mark"):
+    return strand_results(encode(data, references, boundaries, missing))
+
+def export_fields(codes, protein=None):
+    # The per-dataset fields written by "Export Results"; protein is the first-frame
+    # protein when it is already known (from encode_translate)
+    mrna = interleave(codes)
+    fields = {f"DNA{i + 1}": strand_text(strand) for i, strand in enumerate(codes)}
+    fields["mRNA"] = strand_text(mrna)
+    fields["Protein (Amino Acids Sequence)"] = protein_text(translate(mrna) if protein is None else protein)
+    if len(codes) != 3:
+        fields["Protein (Reading Frames)"] = [protein_text(protein) for protein in reading_frames(mrna)]
+    return fields
+
+
+# Multichannel data
+def encode_channels(data, references, boundaries, missing="mark"):
+    # (samples, channels) data against (channels, N) references and
+    # (channels, N, 4) boundaries -> (channels, N, samples) codes.
+    # With missing="drop" a sample missing in any channel is dropped from all.
+    data = np.asarray(data, dtype=np.float64)
+    references = np.asarray(references, dtype=np.float64)
+    boundaries = np.asarray(boundaries, dtype=np.float64)
+    if references.shape != (data.shape[1], references.shape[-1]) or \
+            boundaries.shape != references.shape + (4,):
+        raise ValueError("Each channel needs its own (N,) references and (N, 4) boundaries.")
+    data, mask = prepare_samples(data.T, missing)
+    return mark_missing(classify_differences(difference_data(data, references), boundaries), mask)
+
+def encode_channel_sets(data, parameter_sets, missing="mark"):
+    # One (references, boundaries) pair, or None to skip, per column of data.
+    # Channels sharing the same number of references are encoded together.
+    # With missing="drop" a sample missing in any encoded channel is dropped from
+    # all of them before grouping, so channels of every group stay aligned.
+    if missing not in MISSING_POLICIES:
+        raise ValueError(f"Unknown missing-value policy '{missing}'.")
+    data = np.asarray(data, dtype=np.float64)
+    codes = [None] * len(parameter_sets)
+    groups = {}
+    for channel, parameters in enumerate(parameter_sets):
+        if parameters is not None:
+            groups.setdefault(len(parameters[0]), []).append(channel)
+    if missing == "drop":
+        data = _drop_missing_rows(data, [channel for channels in groups.values() for channel in channels])
+        missing = "mark"   # nothing left to mark
+    for channels in groups.values():
+        params = [as_parameters(*parameter_sets[channel]) for channel in channels]
+        group_codes = encode_channels(data[:, channels],
+                                      np.stack([p[0] for p in params]),
+                                      np.stack([p[1] for p in params]), missing)
+        for channel, channel_codes in zip(channels, group_codes):
+            codes[channel] = channel_codes
+    return codes
+
+def encode_translate_channel_sets(data, parameter_sets, missing="mark"):
+    # encode_channel_sets plus the first-frame protein of every encoded channel (None elsewhere).
+    # With the numba backend each channel runs through the fused kernel of encode_translate.
+    if backend() != "numba":
+        codes = encode_channel_sets(data, parameter_sets, missing)
+        return codes, [None if channel_codes is None else translate(interleave(channel_codes))
+                       for channel_codes in codes]
+    if missing not in MISSING_POLICIES:
+        raise ValueError(f"Unknown missing-value policy '{missing}'.")
+    data = np.asarray(data, dtype=np.float64)
+    encoded = [channel for channel, parameters in enumerate(parameter_sets) if parameters is not None]
+    if missing == "drop":
+        data = _drop_missing_rows(data, encoded)
+        missing = "mark"
+    codes = [None] * len(parameter_sets)
+    proteins = [None] * len(parameter_sets)
+    for channel in encoded:
+        codes[channel], proteins[channel] = encode_translate(data[:, channel], *parameter_sets[channel], missing)
+    return codes, proteins
+
+def _drop_missing_rows(data, channels):
+    # Samples (rows) with a non-finite value in any of the channels are removed from all
+    return data[np.isfinite(data[:, channels]).all(axis=1)]
+
+
+# Data files
+def _strip_row(row, delimiter):
+    # Tabs are fields when they delimit, so an empty first or last field is kept
+    return row.strip(" \r\n") if delimiter == "\t" else row.strip()
+
+def _split_fields(line, delimiter=None):
+    if delimiter is None:
+        delimiter = next((d for d in ",;\t" if d in line), None)
+    if delimiter is None:
+        return line.split()
+    return [field.strip() for field in _strip_row(line, delimiter).split(delimiter)]
+
+def _is_number(field):
+    try:
+        float(field)
+    except ValueError:
+        return False
+    return True
+
+def _to_number(field):
+    # Empty fields and NA-style tokens are read as missing (NaN) so rows stay aligned
+    return np.nan if field.lower() in MISSING_TOKENS else float(field)
+
+def parse_dataset(lines):
+    # Header lines ("Key: Value") come first, optionally followed by one line of
+    # column names, then one row of numbers per sample and one column per channel.
+    metadata = {}
+    start = 0
+    for start, line in enumerate(lines):
+        fields = _split_fields(line)
+        if any(_is_number(field) for field in fields) and \
+                all(_is_number(field) or field.lower() in MISSING_TOKENS for field in fields):
+            break
+        key, sep, value = line.strip().partition(": ")
+        if sep:
+            metadata[key] = value
+        elif any(fields):
+            metadata["Channels"] = ", ".join(fields)
+    else:
+        start = len(lines)
+
+    rows = [row for row in lines[start:] if row.strip(" \r\n")]
+    delimiter = next((d for d in ",;\t" if rows and d in rows[0]), None)
+    n_channels = len(_split_fields(rows[0], delimiter)) if rows else 0
+    if delimiter is None:
+        fields = " ".join(rows).split()
+    else:
+        fields = delimiter.join(_strip_row(row, delimiter) for row in rows).split(delimiter)
+    try:
+        data = np.array(fields, dtype=np.float64).reshape(-1, n_channels)
+        if len(data) != len(rows):
+            raise ValueError
+    except ValueError:
+        # Missing fields, ragged or non-numeric rows: go line by line,
+        # reading missing fields as NaN and skipping rows that do not fit
+        values = []
+        for row in rows:
+            row_fields = _split_fields(row, delimiter)
+            if len(row_fields) != n_channels:
+                continue
+            try:
+                values.append([_to_number(field) for field in row_fields])
+            except ValueError:
+                continue
+        data = np.array(values, dtype=np.float64).reshape(-1, max(n_channels, 1))
+
+    if "Channels" in metadata:
+        channels = [name.strip() for name in metadata["Channels"].split(",") if name.strip()]
+    else:
+        channels = []
+    if len(channels) != data.shape[1]:
+        if data.shape[1] == 1:
+            channels = [metadata.get("Data Type", "x(i)")]
+        else:
+            channels = [f"x{j + 1}(i)" for j in range(data.shape[1])]
+    return {
+        "Metadata": metadata,
+        "Dataset ID": metadata.get("Dataset ID", "Unknown"),
+        "Channels": channels,
+        "Numerical Data": data,
+    }
+
+def parse_dataset_bytes(content):
+    # Raw file content -> dataset; UTF-8, and undecodable bytes raise (UnicodeDecodeError is a ValueError)
+    return parse_dataset(content.decode("utf-8").splitlines())
+
+def load_dataset(path):
+    with open(path, "rb") as file:
+        return parse_dataset_bytes(file.read())
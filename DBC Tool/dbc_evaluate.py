@@ -0,0 +1,296 @@
+"""
+=========================================================
+ DBC parameter-set evaluation
+=========================================================
+ Compares parameter sets (e.g. Default 4σ/2.5σ/1.5σ
+ against a Modify set) by how well a classifier on the
+ protein features separates the groups of a labelled
+ corpus (Pattern Type by default), with stratified
+ k-fold cross-validation:
+
+   - features per file: nucleotide composition of each
+     reference strand, codon usage and amino-acid
+     frequencies (one block per channel)
+   - classifiers: nearest centroid on standardized
+     features, or Gaussian naive Bayes
+   - accuracy (mean ± std over folds), F1 per group,
+     macro F1 and the pooled confusion matrix
+
+ Every file is read once and encoded once per candidate.
+ The folds reuse these features, so nothing is encoded
+ again per fold. Files are processed in chunks on a
+ process pool, and with --cache the encodings also go to
+ the on-disk result cache (dbc_cache.py) for later runs.
+
+ Usage:
+   python dbc_evaluate.py ../Normal-Abnormal-Datasets --mu 75 --sigma 5
+   python dbc_evaluate.py archive/ --candidates candidates.json --folds 10 \\
+       --workers 8 --json evaluation.json
+   python dbc_evaluate.py archive/ --preset Default --preset "Spindle A" --cache
+=========================================================
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import dbc_engine as dbc
+import dbc_browser
+import dbc_cache
+import dbc_stats
+
+UNLABELLED = "Unlabelled"
+
+
+# Features
+def channel_features(codes):
+    # (N, samples) codes -> composition (N * 5), codon usage (64) and amino acids (22)
+    n_references, n_samples = codes.shape
+    offsets = np.arange(n_references)[:, None] * len(dbc.BASES)
+    nucleotides = np.bincount((codes + offsets).ravel(), minlength=n_references * len(dbc.BASES))
+    codons = np.bincount(dbc.codon_indices(dbc.interleave(codes)), minlength=dbc_stats.N_CODONS)
+    amino_acids = np.bincount(dbc_stats.CODON_AMINO_ACID, weights=codons, minlength=len(dbc.AMINO_ACIDS))
+    usage = codons[dbc_stats.CODON_INDEX]
+    return np.concatenate([nucleotides / max(n_samples, 1), usage / max(usage.sum(), 1),
+                           amino_acids / max(amino_acids.sum(), 1)])
+
+def feature_names(n_references, n_channels=1):
+    names = [f"{name} {base}" for name in dbc.reference_names(n_references) for base in dbc.BASES]
+    names += dbc_stats.CODONS + [f"aa {amino_acid}" for amino_acid in dbc.AMINO_ACIDS]
+    if n_channels == 1:
+        return names
+    return [f"ch{channel + 1} {name}" for channel in range(n_channels) for name in names]
+
+def extract_features(paths, candidates, missing="mark", label_key="Pattern Type", cache_directory=None):
+    # candidates: name -> parameter spec. Returns labels, name -> (files, features) array, errors.
+    parameters = {name: dbc.parameters_from_dict(spec) for name, spec in candidates.items()}
+    result_cache = dbc_cache.ResultCache(cache_directory) if cache_directory else None
+    labels, rows, errors = [], {name: [] for name in candidates}, []
+    for path in paths:
+        try:
+            dataset = result_cache.load_dataset(path) if result_cache else dbc.load_dataset(path)
+            data = dataset["Numerical Data"]
+            if not data.size:
+                raise ValueError("No numerical data found in the file.")
+            features = {}
+            for name, (references, boundaries) in parameters.items():
+                parameter_sets = [(references, boundaries)] * data.shape[1]
+                if result_cache:
+                    channel_codes = result_cache.encode(dataset, parameter_sets, missing)[0]
+                else:
+                    channel_codes = dbc.encode_channel_sets(data, parameter_sets, missing)
+                features[name] = np.concatenate([channel_features(codes) for codes in channel_codes])
+        except (OSError, ValueError) as e:
+            errors.append((path, str(e)))
+            continue
+        labels.append(dataset["Metadata"].get(label_key, UNLABELLED))
+        for name in candidates:
+            rows[name].append(features[name])
+    return labels, rows, errors
+
+def extract_corpus(paths, candidates, missing="mark", label_key="Pattern Type", cache_directory=None,
+                   workers=None, chunk_size=256):
+    if len(paths) <= chunk_size or workers == 1:
+        labels, rows, errors = extract_features(paths, candidates, missing, label_key, cache_directory)
+    else:
+        labels, rows, errors = [], {name: [] for name in candidates}, []
+        chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunk_labels, chunk_rows, chunk_errors in executor.map(
+                    extract_features, chunks,
+                    *[[value] * len(chunks) for value in (candidates, missing, label_key, cache_directory)]):
+                labels += chunk_labels
+                errors += chunk_errors
+                for name in candidates:
+                    rows[name] += chunk_rows[name]
+    features = {}
+    for name, candidate_rows in rows.items():
+        lengths = {len(row) for row in candidate_rows}
+        if len(lengths) > 1:
+            raise ValueError(f"Files have different numbers of channels; features of '{name}' do not line up.")
+        features[name] = np.array(candidate_rows) if candidate_rows else np.empty((0, 0))
+    return labels, features, errors
+
+
+# Classifiers
+class NearestCentroid:
+    def fit(self, X, y):
+        self.mean = X.mean(axis=0)
+        self.scale = X.std(axis=0)
+        self.scale[self.scale == 0] = 1.0
+        Z = (X - self.mean) / self.scale
+        self.classes = np.unique(y)
+        self.centroids = np.stack([Z[y == label].mean(axis=0) for label in self.classes])
+        return self
+
+    def predict(self, X):
+        Z = (X - self.mean) / self.scale
+        distances = ((Z[:, None, :] - self.centroids[None, :, :]) ** 2).sum(axis=2)
+        return self.classes[np.argmin(distances, axis=1)]
+
+class GaussianNaiveBayes:
+    def fit(self, X, y):
+        self.classes = np.unique(y)
+        # variance floor relative to the largest feature variance, as in the usual smoothing
+        floor = 1e-9 * max(X.var(axis=0).max(), 1e-12)
+        self.means = np.stack([X[y == label].mean(axis=0) for label in self.classes])
+        self.variances = np.stack([X[y == label].var(axis=0) for label in self.classes]) + floor
+        self.priors = np.log([np.mean(y == label) for label in self.classes])
+        return self
+
+    def predict(self, X):
+        log_likelihood = -0.5 * (np.log(2 * np.pi * self.variances)[None, :, :]
+                                 + (X[:, None, :] - self.means[None, :, :]) ** 2 / self.variances[None, :, :])
+        return self.classes[np.argmax(log_likelihood.sum(axis=2) + self.priors, axis=1)]
+
+CLASSIFIERS = {"centroid": NearestCentroid, "bayes": GaussianNaiveBayes}
+
+
+# Cross-validation
+def stratified_folds(labels, k=5, seed=0):
+    # Fold number of every file; each group is spread evenly over the folds
+    labels = np.asarray(labels)
+    rng = np.random.default_rng(seed)
+    folds = np.empty(len(labels), dtype=np.intp)
+    offset = 0
+    for label in np.unique(labels):
+        members = rng.permutation(np.flatnonzero(labels == label))
+        folds[members] = (np.arange(len(members)) + offset) % k
+        offset += len(members)
+    return folds
+
+def cross_validate(features, labels, folds, classifier="centroid"):
+    # Confusion matrix (true x predicted, pooled over folds) and the accuracy of every fold
+    labels = np.asarray(labels)
+    classes = np.unique(labels)
+    confusion = np.zeros((len(classes), len(classes)), dtype=np.int64)
+    accuracies = []
+    for fold in np.unique(folds):
+        test = folds == fold
+        if len(np.unique(labels[~test])) < 2:
+            continue
+        model = CLASSIFIERS[classifier]().fit(features[~test], labels[~test])
+        predicted = model.predict(features[test])
+        truth = np.searchsorted(classes, labels[test])
+        np.add.at(confusion, (truth, np.searchsorted(classes, predicted)), 1)
+        accuracies.append(float(np.mean(predicted == labels[test])))
+    return classes, confusion, np.array(accuracies)
+
+def scores(classes, confusion, accuracies):
+    true_positives = np.diag(confusion)
+    f1 = 2 * true_positives / np.maximum(confusion.sum(axis=0) + confusion.sum(axis=1), 1)
+    return {"Accuracy": float(accuracies.mean()) if len(accuracies) else float("nan"),
+            "Accuracy Std": float(accuracies.std()) if len(accuracies) else float("nan"),
+            "Macro F1": float(f1.mean()),
+            "F1": dict(zip(classes.tolist(), f1.round(6).tolist())),
+            "Confusion": {"Classes": classes.tolist(), "Matrix": confusion.tolist()}}
+
+def evaluate(features, labels, k=5, seed=0, classifier="centroid"):
+    # name -> scores for every candidate, all on the same folds
+    folds = stratified_folds(labels, k, seed)
+    return {name: scores(*cross_validate(candidate_features, labels, folds, classifier))
+            for name, candidate_features in features.items()}
+
+
+# Report
+def comparison_table(results, candidates):
+    classes = next(iter(results.values()))["Confusion"]["Classes"] if results else []
+    lines = [f"{'Candidate':<20}{'Refs':>5}{'Accuracy':>18}{'Macro F1':>10}"
+             + "".join(f"{'F1 ' + label[:9]:>13}" for label in classes)]
+    ranked = sorted(results, key=lambda name: (-results[name]["Macro F1"], name))
+    for name in ranked:
+        result = results[name]
+        n_references = len(dbc.parameters_from_dict(candidates[name])[0])
+        lines.append(f"{name[:19]:<20}{n_references:>5}"
+                     f"{result['Accuracy']:>11.3f} ± {result['Accuracy Std']:.3f}{result['Macro F1']:>10.3f}"
+                     + "".join(f"{result['F1'][label]:>13.3f}" for label in classes))
+    for name in ranked:
+        confusion = results[name]["Confusion"]
+        lines += ["", f"{name}: confusion matrix (rows true, columns predicted)",
+                  f"{'':<14}" + "".join(f"{label[:11]:>12}" for label in confusion["Classes"])]
+        for label, row in zip(confusion["Classes"], confusion["Matrix"]):
+            lines.append(f"{label[:13]:<14}" + "".join(f"{value:>12}" for value in row))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-validate DBC parameter sets on a labelled corpus.")
+    parser.add_argument("folder")
+    parser.add_argument("--candidates", help="JSON file mapping candidate names to parameter sets "
+                                             "(mu/sigma[/ks/alpha..delta] or references/boundaries)")
+    parser.add_argument("--params", action="append", default=[],
+                        help="JSON file with one parameter set, named after the file (repeatable)")
+    parser.add_argument("--preset", action="append", default=[], help="saved parameter preset (repeatable)")
+    parser.add_argument("--mu", type=float)
+    parser.add_argument("--sigma", type=float)
+    parser.add_argument("--pattern", default="*.txt")
+    parser.add_argument("--label-key", default="Pattern Type", help="header field that names the group of a file")
+    parser.add_argument("--missing", choices=dbc.MISSING_POLICIES, default="mark",
+                        help="how NaN/infinite samples are encoded")
+    parser.add_argument("--classifier", choices=sorted(CLASSIFIERS), default="centroid")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", action="store_true", help="keep parsed files and encodings in the result cache")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="files per worker task")
+    parser.add_argument("--json", help="write the scores of every candidate to this file")
+    args = parser.parse_args()
+
+    candidates = {}
+    if args.candidates:
+        with open(args.candidates) as file:
+            candidates.update(json.load(file))
+    for path in args.params:
+        with open(path) as file:
+            candidates[os.path.splitext(os.path.basename(path))[0]] = json.load(file)
+    if args.preset:
+        presets = dbc_cache.ResultCache().load_presets()
+        for name in args.preset:
+            if name not in presets:
+                parser.error(f"no saved preset named '{name}'")
+            candidates[name] = presets[name]
+    if args.mu is not None and args.sigma is not None:
+        candidates["Default"] = {"mu": args.mu, "sigma": args.sigma}
+    if not candidates:
+        parser.error("give parameter sets with --candidates, --params, --preset or --mu and --sigma")
+    for name, spec in candidates.items():
+        try:
+            dbc.parameters_from_dict(spec)   # fail early on invalid boundaries
+        except (KeyError, ValueError) as e:
+            parser.error(f"candidate '{name}': {e}")
+    if args.folds < 2:
+        parser.error("--folds must be at least 2")
+
+    started = time.perf_counter()
+    paths = dbc_browser.list_datasets(args.folder, args.pattern)
+    labels, features, errors = extract_corpus(paths, candidates, args.missing, args.label_key,
+                                              dbc_cache.DEFAULT_DIRECTORY if args.cache else None,
+                                              args.workers, args.chunk_size)
+    encoded = time.perf_counter()
+    for path, error in errors:
+        print(f"Skipped {os.path.basename(path)}: {error}")
+    if len(set(labels)) < 2:
+        parser.error(f"need at least two groups of '{args.label_key}' to evaluate")
+    results = evaluate(features, labels, args.folds, args.seed, args.classifier)
+    finished = time.perf_counter()
+
+    groups = ", ".join(f"{label} {labels.count(label)}" for label in sorted(set(labels)))
+    print(f"{len(labels)} files ({groups}), {args.folds}-fold cross-validation, {args.classifier} classifier\n")
+    print(comparison_table(results, candidates))
+    print(f"\nFeatures of {len(candidates)} candidates in {(encoded - started) * 1000:.0f} ms, "
+          f"cross-validation in {(finished - encoded) * 1000:.0f} ms")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"Label Key": args.label_key, "Missing Samples": args.missing, "Folds": args.folds,
+                       "Seed": args.seed, "Classifier": args.classifier, "Files": len(labels),
+                       "Errors": [{"File": path, "Error": error} for path, error in errors],
+                       "Candidates": {name: {"Parameters": candidates[name], **results[name]}
+                                      for name in candidates}}, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
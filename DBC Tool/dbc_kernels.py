@@ -0,0 +1,100 @@
+"""
+=========================================================
+ DBC compiled kernels
+=========================================================
+ Fused loops for the stages that need large temporaries
+ in NumPy, compiled with Numba when it is installed:
+
+   - difference, classification and codon lookup of a
+     series in one pass (strands and protein together)
+   - run-length statistics of strands
+
+ dbc_engine imports this module on the first call that
+ can use it, calls these kernels when BACKEND is "numba"
+ and uses its NumPy code otherwise, so results are
+ identical either way. Set DBC_BACKEND=numpy to force
+ the NumPy path. Compiled kernels are cached on disk (in
+ $NUMBA_CACHE_DIR, by default <DBC cache>/numba), so only
+ the first run compiles them.
+=========================================================
+"""
+
+import os
+
+A_CODE, C_CODE, G_CODE, T_CODE, N_CODE = range(5)
+N_BASES = 5
+
+os.environ.setdefault("NUMBA_CACHE_DIR", os.path.join(
+    os.environ.get("DBC_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".dbc_cache"), "numba"))
+
+BACKEND = "numpy"
+if os.environ.get("DBC_BACKEND", "auto").lower() != "numpy":
+    try:
+        import numba
+        BACKEND = "numba"
+    except ImportError:
+        numba = None
+
+
+if BACKEND == "numba":
+    import numpy as np
+
+    @numba.njit(cache=True, nogil=True)
+    def _classify(difference, a, b, c, d):
+        # Same rule order as the legacy if/elif chain: A, then C, then G, otherwise T
+        if c < difference < b:
+            return A_CODE
+        if b <= difference <= a:
+            return C_CODE
+        if d <= difference <= c:
+            return G_CODE
+        return T_CODE
+
+    @numba.njit(cache=True, nogil=True)
+    def _encode_translate(data, references, boundaries, codon_table, codes, protein):
+        n_refs = len(references)
+        codon = 0
+        position = 0
+        for i in range(len(data)):
+            x = data[i]
+            finite = np.isfinite(x)
+            for j in range(n_refs):
+                code = _classify(x - references[j], boundaries[j, 0], boundaries[j, 1],
+                                 boundaries[j, 2], boundaries[j, 3]) if finite else N_CODE
+                codes[j, i] = code
+                codon = codon * N_BASES + code
+                position += 1
+                if position % 3 == 0:
+                    protein[position // 3 - 1] = codon_table[codon]
+                    codon = 0
+
+    @numba.njit(cache=True, nogil=True)
+    def _run_statistics(codes, runs, longest):
+        for row in range(codes.shape[0]):
+            n = codes.shape[1]
+            start = 0
+            for i in range(1, n + 1):
+                if i == n or codes[row, i] != codes[row, start]:
+                    base = codes[row, start]
+                    runs[row, base] += 1
+                    if i - start > longest[row, base]:
+                        longest[row, base] = i - start
+                    start = i
+
+    def encode_translate(data, references, boundaries, codon_table):
+        # (samples,) data -> (N, samples) codes and the first-frame protein; non-finite samples are N
+        codes = np.empty((len(references), len(data)), dtype=np.uint8)
+        protein = np.empty(len(data) * len(references) // 3, dtype=np.uint8)
+        _encode_translate(np.ascontiguousarray(data, dtype=np.float64),
+                          np.ascontiguousarray(references, dtype=np.float64),
+                          np.ascontiguousarray(boundaries, dtype=np.float64), codon_table, codes, protein)
+        return codes, protein
+
+    def run_statistics(codes):
+        # (rows, samples) codes -> (rows, 5) number of runs and longest run of every base
+        codes = np.ascontiguousarray(codes, dtype=np.uint8)
+        runs = np.zeros((len(codes), N_BASES), dtype=np.int64)
+        longest = np.zeros((len(codes), N_BASES), dtype=np.int64)
+        if codes.shape[1]:
+            _run_statistics(codes, runs, longest)
+        return runs, longest
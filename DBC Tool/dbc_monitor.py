@@ -0,0 +1,426 @@
+"""
+=========================================================
+ DBC streaming anomaly monitor
+=========================================================
+ Scores a live trace while it is being encoded. Samples
+ are encoded as they arrive, and the rates of a few codon
+ features are kept over a rolling window of codons:
+
+   Stop         codons translating to X
+   Unknown      codons with an N (translate to -)
+   T-dominated  codons with two or more T
+
+ Each rate is compared with a baseline learned from
+ Normal files (mean and spread of the windowed rate), and
+ the score is the largest absolute z-score. An alert is
+ raised when the score reaches --alert-on and cleared
+ when it falls to --alert-off, and every alert and clear
+ goes to the sinks (log file, callback or a local UDP
+ socket).
+
+ Rolling counts cost O(1) per codon, input is processed
+ in blocks of at most --block samples and sinks never
+ block, so the delay from a sample to its alert stays
+ bounded; every event carries its latency.
+
+ Data files may have several channels; one channel is
+ monitored (learn --channel, 1-based, kept in the
+ baseline, so score replays the same channel). Files
+ without that channel are skipped. Samples read from
+ stdin are one channel.
+
+ Preprocessing steps given to learn (--preprocess) are
+ kept in the baseline and applied to the scored stream
+ as well; event sample numbers then count preprocessed
+ (e.g. decimated) samples.
+
+ Usage:
+   python dbc_monitor.py learn ../Normal-Abnormal-Datasets --mu 75 --sigma 5 \\
+       --baseline baseline.json
+   python dbc_monitor.py score ../Normal-Abnormal-Datasets --baseline baseline.json
+   sensor_feed | python dbc_monitor.py score - --baseline baseline.json \\
+       --udp 127.0.0.1:9999
+=========================================================
+"""
+
+import argparse
+import collections
+import json
+import os
+import socket
+import sys
+import time
+
+import numpy as np
+
+import dbc_engine as dbc
+import dbc_browser
+import dbc_preprocess
+
+N_CODONS = len(dbc.BASES) ** 3
+DEFAULT_WINDOW = 32
+MIN_SPREAD = 0.02   # floor of the baseline spread, so a feature that never varied cannot alert on one codon
+
+
+def _codon_bases():
+    index = np.arange(N_CODONS)
+    return np.stack([index // 25, index // 5 % 5, index % 5], axis=1)
+
+def codon_features(amino_acids=""):
+    # Feature name -> (125,) bool mask over codon indices
+    bases = _codon_bases()
+    features = {
+        "Stop": dbc.CODON_TABLE == ord("X"),
+        "Unknown": dbc.CODON_TABLE == ord(dbc.UNKNOWN_AMINO_ACID),
+        "T-dominated": (bases == dbc.T_CODE).sum(axis=1) >= 2,
+    }
+    if amino_acids:
+        features["Amino acids " + amino_acids] = np.isin(dbc.CODON_TABLE, list(amino_acids.encode("ascii")))
+    return features
+
+
+class StreamEncoder:
+    # Turns blocks of samples into codon indices; the bases of an unfinished codon
+    # and the last finite value (for missing="ffill") are carried to the next block.
+    # Preprocessing steps run first, with their own state (dbc_preprocess.Preprocessor).
+    def __init__(self, references, boundaries, missing="mark", preprocessing=None):
+        self.references, self.boundaries = dbc.as_parameters(references, boundaries)
+        self.missing = missing
+        self.preprocessor = dbc_preprocess.Preprocessor(preprocessing) if preprocessing else None
+        self.carry = np.empty(0, dtype=np.uint8)
+        self.last_value = None
+        self.samples = 0
+
+    def push(self, samples):
+        data = np.asarray(samples, dtype=np.float64).ravel()
+        self.samples += len(data)
+        if self.preprocessor is not None:
+            data = self.preprocessor.push(data)
+        return self.encode(data)
+
+    def flush(self):
+        # End of the stream: codons of the samples the preprocessing steps still hold back
+        rest = self.preprocessor.flush() if self.preprocessor is not None else None
+        return self.encode(rest if rest is not None else np.empty(0))
+
+    def encode(self, data):
+        if self.missing == "ffill" and self.last_value is not None and len(data) and not np.isfinite(data[0]):
+            data = data.copy()
+            data[0] = self.last_value
+        finite = np.flatnonzero(np.isfinite(data))
+        if len(finite):
+            self.last_value = data[finite[-1]]
+        codes = dbc.encode(data, self.references, self.boundaries, self.missing)
+        mrna = np.concatenate([self.carry, dbc.interleave(codes)])
+        n_bases = len(mrna) // 3 * 3
+        self.carry = mrna[n_bases:]
+        return dbc.codon_indices(mrna[:n_bases])
+
+
+class RollingRates:
+    # Counts of every feature over the last `window` codons. The codons leaving the
+    # window are read back from a ring buffer, so each codon costs O(1).
+    def __init__(self, features, window=DEFAULT_WINDOW):
+        self.names = list(features)
+        self.table = np.stack([features[name] for name in self.names], axis=1).astype(np.int32)
+        self.window = window
+        self.ring = np.zeros((window, len(self.names)), dtype=np.int32)
+        self.position = 0
+        self.counts = np.zeros(len(self.names), dtype=np.int64)
+        self.seen = 0
+
+    def push(self, codons):
+        # (k,) codon indices -> (k, features) rates, NaN until the window has filled
+        flags = self.table[codons]
+        k = len(flags)
+        if not k:
+            return np.empty((0, len(self.names)))
+        overlap = min(k, self.window)
+        leaving = np.empty_like(flags)
+        leaving[:overlap] = self.ring[(self.position + np.arange(overlap)) % self.window]
+        leaving[overlap:] = flags[:k - overlap]
+        counts = self.counts + np.cumsum(flags - leaving, axis=0)
+        self.ring[(self.position + np.arange(k - overlap, k)) % self.window] = flags[k - overlap:]
+        self.position = (self.position + k) % self.window
+        self.counts = counts[-1]
+        rates = counts / self.window
+        full = self.seen + np.arange(1, k + 1) >= self.window
+        rates[~full] = np.nan
+        self.seen += k
+        return rates
+
+
+# Baseline
+def windowed_rates(codons, features, window=DEFAULT_WINDOW):
+    return RollingRates(features, window).push(codons)[window - 1:]
+
+def learn_baseline(paths, parameter_spec, missing="mark", window=DEFAULT_WINDOW, amino_acids="",
+                   label_key="Pattern Type", label="Normal", preprocessing=None, channel=1):
+    references, boundaries = dbc.parameters_from_dict(parameter_spec)
+    features = codon_features(amino_acids)
+    rates, files = [], 0
+    for path in paths:
+        try:
+            dataset = dbc.load_dataset(path)
+        except (OSError, ValueError):
+            continue
+        if label and dataset["Metadata"].get(label_key) != label:
+            continue
+        data = dataset["Numerical Data"]
+        if not data.size or data.shape[1] < channel:
+            continue
+        encoder = StreamEncoder(references, boundaries, missing, preprocessing)
+        codons = np.concatenate([encoder.push(data[:, channel - 1]), encoder.flush()])
+        rates.append(windowed_rates(codons, features, window))
+        files += 1
+    rates = np.concatenate(rates) if rates else np.empty((0, len(features)))
+    if not len(rates):
+        raise ValueError(f"No {label or 'data'} files with channel {channel} and at least {window} codons "
+                         f"to learn a baseline from.")
+    return {"Parameters": parameter_spec, "Missing": missing, "Window": window, "Amino Acids": amino_acids,
+            "Channel": channel,
+            "Preprocessing": dbc_preprocess.validate_steps(preprocessing), "Files": files, "Windows": len(rates),
+            "Engine Version": dbc.ENGINE_VERSION,
+            "Features": {name: {"Mean": float(rates[:, i].mean()), "Std": float(rates[:, i].std())}
+                         for i, name in enumerate(features)}}
+
+
+# Sinks
+class LogSink:
+    def __init__(self, file=None):
+        self.file = file
+
+    def __call__(self, event):
+        line = json.dumps(event)
+        if self.file is None:
+            print(line, flush=True)
+        else:
+            with open(self.file, "a") as file:
+                file.write(line + "\n")
+
+class CallbackSink:
+    def __init__(self, callback):
+        self.callback = callback
+
+    def __call__(self, event):
+        self.callback(event)
+
+class UdpSink:
+    # One JSON datagram per event; a full socket buffer drops the event instead of waiting.
+    def __init__(self, host="127.0.0.1", port=9999):
+        self.address = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.dropped = 0
+
+    def __call__(self, event):
+        try:
+            self.socket.sendto(json.dumps(event).encode("utf-8"), self.address)
+        except OSError:
+            self.dropped += 1
+
+
+class AnomalyMonitor:
+    def __init__(self, baseline, sinks=(), alert_on=4.0, alert_off=2.0, block=4096, source=None):
+        if alert_off >= alert_on:
+            raise ValueError("alert_off must be lower than alert_on.")
+        references, boundaries = dbc.parameters_from_dict(baseline["Parameters"])
+        features = codon_features(baseline.get("Amino Acids", ""))
+        self.encoder = StreamEncoder(references, boundaries, baseline.get("Missing", "mark"),
+                                     baseline.get("Preprocessing"))
+        self.rates = RollingRates(features, baseline["Window"])
+        self.mean = np.array([baseline["Features"][name]["Mean"] for name in self.rates.names])
+        self.spread = np.maximum([baseline["Features"][name]["Std"] for name in self.rates.names], MIN_SPREAD)
+        self.bases_per_sample = len(references)
+        self.sinks = list(sinks)
+        self.alert_on = alert_on
+        self.alert_off = alert_off
+        self.block = block
+        self.source = source
+        self.alerting = False
+        self.codons = 0
+        self.score = np.nan
+        self.latencies = collections.deque(maxlen=10000)
+
+    def push(self, samples):
+        # Feed samples in arrival order; returns the alert/clear events they caused
+        samples = np.asarray(samples, dtype=np.float64).ravel()
+        events = []
+        for start in range(0, len(samples), self.block):
+            events += self.push_block(samples[start:start + self.block], time.perf_counter())
+        return events
+
+    def flush(self):
+        # End of the stream; scores the samples held back by preprocessing steps
+        return self.push_codons(self.encoder.flush(), time.perf_counter())
+
+    def push_block(self, samples, received):
+        return self.push_codons(self.encoder.push(samples), received)
+
+    def push_codons(self, codons, received):
+        rates = self.rates.push(codons)
+        scores = np.max(np.abs(rates - self.mean) / self.spread, axis=1) if len(rates) else np.empty(0)
+        events = []
+        for i, alerting in self.transitions(scores):
+            codon = self.codons + i
+            events.append({"Event": "alert" if alerting else "clear", "Source": self.source,
+                           "Codon": int(codon), "Sample": int((3 * codon + 2) // self.bases_per_sample),
+                           "Score": round(float(scores[i]), 3),
+                           "Rates": {name: round(float(rate), 4) for name, rate in zip(self.rates.names, rates[i])}})
+        self.codons += len(codons)
+        if len(scores):
+            self.score = scores[-1]
+        latency = (time.perf_counter() - received) * 1000
+        self.latencies.append(latency)
+        for event in events:
+            event["Latency (ms)"] = round(latency, 3)
+            for sink in self.sinks:
+                sink(event)
+        return events
+
+    def transitions(self, scores):
+        # Hysteresis: alternately the next score >= alert_on and the next <= alert_off
+        raised = np.flatnonzero(scores >= self.alert_on)
+        cleared = np.flatnonzero(scores <= self.alert_off)
+        changes, position = [], 0
+        while True:
+            candidates = cleared if self.alerting else raised
+            i = np.searchsorted(candidates, position)
+            if i == len(candidates):
+                return changes
+            position = candidates[i]
+            self.alerting = not self.alerting
+            changes.append((position, self.alerting))
+            position += 1
+
+    def metrics(self):
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        return {"Samples": self.encoder.samples, "Codons": self.codons, "Alerting": self.alerting,
+                "Score": None if np.isnan(self.score) else round(float(self.score), 3),
+                "Latency (ms)": {"mean": round(float(latencies.mean()), 3),
+                                 "p99": round(float(np.percentile(latencies, 99)), 3),
+                                 "max": round(float(latencies.max()), 3)}}
+
+
+def read_stream(file, block):
+    # Numbers from a text stream, one or more per line. Everything read so far is yielded
+    # as soon as a line arrives, in blocks of at most `block` values, so nothing backs up.
+    for line in file:
+        values = []
+        for field in line.replace(",", " ").split():
+            try:
+                values.append(float(field))
+            except ValueError:
+                values.append(np.nan)
+        for start in range(0, len(values), block):
+            yield values[start:start + block]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score the codon stream of a trace against a Normal baseline.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    learn = commands.add_parser("learn", help="learn a baseline from labelled files")
+    learn.add_argument("folder")
+    learn.add_argument("--baseline", default="baseline.json", help="output file")
+    learn.add_argument("--params", help="JSON file with a parameter set "
+                                        "(mu/sigma[/ks/alpha..delta] or references/boundaries)")
+    learn.add_argument("--mu", type=float)
+    learn.add_argument("--sigma", type=float)
+    learn.add_argument("--pattern", default="*.txt")
+    learn.add_argument("--missing", choices=dbc.MISSING_POLICIES, default="mark",
+                       help="how NaN/infinite samples are encoded")
+    learn.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="codons per rolling window")
+    learn.add_argument("--amino-acids", default="", help="also track the rate of these amino acids, e.g. YV")
+    learn.add_argument("--preprocess", default="",
+                       help="preprocessing steps, e.g. detrend=1024,median=5 (or a JSON list/file)")
+    learn.add_argument("--channel", type=int, default=1, help="channel of multichannel files (1-based)")
+    learn.add_argument("--label-key", default="Pattern Type")
+    learn.add_argument("--label", default="Normal", help="files used for the baseline ('' for all)")
+
+    score = commands.add_parser("score", help="replay files, or read samples from stdin ('-'), and raise alerts")
+    score.add_argument("source", help="a data file, a folder of data files or - for stdin")
+    score.add_argument("--baseline", default="baseline.json")
+    score.add_argument("--pattern", default="*.txt")
+    score.add_argument("--alert-on", type=float, default=4.0, help="score that raises an alert")
+    score.add_argument("--alert-off", type=float, default=2.0, help="score that clears it")
+    score.add_argument("--block", type=int, default=4096, help="most samples processed per step")
+    score.add_argument("--log", help="append events to this JSON-lines file instead of printing them")
+    score.add_argument("--udp", help="also send events as datagrams to host:port")
+    args = parser.parse_args()
+
+    if args.command == "learn":
+        if args.params:
+            with open(args.params) as file:
+                parameter_spec = json.load(file)
+        elif args.mu is not None and args.sigma is not None:
+            parameter_spec = {"mu": args.mu, "sigma": args.sigma}
+        else:
+            parser.error("either --params or both --mu and --sigma are required")
+        dbc.parameters_from_dict(parameter_spec)   # fail early on invalid boundaries
+        if args.window < 1:
+            parser.error("--window must be positive")
+        if args.channel < 1:
+            parser.error("--channel must be 1 or more")
+        try:
+            preprocessing = dbc_preprocess.parse_steps(args.preprocess)
+        except ValueError as e:
+            parser.error(str(e))
+        paths = dbc_browser.list_datasets(args.folder, args.pattern)
+        try:
+            baseline = learn_baseline(paths, parameter_spec, args.missing, args.window, args.amino_acids,
+                                      args.label_key, args.label, preprocessing, args.channel)
+        except ValueError as e:
+            parser.error(str(e))
+        with open(args.baseline, "w") as file:
+            json.dump(baseline, file, indent=2)
+        print(f"Baseline from {baseline['Files']} files ({baseline['Windows']} windows) written to {args.baseline}")
+        for name, values in baseline["Features"].items():
+            print(f"  {name:<16} mean {values['Mean']:.4f}  std {values['Std']:.4f}")
+        return
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    sinks = [LogSink(args.log)]
+    if args.udp:
+        host, _, port = args.udp.rpartition(":")
+        sinks.append(UdpSink(host or "127.0.0.1", int(port)))
+
+    if args.source == "-":
+        monitor = AnomalyMonitor(baseline, sinks, args.alert_on, args.alert_off, args.block, "stdin")
+        try:
+            for values in read_stream(sys.stdin, args.block):
+                monitor.push(values)
+        except KeyboardInterrupt:
+            pass
+        monitor.flush()
+        print(json.dumps(monitor.metrics()), file=sys.stderr)
+        return
+
+    channel = baseline.get("Channel", 1)
+    paths = [args.source] if os.path.isfile(args.source) else dbc_browser.list_datasets(args.source, args.pattern)
+    for path in paths:
+        try:
+            dataset = dbc.load_dataset(path)
+        except (OSError, ValueError) as e:
+            print(f"Skipped {os.path.basename(path)}: {e}", file=sys.stderr)
+            continue
+        data = dataset["Numerical Data"]
+        if not data.size:
+            continue
+        if data.shape[1] < channel:
+            print(f"Skipped {os.path.basename(path)}: no channel {channel} ({data.shape[1]} channels)", file=sys.stderr)
+            continue
+        # One monitor per file: each replayed file is its own stream
+        monitor = AnomalyMonitor(baseline, sinks, args.alert_on, args.alert_off, args.block,
+                                 os.path.basename(path))
+        monitor.push(data[:, channel - 1])
+        monitor.flush()
+        metrics = monitor.metrics()
+        print(f"{os.path.basename(path)}: {dataset['Metadata'].get('Pattern Type', '')} "
+              f"{metrics['Codons']} codons, final score {metrics['Score']}, "
+              f"max latency {metrics['Latency (ms)']['max']} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+=========================================================
+ DBC motif mining
+=========================================================
+ Finds amino-acid substrings (motifs) that occur in a
+ larger share of the proteins of one group (e.g.
+ Abnormal) than of the others (e.g. Normal).
+
+ The proteins of all files are concatenated, each ended
+ by its own separator symbol, and indexed with a suffix
+ array (prefix doubling with NumPy sorts) and an LCP
+ array. Every substring of length L that occurs more
+ than once is a run of adjacent suffixes whose LCP is at
+ least L, so all motifs of one length and the number of
+ proteins of each group that contain them come out of a
+ few array operations, without enumerating substrings
+ in Python. Motifs are ranked by log2 enrichment of the
+ target group's support over the other groups' support.
+
+ Usage:
+   python dbc_motifs.py ../Normal-Abnormal-Datasets --mu 75 --sigma 5
+   python dbc_motifs.py archive/ --params params.json --target Abnormal \\
+       --min-length 3 --max-length 12 --min-support 10 --json motifs.json
+=========================================================
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import dbc_engine as dbc
+import dbc_browser
+
+UNLABELLED = "Unlabelled"
+
+_SYMBOL_INDEX = np.full(256, len(dbc.AMINO_ACIDS) - 1, dtype=np.int64)
+_SYMBOL_INDEX[np.frombuffer(dbc.AMINO_ACIDS.encode("ascii"), dtype=np.uint8)] = np.arange(len(dbc.AMINO_ACIDS))
+_SYMBOL_LETTERS = np.frombuffer(dbc.AMINO_ACIDS.encode("ascii"), dtype=np.uint8)
+
+
+# Corpus
+def load_proteins(paths, parameter_spec, missing="mark", label_key="Pattern Type"):
+    # One frame-0 protein per file and channel, with the file's group label
+    references, boundaries = dbc.parameters_from_dict(parameter_spec)
+    proteins, labels, errors = [], [], []
+    for path in paths:
+        try:
+            dataset = dbc.load_dataset(path)
+            data = dataset["Numerical Data"]
+            if not data.size:
+                raise ValueError("No numerical data found in the file.")
+            _, channel_proteins = dbc.encode_translate_channel_sets(data, [(references, boundaries)] * data.shape[1],
+                                                                    missing)
+        except (OSError, ValueError) as e:
+            errors.append((path, str(e)))
+            continue
+        label = dataset["Metadata"].get(label_key, UNLABELLED)
+        for protein in channel_proteins:
+            proteins.append(protein)
+            labels.append(label)
+    return proteins, labels, errors
+
+def load_corpus(paths, parameter_spec, missing="mark", label_key="Pattern Type", workers=None, chunk_size=512):
+    if len(paths) <= chunk_size or workers == 1:
+        return load_proteins(paths, parameter_spec, missing, label_key)
+    proteins, labels, errors = [], [], []
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk_proteins, chunk_labels, chunk_errors in executor.map(
+                load_proteins, chunks, *[[value] * len(chunks) for value in (parameter_spec, missing, label_key)]):
+            proteins += chunk_proteins
+            labels += chunk_labels
+            errors += chunk_errors
+    return proteins, labels, errors
+
+def concatenate(proteins):
+    # Symbols 0..21 are amino acids; protein d is followed by separator 22 + d, so no
+    # two suffixes share a prefix that runs past the end of a protein.
+    lengths = np.array([len(protein) for protein in proteins], dtype=np.int64)
+    ends = np.cumsum(lengths + 1) - 1
+    text = np.empty(int(ends[-1]) + 1 if len(ends) else 0, dtype=np.int64)
+    separators = np.zeros(len(text), dtype=bool)
+    separators[ends] = True
+    text[separators] = len(dbc.AMINO_ACIDS) + np.arange(len(proteins))
+    if len(proteins):
+        text[~separators] = _SYMBOL_INDEX[np.concatenate(proteins)]
+    documents = np.repeat(np.arange(len(proteins)), lengths + 1)
+    remaining = ends[documents] - np.arange(len(text))   # symbols left before the separator
+    return text, documents, remaining
+
+
+# Suffix array and LCP
+def suffix_array(text, max_depth=None):
+    # Prefix doubling: after round h, rank compares suffixes by their first 2**h symbols.
+    # With max_depth, sorting stops once suffixes are ordered by their first max_depth symbols.
+    n = len(text)
+    rank_type = np.int32 if n < 2 ** 31 - 1 else np.int64
+    present = np.bincount(text) > 0 if n else np.zeros(0, dtype=bool)
+    rank = (np.cumsum(present) - 1).astype(rank_type)[text]
+    levels = [rank]
+    step = 1
+    while n and rank.max() < n - 1 and (max_depth is None or step < max_depth):
+        following = np.zeros(n, dtype=np.int64)
+        following[:n - step] = rank[step:].astype(np.int64) + 1
+        key = rank.astype(np.int64) * (n + 1) + following
+        order = np.argsort(key)
+        sorted_key = key[order]
+        rank = np.empty(n, dtype=rank_type)
+        rank[order] = np.concatenate(([0], np.cumsum(sorted_key[1:] != sorted_key[:-1])))
+        levels.append(rank)
+        step *= 2
+    return np.argsort(rank, kind="stable"), levels
+
+def lcp_array(sa, levels):
+    # lcp[k] = longest common prefix of suffixes sa[k] and sa[k + 1], from the
+    # rank of every doubling round (largest first)
+    n = len(sa)
+    first, second = sa[:-1], sa[1:]
+    lcp = np.zeros(max(n - 1, 0), dtype=np.int64)
+    for level in range(len(levels) - 1, -1, -1):
+        i, j = first + lcp, second + lcp
+        inside = (i < n) & (j < n)
+        same = np.zeros(len(lcp), dtype=bool)
+        same[inside] = levels[level][i[inside]] == levels[level][j[inside]]
+        lcp[same] += 1 << level
+    return lcp
+
+
+class MotifIndex:
+    def __init__(self, proteins, labels, max_length=None):
+        self.labels = sorted(set(labels))
+        self.document_class = np.array([self.labels.index(label) for label in labels], dtype=np.int64)
+        self.class_sizes = np.bincount(self.document_class, minlength=len(self.labels))
+        self.text, self.documents, self.remaining = concatenate(proteins)
+        self.sa, levels = suffix_array(self.text, max_length)
+        self.lcp = lcp_array(self.sa, levels)
+        self.suffix_documents = self.documents[self.sa]
+        self.suffix_remaining = self.remaining[self.sa]
+
+    def motif_text(self, position, length):
+        return _SYMBOL_LETTERS[self.text[position:position + length]].tobytes().decode("ascii")
+
+    def motifs(self, length, min_support=1):
+        # All substrings of this length: (start positions, occurrences, proteins per group)
+        n_documents, n_labels = len(self.document_class), len(self.labels)
+        valid = np.flatnonzero(self.suffix_remaining >= length)
+        # A new substring starts wherever the LCP with the previous suffix is shorter than length
+        starts = np.concatenate(([True], self.lcp < length))[valid]
+        starts[:1] = True
+        first = np.flatnonzero(starts)
+        occurrences = np.diff(np.append(first, len(valid)))
+        group = np.cumsum(starts) - 1
+        # A motif in fewer than min_support places cannot be in min_support proteins
+        frequent = occurrences >= min_support
+        kept = frequent[group]
+        group = (np.cumsum(frequent) - 1)[group[kept]]
+        # Proteins per group: distinct (substring, protein) pairs, by sorting
+        keys = group * n_documents + self.suffix_documents[valid[kept]]
+        keys.sort()
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))[:len(keys)]]
+        n_frequent = int(frequent.sum())
+        support = np.bincount((keys // n_documents) * n_labels + self.document_class[keys % n_documents],
+                              minlength=n_frequent * n_labels).reshape(n_frequent, n_labels)
+        keep = support.sum(axis=1) >= min_support
+        return self.sa[valid[first[frequent][keep]]], occurrences[frequent][keep], support[keep]
+
+    def enriched(self, target, min_length=2, max_length=8, min_support=5, top=20):
+        t = self.labels.index(target)
+        rows = []
+        for length in range(min_length, max_length + 1):
+            positions, occurrences, support = self.motifs(length, min_support)
+            if not len(positions):
+                break
+            target_support = support[:, t]
+            other_support = support.sum(axis=1) - target_support
+            n_target = self.class_sizes[t]
+            n_other = self.class_sizes.sum() - n_target
+            # log2 ratio of the smoothed shares of target and other proteins that contain the motif
+            enrichment = np.log2((target_support + 0.5) / (n_target + 1)) - np.log2((other_support + 0.5) / (n_other + 1))
+            for k in np.argsort(-enrichment, kind="stable")[:top]:
+                rows.append((float(enrichment[k]), self.motif_text(positions[k], length), int(occurrences[k]),
+                             support[k]))
+        rows.sort(key=lambda row: (-row[0], -int(row[3][t]), row[1]))
+        return rows[:top]
+
+
+def motif_report(index, target, rows):
+    others = [label for label in index.labels if label != target]
+    lines = [", ".join(f"{label}: {size} proteins" for label, size in zip(index.labels, index.class_sizes)),
+             "", f"Motifs enriched in {target}" + (f" (vs {', '.join(others)})" if others else ""),
+             f"{'Motif':<16}{'log2 enr.':>10}{'Occur.':>8}" + "".join(f"{label[:11]:>12}" for label in index.labels)]
+    for enrichment, motif, occurrences, support in rows:
+        lines.append(f"{motif:<16}{enrichment:10.2f}{occurrences:8d}" +
+                     "".join(f"{100 * s / max(size, 1):11.1f}%" for s, size in zip(support, index.class_sizes)))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mine protein motifs that separate labelled groups.")
+    parser.add_argument("folder")
+    parser.add_argument("--params", help="JSON file with a parameter set "
+                                         "(mu/sigma[/ks/alpha..delta] or references/boundaries)")
+    parser.add_argument("--mu", type=float)
+    parser.add_argument("--sigma", type=float)
+    parser.add_argument("--pattern", default="*.txt")
+    parser.add_argument("--label-key", default="Pattern Type", help="header field that names the group of a file")
+    parser.add_argument("--target", help="group whose enriched motifs are listed (default: Abnormal, if present)")
+    parser.add_argument("--missing", choices=dbc.MISSING_POLICIES, default="mark",
+                        help="how NaN/infinite samples are encoded")
+    parser.add_argument("--min-length", type=int, default=2)
+    parser.add_argument("--max-length", type=int, default=8)
+    parser.add_argument("--min-support", type=int, default=5, help="proteins that must contain a motif")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=None, help="processes that encode the files")
+    parser.add_argument("--json", help="write the ranked motifs to this file")
+    args = parser.parse_args()
+
+    if args.params:
+        with open(args.params) as file:
+            parameter_spec = json.load(file)
+    elif args.mu is not None and args.sigma is not None:
+        parameter_spec = {"mu": args.mu, "sigma": args.sigma}
+    else:
+        parser.error("either --params or both --mu and --sigma are required")
+    dbc.parameters_from_dict(parameter_spec)   # fail early on invalid boundaries
+    if not 1 <= args.min_length <= args.max_length:
+        parser.error("--min-length must be between 1 and --max-length")
+
+    started = time.perf_counter()
+    paths = dbc_browser.list_datasets(args.folder, args.pattern)
+    proteins, labels, errors = load_corpus(paths, parameter_spec, args.missing, args.label_key, args.workers)
+    for path, error in errors:
+        print(f"Skipped {os.path.basename(path)}: {error}")
+    if not proteins:
+        parser.error("no proteins to index")
+    loaded = time.perf_counter()
+    index = MotifIndex(proteins, labels, args.max_length)
+    indexed = time.perf_counter()
+    target = args.target or ("Abnormal" if "Abnormal" in index.labels else index.labels[-1])
+    if target not in index.labels:
+        parser.error(f"unknown group '{target}' (groups: {', '.join(index.labels)})")
+    rows = index.enriched(target, args.min_length, args.max_length, args.min_support, args.top)
+    mined = time.perf_counter()
+
+    print(motif_report(index, target, rows))
+    print(f"\n{len(proteins)} proteins, {len(index.text)} symbols: encoded in {(loaded - started) * 1000:.0f} ms, "
+          f"indexed in {(indexed - loaded) * 1000:.0f} ms, mined in {(mined - indexed) * 1000:.0f} ms")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"Parameters": parameter_spec, "Label Key": args.label_key, "Target": target,
+                       "Proteins": dict(zip(index.labels, index.class_sizes.tolist())),
+                       "Motifs": [{"Motif": motif, "Log2 Enrichment": round(enrichment, 4),
+                                   "Occurrences": occurrences,
+                                   "Support": dict(zip(index.labels, support.tolist()))}
+                                  for enrichment, motif, occurrences, support in rows]}, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+=========================================================
+ DBC signal preprocessing
+=========================================================
+ Optional steps applied to a trace before the DNA-forming
+ rules, in the order given:
+
+   {"step": "detrend", "block": 1024}         remove the
+       least-squares line of every block of samples and
+       add back the mean of the first block, so a drift
+       is removed and the trace keeps its level
+       ("keep_level": false centres it on zero instead)
+   {"step": "moving_average", "width": 5}     trailing
+       mean over the last width samples (cumulative sums)
+   {"step": "median", "width": 5}             trailing
+       median over the last width samples
+   {"step": "decimate", "factor": 4}          keep every
+       factor-th sample ("mode": "mean" averages each
+       group of factor samples instead)
+
+ Steps are vectorized and work along the first axis of a
+ (samples,) or (samples, channels) array. Preprocessor
+ runs them on chunks as they arrive (a stream or a
+ memory-mapped file) and carries the state each step
+ needs, so chunked and whole-array results agree (up to
+ rounding in the moving average). Non-finite samples are
+ skipped by the averages, the median and the fit, and
+ are left in place for the missing-sample policy.
+
+ A step list is written to exports and is part of the
+ result-cache key, e.g. "detrend=1024,median=5,decimate=4"
+ on the command line of the tools.
+=========================================================
+"""
+
+import json
+import os
+import warnings
+
+import numpy as np
+
+STEPS = ("detrend", "moving_average", "median", "decimate")
+DEFAULT_CHUNK = 65536
+PREPROCESS_VERSION = "2"   # part of cache keys; bump when a step's output changes
+
+
+# Steps
+def _finite_sums(values):
+    # Cumulative sums of the finite values and of their count, with a leading zero row
+    finite = np.isfinite(values)
+    sums = np.cumsum(np.where(finite, values, 0.0), axis=0)
+    counts = np.cumsum(finite, axis=0)
+    zero = np.zeros((1,) + values.shape[1:])
+    return np.concatenate([zero, sums]), np.concatenate([zero, counts])
+
+class MovingAverage:
+    def __init__(self, width):
+        self.width = width
+        self.tail = None
+
+    def push(self, chunk):
+        values = chunk if self.tail is None else np.concatenate([self.tail, chunk])
+        sums, counts = _finite_sums(values)
+        ends = np.arange(len(values) - len(chunk), len(values)) + 1
+        starts = np.maximum(ends - self.width, 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out = (sums[ends] - sums[starts]) / (counts[ends] - counts[starts])
+        self.tail = values[len(values) - min(len(values), self.width - 1):]
+        return out
+
+    def flush(self):
+        return None
+
+class MovingMedian:
+    def __init__(self, width):
+        self.width = width
+        self.tail = None
+
+    def push(self, chunk):
+        if self.tail is None:
+            # the first windows are shorter; NaN padding is ignored by nanmedian
+            self.tail = np.full((self.width - 1,) + chunk.shape[1:], np.nan)
+        values = np.concatenate([self.tail, chunk])
+        windows = np.lib.stride_tricks.sliding_window_view(values, self.width, axis=0)
+        # np.median for windows without gaps, the much slower np.nanmedian only where needed
+        gaps = np.concatenate([np.zeros((1,) + values.shape[1:]), np.cumsum(~np.isfinite(values), axis=0)])
+        ragged = gaps[self.width:] - gaps[:-self.width] > 0
+        out = np.median(windows, axis=-1)
+        if ragged.any():
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)   # all-NaN windows give NaN
+                out[ragged] = np.nanmedian(windows[ragged], axis=-1)
+        self.tail = values[len(values) - (self.width - 1):]
+        return out
+
+    def flush(self):
+        return None
+
+class Decimate:
+    def __init__(self, factor, mode="pick"):
+        self.factor = factor
+        self.mode = mode
+        self.seen = 0
+        self.partial = None   # samples of an unfinished group (mode "mean")
+
+    def push(self, chunk):
+        if self.mode == "pick":
+            out = chunk[(-self.seen) % self.factor::self.factor]
+            self.seen += len(chunk)
+            return out
+        values = chunk if self.partial is None else np.concatenate([self.partial, chunk])
+        n_groups = len(values) // self.factor
+        self.partial = values[n_groups * self.factor:]
+        return self.group_means(values[:n_groups * self.factor], self.factor)
+
+    def group_means(self, values, size):
+        groups = values.reshape((-1, size) + values.shape[1:])
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            return np.nanmean(groups, axis=1)
+
+    def flush(self):
+        if self.mode == "mean" and self.partial is not None and len(self.partial):
+            out = self.group_means(self.partial, len(self.partial))   # the last, shorter group
+            self.partial = None
+            return out
+        return None
+
+class BlockDetrend:
+    # Blocks are counted from the first sample, so output lags by up to one block.
+    # Every block loses its whole fitted line (offset and slope); one level, the mean of
+    # the first block with data in each channel, is carried over and added back.
+    def __init__(self, block, keep_level=True):
+        self.block = block
+        self.keep_level = keep_level
+        self.partial = None
+        self.level = None
+
+    def push(self, chunk):
+        values = chunk if self.partial is None else np.concatenate([self.partial, chunk])
+        n_blocks = len(values) // self.block
+        self.partial = values[n_blocks * self.block:]
+        return self.detrend(values[:n_blocks * self.block].reshape((n_blocks, self.block) + values.shape[1:]))
+
+    def detrend(self, blocks):
+        # (blocks, length, ...) -> detrended samples; one least-squares line per block and channel
+        t = np.arange(blocks.shape[1], dtype=np.float64).reshape((1, -1) + (1,) * (blocks.ndim - 2))
+        finite = np.isfinite(blocks)
+        n = np.maximum(finite.sum(axis=1, keepdims=True), 1)
+        x = np.where(finite, blocks, 0.0)
+        t_mean = np.where(finite, t, 0.0).sum(axis=1, keepdims=True) / n
+        x_mean = x.sum(axis=1, keepdims=True) / n
+        dt = np.where(finite, t - t_mean, 0.0)
+        spread = (dt * dt).sum(axis=1, keepdims=True)
+        slope = np.divide((dt * (x - x_mean)).sum(axis=1, keepdims=True), spread,
+                          out=np.zeros_like(spread), where=spread > 0)
+        out = blocks - x_mean - slope * (t - t_mean)
+        if self.keep_level:
+            out = out + self.carried_level(finite.any(axis=1), x_mean[:, 0])
+        return out.reshape((-1,) + blocks.shape[2:])
+
+    def carried_level(self, has_data, means):
+        # has_data, means: (blocks, ...) -> level of every channel, set by its first block with data
+        if self.level is None:
+            self.level = np.full(means.shape[1:], np.nan)
+        unset = np.isnan(self.level) & has_data.any(axis=0)
+        if unset.any():
+            first = np.argmax(has_data, axis=0)[None]
+            self.level = np.where(unset, np.take_along_axis(means, first, axis=0)[0], self.level)
+        return self.level
+
+    def flush(self):
+        if self.partial is not None and len(self.partial):
+            out = self.detrend(self.partial[None])
+            self.partial = None
+            return out
+        return None
+
+
+# Step lists
+def validate_steps(steps):
+    # Normalised copy of a step list; raises ValueError on unknown steps or bad sizes
+    normalised = []
+    for step in steps or []:
+        name = step.get("step")
+        if name not in STEPS:
+            raise ValueError(f"Unknown preprocessing step '{name}' (steps: {', '.join(STEPS)}).")
+        size_key = {"detrend": "block", "moving_average": "width", "median": "width", "decimate": "factor"}[name]
+        size = step.get(size_key)
+        if not isinstance(size, int) or isinstance(size, bool) or size < 1:
+            raise ValueError(f"'{name}' needs a positive integer '{size_key}'.")
+        entry = {"step": name, size_key: size}
+        if name == "detrend":
+            entry["keep_level"] = bool(step.get("keep_level", True))
+        if name == "decimate":
+            entry["mode"] = step.get("mode", "pick")
+            if entry["mode"] not in ("pick", "mean"):
+                raise ValueError("'decimate' mode must be 'pick' or 'mean'.")
+        normalised.append(entry)
+    return normalised
+
+def parse_steps(text):
+    # A JSON list, a JSON file, or the short form "detrend=1024,median=5,decimate=4"
+    text = (text or "").strip()
+    if not text:
+        return []
+    if text.startswith("["):
+        return validate_steps(json.loads(text))
+    if os.path.isfile(text):
+        with open(text) as file:
+            return validate_steps(json.load(file))
+    sizes = {"detrend": "block", "moving_average": "width", "median": "width", "decimate": "factor"}
+    steps = []
+    for item in text.split(","):
+        name, _, value = item.strip().partition("=")
+        if name not in sizes:
+            raise ValueError(f"Unknown preprocessing step '{name}' (steps: {', '.join(STEPS)}).")
+        try:
+            steps.append({"step": name, sizes[name]: int(value)})
+        except ValueError:
+            raise ValueError(f"'{name}' needs a positive integer, e.g. {name}=4.") from None
+    return validate_steps(steps)
+
+def describe(steps):
+    parts = []
+    for step in steps:
+        size = step.get("block", step.get("width", step.get("factor")))
+        parts.append(f"{step['step']}={size}"
+                     + ("" if step.get("keep_level", True) else " (no level)")
+                     + (" (mean)" if step.get("mode") == "mean" else ""))
+    return ", ".join(parts) if parts else "none"
+
+def steps_key(steps):
+    # Canonical text of a step list for cache keys; empty for no preprocessing
+    steps = validate_steps(steps)
+    return json.dumps({"steps": steps, "version": PREPROCESS_VERSION}, sort_keys=True) if steps else ""
+
+
+class Preprocessor:
+    def __init__(self, steps):
+        self.steps = validate_steps(steps)
+        self.stages = []
+        for step in self.steps:
+            if step["step"] == "detrend":
+                self.stages.append(BlockDetrend(step["block"], step["keep_level"]))
+            elif step["step"] == "moving_average":
+                self.stages.append(MovingAverage(step["width"]))
+            elif step["step"] == "median":
+                self.stages.append(MovingMedian(step["width"]))
+            else:
+                self.stages.append(Decimate(step["factor"], step["mode"]))
+
+    def push(self, chunk):
+        # Samples of a chunk in -> the preprocessed samples that are ready
+        out = np.asarray(chunk, dtype=np.float64)
+        for stage in self.stages:
+            if not len(out):
+                break
+            out = stage.push(out)
+        return out
+
+    def flush(self):
+        # The samples still held back (detrend blocks, decimation groups) at the end of the input
+        out = None
+        for stage in self.stages:
+            out = stage.push(out) if out is not None and len(out) else None
+            rest = stage.flush()
+            if rest is not None and len(rest):
+                out = rest if out is None or not len(out) else np.concatenate([out, rest])
+        return out
+
+def preprocess(data, steps, chunk_size=DEFAULT_CHUNK):
+    # Whole (samples,) or (samples, channels) array, read chunk by chunk (works on np.memmap)
+    steps = validate_steps(steps)
+    if not steps:
+        return np.asarray(data, dtype=np.float64)
+    preprocessor = Preprocessor(steps)
+    parts = [preprocessor.push(data[start:start + chunk_size]) for start in range(0, len(data), chunk_size)]
+    parts.append(preprocessor.flush())
+    parts = [part for part in parts if part is not None and len(part)]
+    shape = (0,) + np.shape(data)[1:]
+    return np.concatenate(parts) if parts else np.empty(shape)
@@ -0,0 +1,287 @@
+"""
+=========================================================
+ DBC report sheets
+=========================================================
+ Renders one review sheet per data file without a
+ display (Agg backend):
+
+   - raw trace with the reference values R1..RN
+   - the difference plot of every reference with its
+     A/C/G/T bands
+   - a colour-coded excerpt of the DNA strands
+   - the protein sequence
+
+ A multichannel file gets one sheet per channel
+ (<file>-<k>.png, "channel k of K" in the title and the
+ index). Files are rendered on a process pool. Each
+ worker lays out one template figure and only swaps the
+ data into it for every sheet. An index.html lists all
+ sheets.
+
+ Usage:
+   python dbc_report.py ../Normal-Abnormal-Datasets --mu 75 --sigma 5
+   python dbc_report.py archive/ --params params.json --format pdf \\
+       --output reports/ --workers 8
+=========================================================
+"""
+
+import argparse
+import html
+import json
+import os
+import textwrap
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from matplotlib.colors import ListedColormap
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import dbc_engine as dbc
+import dbc_browser
+
+REFERENCE_COLORS = ["blue", "green", "red", "purple", "darkorange", "brown", "magenta", "teal"]
+# Band colours of the DNA-forming rules plot in the DBC Tool, by base A, C, G, T (and N)
+BASE_COLORS = ["purple", "green", "blue", "red", "lightgray"]
+PROTEIN_WIDTH = 110
+
+_settings = None   # (references, boundaries, missing, excerpt) of this worker
+_template = None   # figure and artists reused for every sheet of this worker
+
+
+def init_worker(parameter_spec, missing="mark", excerpt=60):
+    global _settings, _template
+    references, boundaries = dbc.parameters_from_dict(parameter_spec)
+    _settings = (references, boundaries, missing, excerpt)
+    _template = None
+
+def build_template(references, boundaries, excerpt):
+    n = len(references)
+    names = dbc.reference_names(n)
+    columns = min(n, 4)
+    rows = -(-n // columns)
+    fig = Figure(figsize=(11.69, 4.2 + 2.0 * rows), dpi=100)
+    FigureCanvasAgg(fig)
+    grid = fig.add_gridspec(3 + rows, columns, height_ratios=[2.2] + [1.8] * rows + [0.35 * n + 0.4, 1.3],
+                            left=0.06, right=0.98, top=0.93, bottom=0.02, hspace=0.55, wspace=0.25)
+    template = {"figure": fig, "title": fig.suptitle("", fontsize=11)}
+
+    ax = fig.add_subplot(grid[0, :])
+    template["trace"] = ax.plot([], [], linewidth=0.7, color="black")[0]
+    template["reference lines"] = [ax.axhline(R, color=color, linestyle="--", lw=0.6, label=name)
+                                   for R, name, color in zip(references, names, REFERENCE_COLORS)]
+    ax.set_xlabel("i", fontsize=9, color="gray", labelpad=1)
+    ax.set_ylabel("x(i)", fontsize=9, color="gray")
+    ax.tick_params(axis="both", labelsize=7, colors="gray")
+    ax.legend(loc="upper right", fontsize=7, ncol=n, frameon=False)
+    template["trace axes"] = ax
+
+    template["differences"] = []
+    for i, (name, (a, b, c, d)) in enumerate(zip(names, boundaries)):
+        ax = fig.add_subplot(grid[1 + i // columns, i % columns])
+        # T is everything outside the G, A and C bands
+        ax.set_facecolor((1.0, 0.0, 0.0, 0.12))
+        for (low, high), color, base in zip([(c, b), (b, a), (d, c)], BASE_COLORS[:3], "ACG"):
+            ax.axhspan(low, high, color=color, alpha=0.25, lw=0)
+            ax.annotate(base, xy=(1.005, (low + high) / 2), xycoords=("axes fraction", "data"),
+                        fontsize=7, va="center", annotation_clip=True)
+        line = ax.plot([], [], linewidth=0.6, color=REFERENCE_COLORS[i])[0]
+        ax.set_title(f"{name}: x(i) - {name}", fontsize=8, pad=2)
+        ax.tick_params(axis="both", labelsize=6, colors="gray")
+        template["differences"].append((ax, line))
+
+    ax = fig.add_subplot(grid[1 + rows, :])
+    colormap = ListedColormap(BASE_COLORS)
+    template["strand image"] = ax.imshow(np.zeros((n, excerpt)), cmap=colormap, vmin=-0.5, vmax=4.5,
+                                         aspect="auto", interpolation="nearest", alpha=0.45)
+    template["strand letters"] = [[ax.text(j, i, "", ha="center", va="center", fontsize=6, family="monospace")
+                                   for j in range(excerpt)] for i in range(n)]
+    ax.set_yticks(range(n), [f"DNA{i + 1}" for i in range(n)], fontsize=7)
+    ax.set_xticks([])
+    template["strand axes"] = ax
+
+    ax = fig.add_subplot(grid[2 + rows, :])
+    ax.axis("off")
+    template["protein"] = ax.text(0, 1, "", va="top", ha="left", fontsize=7, family="monospace",
+                                  transform=ax.transAxes)
+    return template
+
+def render_file(path, output, file_format="png"):
+    # -> one index entry per channel (a single error entry if the file cannot be read)
+    references, boundaries, missing, _ = _settings
+    name = os.path.basename(path)
+    try:
+        dataset = dbc.load_dataset(path)
+        data = dataset["Numerical Data"]
+        if not data.size:
+            raise ValueError("No numerical data found in the file.")
+        if missing == "drop":
+            # a sample missing in any channel is dropped from all, as in dbc.encode_channel_sets
+            data = data[np.isfinite(data).all(axis=1)]
+            missing = "mark"
+        encoded = [dbc.encode_translate(series, references, boundaries, missing) for series in data.T]
+    except (OSError, ValueError) as e:
+        return [{"File": name, "Error": str(e)}]
+
+    header = dict(dataset["Metadata"])
+    header.pop("Channels", None)
+    n_channels = data.shape[1]
+    entries = []
+    for k, (series, (codes, protein)) in enumerate(zip(data.T, encoded)):
+        channel = None
+        sheet = os.path.splitext(name)[0]
+        if n_channels > 1:
+            channel = f"{dataset['Channels'][k]} (channel {k + 1} of {n_channels})"
+            sheet += f"-{k + 1}"
+        entries.append(render_sheet(name, header, channel, series, codes, protein,
+                                    os.path.join(output, sheet + "." + file_format), file_format))
+    return entries
+
+def render_sheet(name, header, channel, series, codes, protein, path, file_format="png"):
+    global _template
+    references, boundaries, _, excerpt = _settings
+    if _template is None:
+        _template = build_template(references, boundaries, excerpt)
+    template = _template
+
+    title = name + "   " + "   ".join(f"{key}: {value}" for key, value in header.items())
+    if channel:
+        title += f"   {channel}"
+    template["title"].set_text(title)
+
+    x = np.arange(len(series))
+    template["trace"].set_data(x, series)
+    ax = template["trace axes"]
+    finite = series[np.isfinite(series)]
+    values = np.concatenate([finite, references])
+    margin = 0.05 * (values.max() - values.min() or 1)
+    ax.set_xlim(0, max(len(series) - 1, 1))
+    ax.set_ylim(values.min() - margin, values.max() + margin)
+
+    for (ax, line), R, (a, b, c, d) in zip(template["differences"], references, boundaries):
+        differences = series - R
+        line.set_data(x, differences)
+        values = np.concatenate([differences[np.isfinite(differences)], [a, d]])
+        margin = 0.05 * (values.max() - values.min() or 1)
+        ax.set_xlim(0, max(len(series) - 1, 1))
+        ax.set_ylim(values.min() - margin, values.max() + margin)
+
+    shown = codes[:, :excerpt]
+    image = np.full((len(codes), excerpt), np.nan)
+    image[:, :shown.shape[1]] = shown
+    template["strand image"].set_data(image)
+    for row, letters in zip(shown, template["strand letters"]):
+        text = dbc.strand_text(row)
+        for j, letter in enumerate(letters):
+            letter.set_text(text[j] if j < len(text) else "")
+    template["strand axes"].set_title(f"DNA strands, first {min(excerpt, codes.shape[1])} of {codes.shape[1]} bases",
+                                      fontsize=8, pad=2)
+
+    protein = dbc.protein_text(protein)
+    template["protein"].set_text("Protein: " + "\n".join(textwrap.wrap(protein, PROTEIN_WIDTH)))
+
+    template["figure"].savefig(path, format=file_format)
+    counts = np.bincount(codes.ravel(), minlength=len(dbc.BASES))
+    entry = {"File": name, "Sheet": os.path.basename(path), "Metadata": header, "Samples": int(codes.shape[1]),
+             "Composition": {base: round(100 * count / max(codes.size, 1), 1)
+                             for base, count in zip(dbc.BASES, counts)},
+             "Protein": protein}
+    if channel:
+        entry["Channel"] = channel
+    return entry
+
+def render_chunk(paths, output, file_format="png"):
+    return [entry for path in paths for entry in render_file(path, output, file_format)]
+
+def render_corpus(paths, output, parameter_spec, missing="mark", excerpt=60, file_format="png",
+                  workers=None, chunk_size=16):
+    if workers == 1 or len(paths) <= chunk_size:
+        init_worker(parameter_spec, missing, excerpt)
+        return render_chunk(paths, output, file_format)
+    entries = []
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(parameter_spec, missing, excerpt)) as executor:
+        for chunk_entries in executor.map(render_chunk, chunks, [output] * len(chunks),
+                                          [file_format] * len(chunks)):
+            entries += chunk_entries
+    return entries
+
+def write_index(output, entries, parameter_spec, file_format="png"):
+    rows = []
+    for entry in entries:
+        name = html.escape(entry["File"])
+        if "Channel" in entry:
+            name += "<br>" + html.escape(entry["Channel"])
+        if "Error" in entry:
+            rows.append(f"<tr><td>{name}</td><td colspan='4' class='error'>{html.escape(entry['Error'])}</td></tr>")
+            continue
+        sheet = html.escape(entry["Sheet"])
+        metadata = "<br>".join(html.escape(f"{key}: {value}") for key, value in entry["Metadata"].items())
+        composition = " ".join(f"{base} {value}%" for base, value in entry["Composition"].items() if value)
+        preview = f"<img src='{sheet}' width='360'>" if file_format == "png" else sheet
+        rows.append(f"<tr><td><a href='{sheet}'>{name}</a></td><td>{metadata}</td><td>{entry['Samples']}</td>"
+                    f"<td>{composition}</td><td><a href='{sheet}'>{preview}</a></td></tr>")
+    page = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>DBC report</title>
+<style>
+body {{ font-family: Arial, sans-serif; font-size: 13px; }}
+table {{ border-collapse: collapse; }}
+td, th {{ border: 1px solid #ccc; padding: 4px 8px; vertical-align: top; text-align: left; }}
+.error {{ color: #b00; }}
+</style></head><body>
+<h2>DBC report</h2>
+<p>{len({entry['File'] for entry in entries})} files, {sum('Sheet' in entry for entry in entries)} sheets. Parameters: {html.escape(json.dumps(parameter_spec))}</p>
+<table>
+<tr><th>File</th><th>Metadata</th><th>Samples</th><th>Composition</th><th>Sheet</th></tr>
+{chr(10).join(rows)}
+</table>
+</body></html>
+"""
+    path = os.path.join(output, "index.html")
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(page)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a review sheet for every data file in a folder.")
+    parser.add_argument("folder")
+    parser.add_argument("--output", help="output directory (default: <folder>/dbc-report)")
+    parser.add_argument("--params", help="JSON file with a parameter set "
+                                         "(mu/sigma[/ks/alpha..delta] or references/boundaries)")
+    parser.add_argument("--mu", type=float)
+    parser.add_argument("--sigma", type=float)
+    parser.add_argument("--pattern", default="*.txt")
+    parser.add_argument("--missing", choices=dbc.MISSING_POLICIES, default="mark",
+                        help="how NaN/infinite samples are encoded")
+    parser.add_argument("--format", choices=("png", "pdf"), default="png")
+    parser.add_argument("--excerpt", type=int, default=60, help="bases shown in the strand excerpt")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    if args.params:
+        with open(args.params) as file:
+            parameter_spec = json.load(file)
+    elif args.mu is not None and args.sigma is not None:
+        parameter_spec = {"mu": args.mu, "sigma": args.sigma}
+    else:
+        parser.error("either --params or both --mu and --sigma are required")
+    dbc.parameters_from_dict(parameter_spec)   # fail early on invalid boundaries
+
+    output = args.output or os.path.join(args.folder, "dbc-report")
+    os.makedirs(output, exist_ok=True)
+    started = time.perf_counter()
+    paths = dbc_browser.list_datasets(args.folder, args.pattern)
+    entries = render_corpus(paths, output, parameter_spec, args.missing, max(args.excerpt, 1), args.format,
+                            args.workers)
+    index = write_index(output, entries, parameter_spec, args.format)
+    errors = sum("Error" in entry for entry in entries)
+    print(f"{len(entries) - errors} sheets rendered in {time.perf_counter() - started:.1f} s"
+          + (f", {errors} files failed" if errors else "") + f"; index: {index}")
+
+
+if __name__ == "__main__":
+    main()
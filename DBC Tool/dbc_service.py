@@ -0,0 +1,252 @@
+"""
+=========================================================
+ DBC encoding service
+=========================================================
+ Local HTTP/JSON service that wraps the DBC encoding
+ pipeline so several gateways can share one process.
+
+   POST /encode   {"data": [...], "mu": .., "sigma": ..}
+                  or {"data": [...], "references": [...],
+                      "boundaries": [[a, b, c, d], ...]}
+                  optional "missing": "mark" | "drop" | "ffill"
+                  (null in "data" is a missing sample)
+   GET  /metrics  request, batch and latency statistics
+   GET  /health
+
+ Concurrent requests are collected for a few milliseconds
+ and requests of the same length and reference count are
+ encoded together in one vectorized call on a worker
+ pool (one fused kernel pass per request with the numba
+ backend, see dbc_kernels.py). When the queue is full new requests are refused
+ with 503 so that callers back off.
+
+ Usage:
+   python dbc_service.py --port 8765 --workers 4
+=========================================================
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+import dbc_engine as dbc
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 503: "Service Unavailable"}
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+
+def encode_batch(data, references, boundaries):
+    # (requests, samples) data, (requests, N) references, (requests, N, 4) boundaries
+    if dbc.backend() == "numba":
+        # the fused kernel encodes and translates each request in one pass
+        return [dbc.export_fields(*dbc.encode_translate(*request)) for request in zip(data, references, boundaries)]
+    codes = dbc.encode_channels(data.T, references, boundaries)
+    return [dbc.export_fields(request_codes) for request_codes in codes]
+
+
+class EncodingService:
+    def __init__(self, executor, max_batch=256, max_delay=0.002, queue_size=10000, concurrency=4):
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.slots = asyncio.Semaphore(concurrency)
+        self.started = time.perf_counter()
+        self.counts = collections.Counter()
+        self.latencies = collections.deque(maxlen=10000)
+        self.batch_sizes = collections.deque(maxlen=1000)
+        self.tasks = set()
+
+    async def encode(self, data, references, boundaries):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((data, references, boundaries, future))
+        except asyncio.QueueFull:
+            self.counts["rejected"] += 1
+            raise
+        return await future
+
+    async def run_batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                await asyncio.sleep(min(timeout, 0.0005))
+            groups = collections.defaultdict(list)
+            for item in batch:
+                groups[(len(item[0]), len(item[1]))].append(item)
+            for items in groups.values():
+                # Wait for a free worker slot so a slow pool pushes back on the queue.
+                await self.slots.acquire()
+                task = asyncio.create_task(self.run_group(items))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+
+    async def run_group(self, items):
+        try:
+            data = np.stack([item[0] for item in items])
+            references = np.stack([item[1] for item in items])
+            boundaries = np.stack([item[2] for item in items])
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(self.executor, encode_batch, data, references, boundaries)
+            for item, result in zip(items, results):
+                if not item[3].done():
+                    item[3].set_result(result)
+        except Exception as e:
+            for item in items:
+                if not item[3].done():
+                    item[3].set_exception(e)
+        finally:
+            self.slots.release()
+            self.counts["batches"] += 1
+            self.batch_sizes.append(len(items))
+
+    def metrics(self):
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        uptime = time.perf_counter() - self.started
+        return {
+            "Uptime (s)": round(uptime, 3),
+            "Backend": dbc.backend(),
+            "Requests": self.counts["requests"],
+            "Errors": self.counts["errors"],
+            "Rejected": self.counts["rejected"],
+            "Batches": self.counts["batches"],
+            "Mean Batch Size": float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+            "Queue Depth": self.queue.qsize(),
+            "Requests/s": round(self.counts["requests"] / uptime, 1) if uptime else 0.0,
+            "Latency (ms)": {
+                "mean": round(float(latencies.mean()), 3),
+                "p50": round(float(np.percentile(latencies, 50)), 3),
+                "p95": round(float(np.percentile(latencies, 95)), 3),
+                "p99": round(float(np.percentile(latencies, 99)), 3),
+                "max": round(float(latencies.max()), 3),
+            },
+        }
+
+    async def handle_encode(self, body):
+        started = time.perf_counter()
+        try:
+            request = json.loads(body)
+            data = np.array([np.nan if x is None else x for x in request["data"]], dtype=np.float64)
+            if data.ndim != 1 or not len(data):
+                raise ValueError("'data' must be a non-empty list of numbers.")
+            references, boundaries = dbc.parameters_from_dict(request)
+            # "drop" and "ffill" are applied here so the batch only has N left to mark
+            data, _ = dbc.prepare_samples(data, request.get("missing", "mark"))
+            if not len(data):
+                raise ValueError("'data' has no finite samples.")
+        except (KeyError, TypeError, ValueError) as e:
+            self.counts["errors"] += 1
+            return 400, {"Error": f"Invalid request: {e}"}
+        try:
+            result = await self.encode(data, references, boundaries)
+        except asyncio.QueueFull:
+            return 503, {"Error": "Service busy, retry later."}
+        latency = (time.perf_counter() - started) * 1000
+        self.counts["requests"] += 1
+        self.latencies.append(latency)
+        result["Latency (ms)"] = round(latency, 3)
+        return 200, result
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    await self.respond(writer, 413, {"Error": "Request body too large."}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                if path == "/encode":
+                    if method == "POST":
+                        status, payload = await self.handle_encode(body)
+                    else:
+                        status, payload = 405, {"Error": "Use POST."}
+                elif path == "/metrics":
+                    status, payload = 200, self.metrics()
+                elif path == "/health":
+                    status, payload = 200, {"Status": "ok"}
+                else:
+                    status, payload = 404, {"Error": f"Unknown path {path}."}
+
+                close = headers.get("connection", "").lower() == "close"
+                await self.respond(writer, status, payload, close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, close=False):
+        body = json.dumps(payload).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                     "Content-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\n"
+                     f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(host, port, executor, max_batch, max_delay, queue_size, concurrency):
+    service = EncodingService(executor, max_batch, max_delay, queue_size, concurrency)
+    batcher = asyncio.create_task(service.run_batcher())
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"DBC encoding service listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batcher.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local DBC encoding service (HTTP/JSON).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=4, help="size of the worker pool")
+    parser.add_argument("--processes", action="store_true",
+                        help="use a process pool instead of a thread pool")
+    parser.add_argument("--max-batch", type=int, default=256, help="requests per vectorized call")
+    parser.add_argument("--max-delay-ms", type=float, default=2.0,
+                        help="how long to wait for more requests before encoding a batch")
+    parser.add_argument("--queue-size", type=int, default=10000,
+                        help="pending requests before new ones are refused with 503")
+    args = parser.parse_args()
+
+    pool = ProcessPoolExecutor if args.processes else ThreadPoolExecutor
+    with pool(max_workers=args.workers) as executor:
+        try:
+            asyncio.run(serve(args.host, args.port, executor, args.max_batch,
+                              args.max_delay_ms / 1000, args.queue_size, args.workers))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+=========================================================
+ DBC corpus statistics
+=========================================================
+ Aggregate statistics of the DBC encoding over a whole
+ directory of labelled data files, grouped by a header
+ field (Pattern Type by default):
+
+   - nucleotide composition of each reference strand
+   - usage of the 64 codons in the mRNA (frame 0)
+   - amino-acid frequencies of the protein
+   - the difference of every group from a baseline group
+
+ Counts come from one np.bincount per file and array.
+ Files are counted in chunks on a process pool and the
+ partial counts of the workers are merged, so the same
+ code handles 100 files or a million. Amino-acid counts
+ are derived from the codon counts.
+
+ Usage:
+   python dbc_stats.py ../Normal-Abnormal-Datasets --mu 75 --sigma 5
+   python dbc_stats.py archive/ --params params.json --workers 8 \\
+       --json stats.json --heatmap stats.png
+=========================================================
+"""
+
+import argparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import dbc_engine as dbc
+import dbc_browser
+
+N_CODONS = len(dbc.BASES) ** 3   # codon indices include codons with N
+CODONS = [first + second + third for first in "ACGT" for second in "ACGT" for third in "ACGT"]
+CODON_INDEX = np.array([dbc.codon_indices(dbc.strand_codes(codon))[0] for codon in CODONS])
+# amino acid (index into dbc.AMINO_ACIDS) of every codon index
+CODON_AMINO_ACID = np.array([dbc.AMINO_ACIDS.index(chr(amino_acid)) for amino_acid in dbc.CODON_TABLE])
+UNLABELLED = "Unlabelled"
+
+
+class CorpusCounts:
+    def __init__(self):
+        self.groups = {}   # label -> {"Files", "Samples", "Nucleotides" (N, 5), "Codons" (125,)}
+        self.errors = []   # (file, message)
+
+    def group(self, label, n_references):
+        if label not in self.groups:
+            self.groups[label] = {"Files": 0, "Samples": 0,
+                                  "Nucleotides": np.zeros((n_references, len(dbc.BASES)), dtype=np.int64),
+                                  "Codons": np.zeros(N_CODONS, dtype=np.int64)}
+        group = self.groups[label]
+        if len(group["Nucleotides"]) != n_references:
+            raise ValueError(f"Group '{label}' mixes parameter sets with different numbers of references.")
+        return group
+
+    def add(self, label, codes):
+        # codes: (N, samples) strands of one file or channel
+        n_references, n_samples = codes.shape
+        group = self.group(label, n_references)
+        offsets = np.arange(n_references)[:, None] * len(dbc.BASES)
+        group["Nucleotides"] += np.bincount((codes + offsets).ravel(),
+                                            minlength=n_references * len(dbc.BASES)).reshape(n_references, -1)
+        group["Codons"] += np.bincount(dbc.codon_indices(dbc.interleave(codes)), minlength=N_CODONS)
+        group["Samples"] += n_samples
+
+    def merge(self, other):
+        for label, counts in other.groups.items():
+            group = self.group(label, len(counts["Nucleotides"]))
+            for key in ("Files", "Samples", "Nucleotides", "Codons"):
+                group[key] += counts[key]
+        self.errors += other.errors
+        return self
+
+    def labels(self):
+        return sorted(self.groups)
+
+    def amino_acids(self, label):
+        codons = self.groups[label]["Codons"]
+        return np.bincount(CODON_AMINO_ACID, weights=codons, minlength=len(dbc.AMINO_ACIDS)).astype(np.int64)
+
+    def frequencies(self, label):
+        # Composition per reference over A, C, G, T, N; codon usage over the 64 codons
+        # without N; amino acids over all codons (N-codons count as "-")
+        group = self.groups[label]
+        nucleotides = group["Nucleotides"] / np.maximum(group["Nucleotides"].sum(axis=1, keepdims=True), 1)
+        codons = group["Codons"][CODON_INDEX]
+        amino_acids = self.amino_acids(label)
+        return {"Nucleotides": nucleotides,
+                "Codons": codons / max(codons.sum(), 1),
+                "Amino Acids": amino_acids / max(amino_acids.sum(), 1)}
+
+    def to_dict(self, baseline=None):
+        report = {"Groups": {}, "Errors": [{"File": path, "Error": error} for path, error in self.errors]}
+        for label in self.labels():
+            group = self.groups[label]
+            frequencies = self.frequencies(label)
+            names = dbc.reference_names(len(group["Nucleotides"]))
+            report["Groups"][label] = {
+                "Files": group["Files"],
+                "Samples": group["Samples"],
+                "Nucleotide Counts": {name: dict(zip(dbc.BASES, row.tolist()))
+                                      for name, row in zip(names, group["Nucleotides"])},
+                "Codon Counts": dict(zip(CODONS, group["Codons"][CODON_INDEX].tolist())),
+                "Codons With N": int(group["Codons"].sum() - group["Codons"][CODON_INDEX].sum()),
+                "Amino Acid Counts": dict(zip(dbc.AMINO_ACIDS, self.amino_acids(label).tolist())),
+                "Amino Acid Frequencies": dict(zip(dbc.AMINO_ACIDS, frequencies["Amino Acids"].round(6).tolist())),
+            }
+        if baseline is not None:
+            report["Baseline"] = baseline
+            report["Differences"] = {label: differences(self, label, baseline)
+                                     for label in self.labels() if label != baseline}
+        return report
+
+
+def differences(counts, label, baseline):
+    # Frequency of the group minus frequency of the baseline group
+    group, base = counts.frequencies(label), counts.frequencies(baseline)
+    names = dbc.reference_names(len(group["Nucleotides"]))
+    return {
+        "Nucleotides": {name: dict(zip(dbc.BASES, row.round(6).tolist()))
+                        for name, row in zip(names, group["Nucleotides"] - base["Nucleotides"])},
+        "Codons": dict(zip(CODONS, (group["Codons"] - base["Codons"]).round(6).tolist())),
+        "Amino Acids": dict(zip(dbc.AMINO_ACIDS, (group["Amino Acids"] - base["Amino Acids"]).round(6).tolist())),
+    }
+
+def count_files(paths, parameter_spec, missing="mark", label_key="Pattern Type"):
+    counts = CorpusCounts()
+    references, boundaries = dbc.parameters_from_dict(parameter_spec)
+    for path in paths:
+        try:
+            dataset = dbc.load_dataset(path)
+            data = dataset["Numerical Data"]
+            if not data.size:
+                raise ValueError("No numerical data found in the file.")
+            label = dataset["Metadata"].get(label_key, UNLABELLED)
+            channel_codes = dbc.encode_channel_sets(data, [(references, boundaries)] * data.shape[1], missing)
+        except (OSError, ValueError) as e:
+            counts.errors.append((path, str(e)))
+            continue
+        for codes in channel_codes:
+            counts.add(label, codes)
+        counts.groups[label]["Files"] += 1
+    return counts
+
+def count_corpus(paths, parameter_spec, missing="mark", label_key="Pattern Type", workers=None, chunk_size=512):
+    # Small corpora are counted in this process; larger ones in chunks on a process pool
+    if len(paths) <= chunk_size or workers == 1:
+        return count_files(paths, parameter_spec, missing, label_key)
+    counts = CorpusCounts()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(count_files, paths[i:i + chunk_size], parameter_spec, missing, label_key)
+                   for i in range(0, len(paths), chunk_size)]
+        for future in as_completed(futures):
+            counts.merge(future.result())
+    return counts
+
+def choose_baseline(labels, baseline=None):
+    if baseline is not None:
+        if baseline not in labels:
+            raise ValueError(f"Baseline group '{baseline}' not found (groups: {', '.join(labels)}).")
+        return baseline
+    if "Normal" in labels:
+        return "Normal"
+    return labels[0] if labels else None
+
+
+# Report
+def report_text(counts, baseline=None, top=10):
+    labels = counts.labels()
+    lines = []
+    for label in labels:
+        group = counts.groups[label]
+        lines.append(f"{label}: {group['Files']} files, {group['Samples']} samples, "
+                     f"{int(group['Codons'].sum())} codons")
+    if counts.errors:
+        lines.append(f"{len(counts.errors)} files could not be read.")
+    if not labels:
+        return "\n".join(lines)
+    frequencies = {label: counts.frequencies(label) for label in labels}
+    others = [label for label in labels if label != baseline]
+
+    lines += ["", "Nucleotide composition (%)"]
+    lines.append(f"{'Group':<12}{'Ref':<5}" + "".join(f"{base:>8}" for base in dbc.BASES))
+    for label in labels:
+        names = dbc.reference_names(len(frequencies[label]["Nucleotides"]))
+        for name, row in zip(names, frequencies[label]["Nucleotides"]):
+            lines.append(f"{label[:11]:<12}{name:<5}" + "".join(f"{100 * v:8.2f}" for v in row))
+
+    def table(title, key, names, rows):
+        lines.extend(["", title])
+        lines.append(f"{'':<6}" + "".join(f"{label[:11]:>12}" for label in labels) +
+                     "".join(f"{'Δ ' + label[:9]:>12}" for label in others))
+        for i in rows:
+            lines.append(f"{names[i]:<6}" + "".join(f"{100 * frequencies[label][key][i]:12.2f}" for label in labels) +
+                         "".join(f"{100 * (frequencies[label][key][i] - frequencies[baseline][key][i]):+12.2f}"
+                                 for label in others))
+
+    used = np.flatnonzero(np.any([frequencies[label]["Amino Acids"] for label in labels], axis=0))
+    table("Amino-acid frequencies (%), amino acids that occur", "Amino Acids", dbc.AMINO_ACIDS, used)
+    if others:
+        spread = np.max([np.abs(frequencies[label]["Codons"] - frequencies[baseline]["Codons"]) for label in others],
+                        axis=0)
+        rows = np.argsort(-spread, kind="stable")[:top]
+        title = f"Codon usage (%), {top} codons that differ most from {baseline}"
+    else:
+        rows = np.argsort(-frequencies[labels[0]]["Codons"], kind="stable")[:top]
+        title = f"Codon usage (%), {top} most used codons"
+    table(title, "Codons", CODONS, rows)
+    return "\n".join(lines)
+
+def save_heatmap(counts, path, baseline=None):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    labels = counts.labels()
+    frequencies = {label: counts.frequencies(label) for label in labels}
+    others = [label for label in labels if label != baseline]
+    n_rows = len(labels) + len(others)
+    n_nucleotide_rows = sum(len(frequencies[label]["Nucleotides"]) for label in labels)
+    fig = Figure(figsize=(14, 3 + 0.3 * (2 * n_rows + n_nucleotide_rows)), dpi=100)
+    FigureCanvasAgg(fig)
+    panels = [("Codon usage", "Codons", CODONS), ("Amino-acid frequency", "Amino Acids", list(dbc.AMINO_ACIDS))]
+    axes = fig.subplots(3, 1, gridspec_kw={"height_ratios": [n_rows + 2, n_rows + 2, n_nucleotide_rows + 2]})
+    for ax, (title, key, names) in zip(axes, panels):
+        rows = [frequencies[label][key] for label in labels]
+        rows += [frequencies[label][key] - frequencies[baseline][key] for label in others]
+        row_names = labels + [f"{label} − {baseline}" for label in others]
+        show_heatmap(fig, ax, np.array(rows) * 100, row_names, names, title + " (%)")
+    rows, row_names = [], []
+    for label in labels:
+        names = dbc.reference_names(len(frequencies[label]["Nucleotides"]))
+        rows += list(frequencies[label]["Nucleotides"])
+        row_names += [f"{label} {name}" for name in names]
+    show_heatmap(fig, axes[2], np.array(rows) * 100, row_names, list(dbc.BASES), "Nucleotide composition (%)")
+    fig.tight_layout()
+    fig.savefig(path)
+
+def show_heatmap(fig, ax, values, row_names, column_names, title):
+    image = ax.imshow(values, aspect="auto", cmap="viridis", interpolation="nearest")
+    ax.set_title(title, fontsize=10)
+    ax.set_yticks(range(len(row_names)), row_names, fontsize=8)
+    ax.set_xticks(range(len(column_names)), column_names, fontsize=6 if len(column_names) > 30 else 8,
+                  rotation=90 if len(column_names) > 30 else 0)
+    fig.colorbar(image, ax=ax, fraction=0.02, pad=0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Composition and codon-usage statistics of a labelled corpus.")
+    parser.add_argument("folder")
+    parser.add_argument("--params", help="JSON file with a parameter set "
+                                         "(mu/sigma[/ks/alpha..delta] or references/boundaries)")
+    parser.add_argument("--mu", type=float)
+    parser.add_argument("--sigma", type=float)
+    parser.add_argument("--pattern", default="*.txt")
+    parser.add_argument("--label-key", default="Pattern Type", help="header field that names the group of a file")
+    parser.add_argument("--baseline", help="group the others are compared with (default: Normal, if present)")
+    parser.add_argument("--missing", choices=dbc.MISSING_POLICIES, default="mark",
+                        help="how NaN/infinite samples are encoded")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=512, help="files per worker task")
+    parser.add_argument("--top", type=int, default=10, help="codons listed in the text report")
+    parser.add_argument("--json", help="write all counts, frequencies and differences to this file")
+    parser.add_argument("--heatmap", help="write a heatmap of the frequencies to this image file")
+    args = parser.parse_args()
+
+    if args.params:
+        with open(args.params) as file:
+            parameter_spec = json.load(file)
+    elif args.mu is not None and args.sigma is not None:
+        parameter_spec = {"mu": args.mu, "sigma": args.sigma}
+    else:
+        parser.error("either --params or both --mu and --sigma are required")
+    dbc.parameters_from_dict(parameter_spec)   # fail early on invalid boundaries
+
+    started = time.perf_counter()
+    paths = dbc_browser.list_datasets(args.folder, args.pattern)
+    counts = count_corpus(paths, parameter_spec, args.missing, args.label_key, args.workers, args.chunk_size)
+    try:
+        baseline = choose_baseline(counts.labels(), args.baseline)
+    except ValueError as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - started
+
+    print(report_text(counts, baseline, args.top))
+    print(f"\n{len(paths)} files in {elapsed * 1000:.1f} ms")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"Parameters": parameter_spec, "Label Key": args.label_key, "Missing Samples": args.missing,
+                       **counts.to_dict(baseline)}, file, indent=4)
+    if args.heatmap and counts.labels():
+        save_heatmap(counts, args.heatmap, baseline)
+
+
+if __name__ == "__main__":
+    main()
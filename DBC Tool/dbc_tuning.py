@@ -0,0 +1,87 @@
+"""
+=========================================================
+ DBC incremental encoder for live parameter tuning
+=========================================================
+ Keeps the strands of one series up to date while a
+ reference value or its boundaries change.
+
+ The samples are sorted once. Subtracting a reference
+ keeps that order, so for valid boundaries
+ (d < c < 0 < b < a) every strand is five runs of the
+ sorted samples:
+
+   T | G (d <= x-R <= c) | A (c < x-R < b) | C (b <= x-R <= a) | T
+
+ The four run ends are found by binary search on the
+ exact differences. Base counts follow from the run
+ ends, and after a change only the samples between the
+ old and new run ends are re-coded.
+=========================================================
+"""
+
+import bisect
+
+import numpy as np
+
+import dbc_engine as dbc
+
+# Code of each of the five runs, in sorted order
+SEGMENT_CODES = np.array([dbc.T_CODE, dbc.G_CODE, dbc.A_CODE, dbc.C_CODE, dbc.T_CODE], dtype=np.uint8)
+
+
+class IncrementalEncoder:
+    def __init__(self, data, references, boundaries, missing="mark"):
+        references, boundaries = dbc.as_parameters(references, boundaries)
+        if dbc.invalid_boundaries(boundaries).any():
+            raise ValueError("Conversion boundaries must satisfy a > b > 0 > c > d.")
+        self.data, _ = dbc.prepare_samples(data, missing)
+        finite = np.flatnonzero(np.isfinite(self.data))
+        self.order = finite[np.argsort(self.data[finite], kind="stable")]
+        self.sorted_data = self.data[self.order]
+        self.n_missing = len(self.data) - len(self.order)
+        self.references = references.copy()
+        self.boundaries = boundaries.copy()
+        self.ends = np.zeros((len(references), 4), dtype=np.intp)
+        self.codes = np.full((len(references), len(self.data)), dbc.N_CODE, dtype=np.uint8)
+        for index in range(len(references)):
+            self.ends[index] = self.run_ends(references[index], boundaries[index])
+            segments = np.searchsorted(self.ends[index], np.arange(len(self.order)), side="right")
+            self.codes[index, self.order] = SEGMENT_CODES[segments]
+
+    def run_ends(self, reference, boundary):
+        # First sorted sample with x - R >= d, > c, >= b and > a. The differences are
+        # computed exactly as in dbc_engine, so samples on a boundary are coded the same.
+        a, b, c, d = boundary
+        samples = self.sorted_data
+        return (bisect.bisect_left(samples, True, key=lambda x: x - reference >= d),
+                bisect.bisect_left(samples, True, key=lambda x: x - reference > c),
+                bisect.bisect_left(samples, True, key=lambda x: x - reference >= b),
+                bisect.bisect_left(samples, True, key=lambda x: x - reference > a))
+
+    def update(self, index, reference, boundary):
+        # Set one reference and its (a, b, c, d); returns the number of re-coded samples
+        boundary = np.asarray(boundary, dtype=np.float64)
+        if dbc.invalid_boundaries(boundary[None, :]).any():
+            raise ValueError("Conversion boundaries must satisfy a > b > 0 > c > d.")
+        old, new = self.ends[index].copy(), np.array(self.run_ends(reference, boundary), dtype=np.intp)
+        self.references[index] = reference
+        self.boundaries[index] = boundary
+        self.ends[index] = new
+        changed = [np.arange(low, high) for low, high in zip(np.minimum(old, new), np.maximum(old, new)) if low < high]
+        if not changed:
+            return 0
+        positions = np.unique(np.concatenate(changed))
+        self.codes[index, self.order[positions]] = SEGMENT_CODES[np.searchsorted(new, positions, side="right")]
+        return len(positions)
+
+    def counts(self):
+        # (N, 5) base counts in dbc.BASES order, straight from the run ends
+        n = len(self.order)
+        d, c, b, a = self.ends.T
+        counts = np.empty((len(self.ends), len(dbc.BASES)), dtype=np.int64)
+        counts[:, dbc.A_CODE] = b - c
+        counts[:, dbc.C_CODE] = a - b
+        counts[:, dbc.G_CODE] = c - d
+        counts[:, dbc.T_CODE] = d + (n - a)
+        counts[:, dbc.N_CODE] = self.n_missing
+        return counts
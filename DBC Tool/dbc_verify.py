@@ -0,0 +1,307 @@
+"""
+=========================================================
+ DBC differential equivalence harness
+=========================================================
+ Checks that the vectorized engine (dbc_engine) gives
+ exactly the same DNA strands, mRNA and protein as the
+ original pure-Python pipeline of the DBC Tool, which is
+ kept below unchanged as the reference oracle, and
+ reports the speed-up of every case.
+
+ Cases are generated at random from a seed: default,
+ modify and direct parameter sets with 1 to 8 references,
+ and series in which a quarter of the samples land
+ exactly on a boundary (R + a, R + b, R + c or R + d with
+ dyadic values, so that the difference is exact) to pin
+ down the edge rules c < diff < b -> A, b <= diff <= a
+ -> C, d <= diff <= c -> G. The bundled datasets are
+ checked as well. Non-finite samples are out of scope:
+ the legacy pipeline drops them and misaligns the strands.
+ They, and data-file parsing, are covered by a few fixed
+ engine-only checks instead.
+ The engine runs on its active kernel backend (numba or
+ numpy, see dbc_kernels.py), which is printed first.
+
+ Usage:
+   python dbc_verify.py --cases 200 --seed 1
+   python dbc_verify.py --sizes 150,10000,100000
+   DBC_BACKEND=numpy python dbc_verify.py
+=========================================================
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+import dbc_engine as dbc
+
+
+# Legacy pipeline (reference oracle, as in the original DBC Tool)
+def create_difference_data(final_individual_file_data, R_values):    
+    difference_data = {}
+    dataset = final_individual_file_data[0]  # our only dataset
+    for key in R_values:
+        R_value = R_values[key]
+        differences = [x - R_value for x in dataset['Numerical Data']]
+        difference_data[key] = differences
+    return difference_data
+
+def create_strand_data(difference_data, A_values, B_values, C_values, D_values):    
+    strand_data = {}
+    for key in difference_data:
+        diffs = difference_data[key]
+        strand = ""
+        for diff in diffs:
+            if C_values[key] < diff < B_values[key]:
+                strand += 'A'
+            elif B_values[key] <= diff <= A_values[key]:
+                strand += 'C'
+            elif D_values[key] <= diff <= C_values[key]:
+                strand += 'G'
+            elif diff > A_values[key] or diff < D_values[key]:
+                strand += 'T'
+        strand_data[key] = strand
+    return strand_data
+
+def create_dna_strand(strand_R1, strand_R2, strand_R3):    
+    dna_strand = ""
+    length = len(strand_R1)
+    for i in range(length):
+        dna_strand += strand_R1[i] + strand_R2[i] + strand_R3[i]
+    return dna_strand
+
+
+def generate_protein_seq(final_strand):
+    codon_to_amino_acid = {
+        "ATT": "I", "ATC": "I", "ATA": "I",
+        "CTT": "L", "CTC": "L", "CTA": "L", "CTG": "L", "TTA": "L", "TTG": "L",
+        "GTT": "V", "GTC": "V", "GTA": "V", "GTG": "V",
+        "TTT": "F", "TTC": "F",
+        "ATG": "M",
+        "TGT": "C", "TGC": "C",
+        "GCT": "A", "GCC": "A", "GCA": "A", "GCG": "A",
+        "GGT": "G", "GGC": "G", "GGA": "G", "GGG": "G",
+        "CCT": "P", "CCC": "P", "CCA": "P", "CCG": "P",
+        "ACT": "T", "ACC": "T", "ACA": "T", "ACG": "T",
+        "TCT": "S", "TCC": "S", "TCA": "S", "TCG": "S", "AGT": "S", "AGC": "S",
+        "TAT": "Y", "TAC": "Y",
+        "TGG": "W",
+        "CAA": "Q", "CAG": "Q",
+        "AAT": "N", "AAC": "N",
+        "CAT": "H", "CAC": "H",
+        "GAA": "E", "GAG": "E",
+        "GAT": "D", "GAC": "D",
+        "AAA": "K", "AAG": "K",
+        "CGT": "R", "CGC": "R", "CGA": "R", "CGG": "R", "AGA": "R", "AGG": "R",
+        "TAA": "X", "TAG": "X", "TGA": "X"
+    }
+    protein_seq = ""
+    for i in range(0, len(final_strand), 3):
+        codon = final_strand[i:i+3]
+        if len(codon) < 3:
+            break
+        protein_seq += codon_to_amino_acid.get(codon, "-")
+    return protein_seq
+
+
+def legacy_pipeline(data, references, boundaries):
+    keys = dbc.reference_names(len(references))
+    final_individual_file_data = [{'Dataset ID': "case", 'Numerical Data': [float(x) for x in data]}]
+    R_values = {key: float(R) for key, R in zip(keys, references)}
+    A_values, B_values, C_values, D_values = [{key: float(v) for key, v in zip(keys, column)}
+                                              for column in np.asarray(boundaries).T]
+    diff_data = create_difference_data(final_individual_file_data, R_values)
+    strand_data = create_strand_data(diff_data, A_values, B_values, C_values, D_values)
+    strands = [strand_data[key] for key in keys]
+    if len(strands) == 3:
+        mrna = create_dna_strand(*strands)
+    else:
+        mrna = "".join("".join(bases) for bases in zip(*strands))
+    return strands, mrna, generate_protein_seq(mrna)
+
+def engine_pipeline(data, references, boundaries):
+    codes, protein = dbc.encode_translate(data, references, boundaries)
+    return ([dbc.strand_text(strand) for strand in codes], dbc.strand_text(dbc.interleave(codes)),
+            dbc.protein_text(protein))
+
+
+# Case generation
+def dyadic(rng, low, high, denominator, size=None):
+    return rng.integers(low * denominator, high * denominator, size=size, endpoint=True) / denominator
+
+def random_parameters(rng, kind):
+    mu = dyadic(rng, -64, 64, 64)
+    sigma = dyadic(rng, 1 / 64, 8, 64)
+    if kind == "default":
+        return dbc.default_parameters(mu, sigma)
+    n = int(rng.integers(1, dbc.MAX_REFERENCES, endpoint=True))
+    if kind == "modify":
+        beta = dyadic(rng, 1 / 8, 4, 8)
+        gamma = -dyadic(rng, 1 / 8, 4, 8)
+        return dbc.modify_parameters(mu, sigma, dyadic(rng, -6, 6, 8, n),
+                                     beta + dyadic(rng, 1 / 8, 4, 8), beta,
+                                     gamma, gamma - dyadic(rng, 1 / 8, 4, 8))
+    b = dyadic(rng, 1 / 16, 8, 16, n)
+    c = -dyadic(rng, 1 / 16, 8, 16, n)
+    boundaries = np.stack([b + dyadic(rng, 1 / 16, 8, 16, n), b, c, c - dyadic(rng, 1 / 16, 8, 16, n)], axis=1)
+    return dbc.as_parameters(mu + dyadic(rng, -16, 16, 16, n), boundaries)
+
+def random_case(rng, n_samples, kind):
+    references, boundaries = random_parameters(rng, kind)
+    spread = np.abs(references - references.mean()).max() + np.abs(boundaries).max()
+    data = references.mean() + spread * rng.standard_normal(n_samples)
+    # A quarter of the samples sit exactly on one of the boundaries of one reference.
+    hits = rng.random(n_samples) < 0.25
+    rows = rng.integers(0, len(references), n_samples)[hits]
+    columns = rng.integers(0, 4, n_samples)[hits]
+    data[hits] = references[rows] + boundaries[rows, columns]
+    return data, references, boundaries
+
+def boundary_hits(data, references, boundaries):
+    differences = dbc.difference_data(data, references)
+    return int((differences[:, :, None] == boundaries[:, None, :]).any(axis=(0, 2)).sum())
+
+def dataset_cases(folder):
+    for path in sorted(glob.glob(os.path.join(folder, "*.txt")),
+                       key=lambda p: (len(os.path.basename(p)), os.path.basename(p))):
+        data = dbc.load_dataset(path)["Numerical Data"][:, 0]
+        references, boundaries = dbc.default_parameters(float(np.mean(data)), float(np.std(data)))
+        yield os.path.basename(path), data, references, boundaries
+
+
+# Comparison
+def first_difference(expected, actual):
+    for i, (x, y) in enumerate(zip(expected, actual)):
+        if x != y:
+            return i
+    return min(len(expected), len(actual))
+
+def compare(data, references, boundaries):
+    started = time.perf_counter()
+    expected = legacy_pipeline(data, references, boundaries)
+    legacy_time = time.perf_counter() - started
+    engine_time = np.inf
+    for _ in range(3):
+        started = time.perf_counter()
+        actual = engine_pipeline(data, references, boundaries)
+        engine_time = min(engine_time, time.perf_counter() - started)
+
+    problems = []
+    for name, legacy_strand, engine_strand in zip(dbc.reference_names(len(references)), expected[0], actual[0]):
+        if legacy_strand != engine_strand:
+            problems.append(f"DNA({name}) differs at sample {first_difference(legacy_strand, engine_strand)}")
+    for stage, legacy_text, engine_text in (("mRNA", expected[1], actual[1]), ("Protein", expected[2], actual[2])):
+        if legacy_text != engine_text:
+            problems.append(f"{stage} differs at position {first_difference(legacy_text, engine_text)}")
+    return problems, legacy_time, engine_time
+
+
+# Engine-only checks (no legacy counterpart)
+def edge_cases():
+    # (name, problems) for cases the legacy pipeline cannot run
+    data = np.arange(10, dtype=np.float64).reshape(5, 2)
+    data[1, 0] = np.nan
+    data[3, 1] = np.nan
+    three = dbc.default_parameters(4.0, 1.0)
+    one = (np.array([5.0]), np.array([[2.0, 1.0, -1.0, -2.0]]))
+    codes = dbc.encode_channel_sets(data, [three, one], "drop")
+    expected = [dbc.encode(data[[0, 2, 4], 0], *three), dbc.encode(data[[0, 2, 4], 1], *one)]
+    yield "drop across channel groups", [] if all(np.array_equal(a, b) for a, b in zip(codes, expected)) else \
+        [f"shapes {[c.shape for c in codes]}, expected {[e.shape for e in expected]}"]
+
+    expected = [[1.0, 2.0], [np.nan, 4.0], [5.0, np.nan]]
+    for name, delimiter in (("tab", "\t"), ("comma", ","), ("semicolon", ";")):
+        parsed = dbc.parse_dataset(["Dataset ID: 1", f"1{delimiter}2", f"{delimiter}4", f"5{delimiter}"])
+        values = parsed["Numerical Data"]
+        same = values.shape == (3, 2) and np.array_equal(values, expected, equal_nan=True)
+        yield f"empty {name} fields", [] if same else [f"parsed as {values.tolist()}"]
+
+    # Active backend against the NumPy stages, with runs of every length and non-finite samples
+    rng = np.random.default_rng(0)
+    codes = np.repeat(rng.integers(0, 5, (3, 400)), rng.integers(1, 40, 400), axis=1).astype(np.uint8)
+    expected = run_statistics_reference(codes)
+    actual = dbc.run_statistics(codes)
+    yield "run statistics", [] if all(np.array_equal(a, b) for a, b in zip(expected, actual)) else \
+        ["counts or longest runs differ from the NumPy run-length pass"]
+    data = 75 + 5 * rng.standard_normal((2000, 3))
+    data[rng.random(data.shape) < 0.02] = np.nan
+    parameter_sets = [dbc.default_parameters(75.0, 5.0), None, random_parameters(rng, "direct")]
+    for missing in dbc.MISSING_POLICIES:
+        codes, proteins = dbc.encode_translate_channel_sets(data, parameter_sets, missing)
+        expected = dbc.encode_channel_sets(data, parameter_sets, missing)
+        same = all((a is None and b is None and p is None) or
+                   (np.array_equal(a, b) and np.array_equal(p, dbc.translate(dbc.interleave(b))))
+                   for a, b, p in zip(codes, expected, proteins))
+        yield f"encode and translate ({missing})", [] if same else ["codes or proteins differ from NumPy"]
+
+def run_statistics_reference(codes):
+    counts = np.zeros((len(codes), len(dbc.BASES)), dtype=np.int64)
+    longest = np.zeros((len(codes), len(dbc.BASES)), dtype=np.int64)
+    for row, strand in enumerate(codes):
+        _, bases, lengths = dbc.runs(strand)
+        counts[row] = np.bincount(bases, minlength=len(dbc.BASES))
+        np.maximum.at(longest[row], bases, lengths)
+    return counts, longest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the DBC engine against the legacy pipeline.")
+    parser.add_argument("--cases", type=int, default=100, help="random cases per size")
+    parser.add_argument("--sizes", default="150,10000", help="comma-separated series lengths")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--datasets", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                           "..", "Normal-Abnormal-Datasets"),
+                        help="folder of data files to check as well ('' to skip)")
+    parser.add_argument("--verbose", action="store_true", help="print every case, not only failures")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    cases = []
+    for size in [int(size) for size in args.sizes.split(",")]:
+        for i in range(args.cases):
+            kind = ("default", "modify", "direct")[i % 3]
+            cases.append((f"{kind}-{size}-{i}", kind) + random_case(rng, size, kind))
+    if args.datasets and os.path.isdir(args.datasets):
+        cases += [(case[0], "dataset") + case[1:] for case in dataset_cases(args.datasets)]
+
+    started = time.perf_counter()
+    engine_pipeline(np.zeros(3), *dbc.default_parameters(0.0, 1.0))
+    print(f"Engine backend: {dbc.backend()} (first call, including compile or cache load: "
+          f"{(time.perf_counter() - started) * 1000:.1f} ms)")
+    print(f"{'case':<22}{'N':>3}{'samples':>9}{'on boundary':>13}{'legacy ms':>12}{'engine ms':>12}{'speed-up':>10}")
+    failures = 0
+    totals = {}
+    for name, kind, data, references, boundaries in cases:
+        problems, legacy_time, engine_time = compare(data, references, boundaries)
+        failures += bool(problems)
+        total = totals.setdefault((kind, len(data)), [0, 0.0, 0.0])
+        total[0] += 1
+        total[1] += legacy_time
+        total[2] += engine_time
+        if problems or args.verbose:
+            print(f"{name:<22}{len(references):>3}{len(data):>9}{boundary_hits(data, references, boundaries):>13}"
+                  f"{legacy_time * 1000:>12.3f}{engine_time * 1000:>12.3f}{legacy_time / engine_time:>9.1f}x"
+                  + ("  FAIL: " + "; ".join(problems) if problems else ""))
+
+    print()
+    print(f"{'kind':<10}{'samples':>9}{'cases':>7}{'legacy ms':>12}{'engine ms':>12}{'speed-up':>10}")
+    for (kind, size), (count, legacy_time, engine_time) in sorted(totals.items()):
+        print(f"{kind:<10}{size:>9}{count:>7}{legacy_time / count * 1000:>12.3f}"
+              f"{engine_time / count * 1000:>12.3f}{legacy_time / engine_time:>9.1f}x")
+    print()
+    edge_failures = 0
+    for name, problems in edge_cases():
+        edge_failures += bool(problems)
+        if problems or args.verbose:
+            print(f"{name:<32}" + ("FAIL: " + "; ".join(problems) if problems else "ok"))
+    print(f"{len(cases) - failures} of {len(cases)} cases identical (seed {args.seed}); "
+          f"engine checks: {edge_failures} failed.")
+    return 1 if failures or edge_failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
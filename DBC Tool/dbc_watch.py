@@ -0,0 +1,282 @@
+"""
+=========================================================
+ DBC watch-folder ingestion
+=========================================================
+ Watches a directory for new data files (same structure
+ as Normal-Abnormal-Datasets/*.txt), waits until a file
+ has stopped growing, encodes it on a bounded worker pool
+ and appends the exported fields to a rolling JSON-lines
+ output (results-000001.jsonl, results-000002.jsonl, ...).
+
+ Processed files are recorded by SHA-256 of their content
+ and a key of the encoding settings (parameters, missing-
+ sample policy, preprocessing, strand format and engine
+ version) in processed.jsonl, so a restart, a renamed
+ copy or a re-delivered file is never encoded twice with
+ the same settings, and new settings encode it again. The hash is
+ taken from the bytes the worker encodes. A failed file
+ is retried when it is next seen unchanged, up to
+ MAX_ATTEMPTS times (counted across restarts), and only
+ then recorded as failed.
+
+ Usage:
+   python dbc_watch.py incoming/ --mu 75 --sigma 5
+   python dbc_watch.py incoming/ --params params.json --workers 4
+=========================================================
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+import dbc_engine as dbc
+import dbc_cache
+import dbc_codec
+import dbc_preprocess
+
+LEDGER_NAME = "processed.jsonl"
+MAX_ATTEMPTS = 3
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def settings_key(parameter_spec, missing="mark", run_length=False, preprocessing=None):
+    # Short hash of everything that changes the output for a given file
+    key = dbc_cache.parameter_key([dbc.parameters_from_dict(parameter_spec)], missing, preprocessing)
+    return dbc_cache.content_hash((key + json.dumps({"run_length": bool(run_length)})).encode("utf-8"))[:16]
+
+def encode_file(path, parameter_spec, missing="mark", run_length=False, preprocessing=None):
+    # -> (SHA-256 of the bytes that were read, entry); one read, so the hash always matches the data
+    with open(path, "rb") as file:
+        content = file.read()
+    sha256 = hashlib.sha256(content).hexdigest()
+    dataset = dbc.parse_dataset_bytes(content)
+    references, boundaries = dbc.parameters_from_dict(parameter_spec)
+    data = dataset["Numerical Data"]
+    if not data.size:
+        raise ValueError("No numerical data found in the file.")
+    data = dbc_preprocess.preprocess(data, preprocessing)
+    channel_codes, proteins = dbc.encode_translate_channel_sets(data, [(references, boundaries)] * data.shape[1],
+                                                                missing)
+    entry = {"Dataset ID": dataset["Dataset ID"], "Metadata": dataset["Metadata"]}
+    if preprocessing:
+        entry["Preprocessing"] = preprocessing
+    if not np.isfinite(data).all():
+        entry["Missing Samples"] = missing
+    export_fields = dbc_codec.run_length_fields if run_length else dbc.export_fields
+    if len(channel_codes) == 1:
+        entry.update(export_fields(channel_codes[0], proteins[0]))
+    else:
+        entry["Channels"] = {name: export_fields(codes, protein)
+                             for name, codes, protein in zip(dataset["Channels"], channel_codes, proteins)}
+    return sha256, entry
+
+
+class RollingOutput:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        existing = sorted(glob.glob(os.path.join(directory, "results-*.jsonl")))
+        self.index = int(os.path.basename(existing[-1])[8:14]) if existing else 1
+
+    def path(self):
+        return os.path.join(self.directory, f"results-{self.index:06d}.jsonl")
+
+    def append(self, record):
+        line = json.dumps(record) + "\n"
+        if os.path.exists(self.path()) and os.path.getsize(self.path()) + len(line) > self.max_bytes:
+            self.index += 1
+        with open(self.path(), "a") as file:
+            file.write(line)
+        return self.path()
+
+
+class WatchFolder:
+    def __init__(self, folder, output, parameter_spec, pattern="*.txt", workers=2,
+                 stable_polls=2, max_output_bytes=64 * 1024 * 1024, missing="mark", run_length=False,
+                 preprocessing=None):
+        self.folder = folder
+        self.output = output
+        self.parameter_spec = parameter_spec
+        self.missing = missing
+        self.run_length = run_length
+        self.preprocessing = preprocessing
+        self.pattern = pattern
+        self.workers = workers
+        self.stable_polls = stable_polls
+        self.results = RollingOutput(output, max_output_bytes)
+        self.ledger_path = os.path.join(output, LEDGER_NAME)
+        self.settings = settings_key(parameter_spec, missing, run_length, preprocessing)
+        self.processed, self.attempts = self.load_ledger()
+        self.observed = {}   # path -> ((size, mtime), polls the file has looked the same)
+        self.finished = {}   # path -> (size, mtime) when it was encoded or skipped
+        self.pending = {}    # future -> (path, sha256)
+        self.queued = set()  # sha256 of files submitted but not yet finished
+
+    def load_ledger(self):
+        # -> (hashes that are done, failed attempts of the others), for the current settings only
+        processed, attempts = set(), {}
+        if os.path.exists(self.ledger_path):
+            with open(self.ledger_path) as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                        sha256 = entry["SHA-256"]
+                    except (ValueError, KeyError):
+                        continue
+                    if entry.get("Settings") != self.settings:
+                        continue
+                    if entry.get("Status") == "error":
+                        attempts[sha256] = attempts.get(sha256, 0) + 1
+                    else:
+                        processed.add(sha256)
+        return processed, attempts
+
+    def record(self, path, sha256, status, detail=None):
+        # "error" entries are attempts; any other status marks the content as done
+        entry = {"SHA-256": sha256, "Settings": self.settings, "File": os.path.basename(path), "Status": status,
+                 "Time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        if detail:
+            entry["Detail"] = detail
+        with open(self.ledger_path, "a") as file:
+            file.write(json.dumps(entry) + "\n")
+        if status != "error":
+            self.processed.add(sha256)
+
+    def complete_files(self):
+        # A file is complete once its size and mtime have not changed for
+        # stable_polls consecutive polls.
+        complete = []
+        paths = glob.glob(os.path.join(self.folder, self.pattern))
+        for path in paths:
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            signature = (info.st_size, info.st_mtime_ns)
+            if self.finished.get(path) == signature or info.st_size == 0:
+                continue
+            previous, polls = self.observed.get(path, (None, 0))
+            polls = polls + 1 if previous == signature else 0
+            self.observed[path] = (signature, polls)
+            if polls >= self.stable_polls:
+                complete.append((path, signature))
+        for path in set(self.observed) - set(paths):
+            del self.observed[path]
+        return sorted(complete, key=lambda item: os.path.basename(item[0]))
+
+    def poll(self, executor):
+        for path, signature in self.complete_files():
+            if len(self.pending) >= 2 * self.workers:
+                break   # bounded: the remaining files are picked up on a later poll
+            del self.observed[path]
+            self.finished[path] = signature
+            sha256 = file_sha256(path)
+            if sha256 in self.processed or sha256 in self.queued:
+                continue
+            self.queued.add(sha256)
+            self.pending[executor.submit(encode_file, path, self.parameter_spec, self.missing,
+                                          self.run_length, self.preprocessing)] = (path, sha256)
+
+    def collect(self, timeout):
+        if not self.pending:
+            return 0
+        done, _ = wait(list(self.pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            path, sha256 = self.pending.pop(future)
+            self.queued.discard(sha256)
+            try:
+                sha256, entry = future.result()
+            except Exception as e:
+                self.fail(path, sha256, e)
+                continue
+            if sha256 in self.processed:
+                continue   # the file changed into content that was already encoded
+            output_path = self.results.append({"File": os.path.basename(path), "SHA-256": sha256,
+                                               "Settings": self.settings, **entry})
+            self.record(path, sha256, "encoded")
+            print(f"Encoded {os.path.basename(path)} -> {os.path.basename(output_path)}")
+        return len(done)
+
+    def fail(self, path, sha256, error):
+        self.attempts[sha256] = self.attempts.get(sha256, 0) + 1
+        if self.attempts[sha256] < MAX_ATTEMPTS:
+            self.record(path, sha256, "error", str(error))
+            self.finished.pop(path, None)   # retried once the file is seen unchanged again
+            print(f"Failed {os.path.basename(path)} (attempt {self.attempts[sha256]} of {MAX_ATTEMPTS}): {error}")
+        else:
+            self.record(path, sha256, "failed", str(error))
+            print(f"Failed {os.path.basename(path)}, giving up: {error}")
+
+    def run(self, interval=1.0, once=False):
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                self.poll(executor)
+                if once and not self.pending and not self.observed:
+                    break
+                started = time.monotonic()
+                self.collect(timeout=interval)
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Encode data files as they land in a directory.")
+    parser.add_argument("folder")
+    parser.add_argument("--output", help="output directory (default: <folder>/dbc-output)")
+    parser.add_argument("--params", help="JSON file with a parameter set "
+                                         "(mu/sigma[/ks/alpha..delta] or references/boundaries)")
+    parser.add_argument("--mu", type=float)
+    parser.add_argument("--sigma", type=float)
+    parser.add_argument("--pattern", default="*.txt")
+    parser.add_argument("--missing", choices=dbc.MISSING_POLICIES, default="mark",
+                        help="how NaN/infinite samples are encoded")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between polls")
+    parser.add_argument("--stable-polls", type=int, default=2,
+                        help="polls a file's size must stay unchanged before it is encoded")
+    parser.add_argument("--max-output-mb", type=float, default=64, help="size of each results file")
+    parser.add_argument("--preprocess", default="",
+                        help="preprocessing steps, e.g. detrend=1024,median=5,decimate=4 (or a JSON list/file)")
+    parser.add_argument("--run-length", action="store_true",
+                        help="write strands as run-length text (e.g. 12A3TG) and leave out the mRNA")
+    parser.add_argument("--once", action="store_true", help="encode what is there now, then exit")
+    args = parser.parse_args()
+
+    if args.params:
+        with open(args.params) as file:
+            parameter_spec = json.load(file)
+    elif args.mu is not None and args.sigma is not None:
+        parameter_spec = {"mu": args.mu, "sigma": args.sigma}
+    else:
+        parser.error("either --params or both --mu and --sigma are required")
+    dbc.parameters_from_dict(parameter_spec)   # fail early on invalid boundaries
+    try:
+        preprocessing = dbc_preprocess.parse_steps(args.preprocess)
+    except ValueError as e:
+        parser.error(str(e))
+
+    output = args.output or os.path.join(args.folder, "dbc-output")
+    os.makedirs(output, exist_ok=True)
+    watcher = WatchFolder(args.folder, output, parameter_spec, args.pattern, args.workers,
+                          args.stable_polls, int(args.max_output_mb * 1024 * 1024), args.missing, args.run_length,
+                          preprocessing)
+    print(f"Watching {args.folder} ({args.pattern}); results in {output}")
+    try:
+        watcher.run(args.interval, args.once)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()